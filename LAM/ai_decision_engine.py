@@ -3,8 +3,15 @@ import boto3
 import os
 from datetime import datetime
 
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ.get("DDB_TABLE"))
+# Created on first use so make_decision() can be imported and run without
+# AWS configuration (local pipeline, tests).
+_table = None
+
+def _get_table():
+    global _table
+    if _table is None:
+        _table = boto3.resource("dynamodb").Table(os.environ.get("DDB_TABLE"))
+    return _table
 
 def make_decision(event):
     """
@@ -130,9 +137,11 @@ def lambda_handler(event, context):
 
     # Add timestamp for logging in DynamoDB
     decision_output["timestamp"] = datetime.utcnow().isoformat()
+    if event.get("correlationId"):
+        decision_output["correlationId"] = event["correlationId"]
 
     # Save to DynamoDB
-    table.put_item(Item=decision_output)
+    _get_table().put_item(Item=decision_output)
 
     return {
         "statusCode": 200,
@@ -0,0 +1,342 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from backend.storage import get_storage
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# Off by default: when on, EventProcessor throttles events over the limits
+# below. PUT /admission {"enabled": true} turns it on at runtime.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "0") == "1"
+# Sustained events/s and burst allowed per device
+ADMISSION_DEVICE_RATE = float(os.getenv("ADMISSION_DEVICE_RATE", "1"))
+ADMISSION_DEVICE_BURST = float(os.getenv("ADMISSION_DEVICE_BURST", "10"))
+# Events/s for the whole process (0: no global limit). Buckets are per
+# process, i.e. per Lambda container: the fleet-wide ceiling is this times
+# the number of concurrent containers, so size it to what the EventLogs /
+# DeviceState capacity and LAM concurrency can absorb divided by the
+# function's reserved concurrency.
+ADMISSION_GLOBAL_RATE = float(os.getenv("ADMISSION_GLOBAL_RATE", "0"))
+# Default: one second's worth of ADMISSION_GLOBAL_RATE
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", "0"))
+# Event type -> priority class; types not listed are "normal".
+# Heartbeats are always "low".
+ADMISSION_PRIORITIES = os.getenv("ADMISSION_PRIORITIES", "motion=high,door=high,temperature=low")
+# Share of a bucket each class must leave for the classes above it
+ADMISSION_RESERVE = os.getenv("ADMISSION_RESERVE", "normal=0.1,low=0.3")
+# What happens to a throttled event: "log" (EventLogs only) or "drop"
+ADMISSION_THROTTLED = os.getenv("ADMISSION_THROTTLED", "log")
+# How often a process re-reads limits changed through the API (in a
+# background thread; 0: never)
+ADMISSION_REFRESH_SECONDS = float(os.getenv("ADMISSION_REFRESH_SECONDS", "30"))
+
+HIGH = "high"
+NORMAL = "normal"
+LOW = "low"
+CLASSES = (HIGH, NORMAL, LOW)
+
+LOG_ONLY = "log"
+DROP = "drop"
+
+# Name of the runtime limits in storage (get_setting / put_setting)
+SETTING_NAME = "admission"
+
+LOG = get_logger("admission")
+
+# Per-device throttle counts kept for stats()
+_MAX_THROTTLED_DEVICES = 10000
+
+
+def _parse_pairs(spec: str) -> dict:
+    pairs = {}
+    for part in spec.split(","):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+
+def _number(settings, key, positive=False):
+    value = settings[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or (positive and value == 0):
+        raise ValueError(f"'{key}' must be a {'positive' if positive else 'non-negative'} number")
+    return float(value)
+
+
+def validate_settings(settings: dict) -> dict:
+    """Check and normalise a full settings dict. Raises ValueError."""
+    clean = {
+        "enabled": settings["enabled"],
+        "deviceRate": _number(settings, "deviceRate", positive=True),
+        "deviceBurst": _number(settings, "deviceBurst", positive=True),
+        "globalRate": _number(settings, "globalRate"),
+        "globalBurst": _number(settings, "globalBurst"),
+        "priorities": settings["priorities"],
+        "reserve": settings["reserve"],
+        "throttled": settings["throttled"],
+    }
+    if not isinstance(clean["enabled"], bool):
+        raise ValueError("'enabled' must be a boolean")
+    if clean["deviceBurst"] < 1:
+        raise ValueError("'deviceBurst' must be at least 1")
+    if clean["throttled"] not in (LOG_ONLY, DROP):
+        raise ValueError(f"'throttled' must be '{LOG_ONLY}' or '{DROP}'")
+
+    priorities = clean["priorities"]
+    if not isinstance(priorities, dict) or not all(
+        isinstance(t, str) and c in CLASSES for t, c in priorities.items()
+    ):
+        raise ValueError(f"'priorities' must map event types to one of {list(CLASSES)}")
+
+    reserve = clean["reserve"]
+    if not isinstance(reserve, dict) or not set(reserve) <= set(CLASSES):
+        raise ValueError(f"'reserve' must map classes {list(CLASSES)} to fractions")
+    reserve = {c: float(v) for c, v in reserve.items() if not isinstance(v, bool) and isinstance(v, (int, float))}
+    if len(reserve) != len(clean["reserve"]) or not all(0 <= v < 1 for v in reserve.values()):
+        raise ValueError("'reserve' fractions must be numbers in [0, 1)")
+    clean["reserve"] = reserve
+    return clean
+
+
+def default_settings() -> dict:
+    return validate_settings({
+        "enabled": ADMISSION_CONTROL,
+        "deviceRate": ADMISSION_DEVICE_RATE,
+        "deviceBurst": ADMISSION_DEVICE_BURST,
+        "globalRate": ADMISSION_GLOBAL_RATE,
+        "globalBurst": ADMISSION_GLOBAL_BURST,
+        "priorities": _parse_pairs(ADMISSION_PRIORITIES),
+        "reserve": {c: float(v) for c, v in _parse_pairs(ADMISSION_RESERVE).items()},
+        "throttled": ADMISSION_THROTTLED,
+    })
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+    def refill(self, now, rate, burst):
+        if now > self.updated:
+            self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+
+
+class AdmissionController:
+    """
+    Token-bucket admission control in front of EventProcessor.
+
+    Every device has a bucket (deviceRate tokens/s, up to deviceBurst) and,
+    when globalRate is set, all events share one more. An event is
+    admitted only if both buckets have a token for it, so one flooding
+    device uses up its own budget and never the whole process's.
+
+    Buckets live in process memory. In Lambda each container keeps its
+    own, so globalRate limits one container, and a device whose events
+    are spread over several containers gets deviceRate in each.
+
+    Priority classes decide who gets the last tokens: a "normal" event must
+    leave reserve["normal"] of a bucket untouched, a "low" one
+    reserve["low"], and a "high" one (motion, door) may empty it. Under
+    contention routine temperature readings and heartbeats are throttled
+    first.
+
+    Limits are adjustable at runtime with update(). It stores them via
+    StorageBackend.put_setting, and every process re-reads them every
+    ADMISSION_REFRESH_SECONDS on a background thread (started by the first
+    admit()), so an API change reaches the Lambda containers without a
+    redeploy and admit() itself never waits on storage. Until the first
+    read completes the environment defaults apply.
+    """
+
+    def __init__(self, storage=None, settings=None, refresh_seconds=ADMISSION_REFRESH_SECONDS):
+        self._storage = storage
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._global = None
+        self._refresher = None
+        self._stop = threading.Event()
+        self._apply(settings or default_settings())
+
+        self.admitted = Counter()
+        self.throttled = Counter()
+        self.throttled_by_device = Counter()
+        self.logged = 0
+        self.dropped = 0
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    # -----------------------------
+    # Settings
+    # -----------------------------
+
+    def _apply(self, settings: dict) -> None:
+        global_burst = settings["globalBurst"] or settings["globalRate"]
+        with self._lock:
+            self.settings = settings
+            self.enabled = settings["enabled"]
+            self.device_rate = settings["deviceRate"]
+            self.device_burst = settings["deviceBurst"]
+            self.global_rate = settings["globalRate"]
+            self.global_burst = max(1.0, global_burst)
+            self.priorities = settings["priorities"]
+            self.reserve = settings["reserve"]
+            self.log_throttled = settings["throttled"] == LOG_ONLY
+            if not self.global_rate:
+                self._global = None
+            elif self._global is None:
+                self._global = _Bucket(self.global_burst, time.monotonic())
+
+    def refresh(self) -> None:
+        """Re-read the stored limits (see update()) and drop idle buckets."""
+        try:
+            stored = self.storage.get_setting(SETTING_NAME)
+            if stored:
+                self._apply(validate_settings({**default_settings(), **stored}))
+        except Exception as e:
+            # Keep the current limits; try again after another interval
+            LOG.error("Failed to load admission settings: %s", e)
+        self._prune()
+
+    def start(self) -> None:
+        """Load the stored limits now and every refresh_seconds, off the event path."""
+        with self._lock:
+            if self._refresher is not None or self.refresh_seconds <= 0:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="admission-refresh",
+                                               daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            self.refresh()
+            if self._stop.wait(self.refresh_seconds):
+                return
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def update(self, changes: dict, persist: bool = True) -> dict:
+        """
+        Change some limits (same keys as settings) and, with persist=True,
+        store them for every other process. Raises ValueError.
+        """
+        unknown = set(changes) - set(self.settings)
+        if unknown:
+            raise ValueError(f"Unknown admission settings: {sorted(unknown)}")
+        current = self.settings
+        if persist:
+            # Build on what is stored, which another process may have changed
+            stored = self.storage.get_setting(SETTING_NAME)
+            if stored:
+                current = validate_settings({**default_settings(), **stored})
+        settings = validate_settings({**current, **changes})
+        if persist:
+            self.storage.put_setting(SETTING_NAME, settings)
+        self._apply(settings)
+        LOG.info("Admission settings changed: %s", changes)
+        return settings
+
+    def _prune(self) -> None:
+        # A full bucket behaves exactly like a missing one
+        now = time.monotonic()
+        with self._lock:
+            full = [
+                d for d, b in self._devices.items()
+                if b.tokens + (now - b.updated) * self.device_rate >= self.device_burst
+            ]
+            for device_id in full:
+                del self._devices[device_id]
+
+    # -----------------------------
+    # Admission
+    # -----------------------------
+
+    def priority(self, event_type, heartbeat: bool = False) -> str:
+        if heartbeat:
+            return LOW
+        return self.priorities.get(event_type, NORMAL) if isinstance(event_type, str) else NORMAL
+
+    def admit(self, device_id: str, event_type=None, heartbeat: bool = False) -> bool:
+        """Take a token for one event; False means it should be throttled."""
+        if self._refresher is None and self.refresh_seconds > 0:
+            self.start()
+        if not self.enabled:
+            return True
+
+        cls = self.priority(event_type, heartbeat)
+        floor = self.reserve.get(cls, 0.0) if cls != HIGH else 0.0
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._devices.get(device_id)
+            if bucket is None:
+                bucket = self._devices[device_id] = _Bucket(self.device_burst, now)
+            bucket.refill(now, self.device_rate, self.device_burst)
+            # The reserve is a share of the burst above the event's own token
+            ok = bucket.tokens - 1 >= floor * (self.device_burst - 1)
+
+            shared = self._global
+            if ok and shared is not None:
+                shared.refill(now, self.global_rate, self.global_burst)
+                ok = shared.tokens - 1 >= floor * (self.global_burst - 1)
+
+            if ok:
+                bucket.tokens -= 1
+                if shared is not None:
+                    shared.tokens -= 1
+                self.admitted[cls] += 1
+                return True
+
+            self.throttled[cls] += 1
+            self.throttled_by_device[device_id] += 1
+            if len(self.throttled_by_device) > _MAX_THROTTLED_DEVICES:
+                self.throttled_by_device = Counter(
+                    dict(self.throttled_by_device.most_common(_MAX_THROTTLED_DEVICES // 10))
+                )
+            if self.log_throttled:
+                self.logged += 1
+            else:
+                self.dropped += 1
+            return False
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            shared = self._global
+            if shared is not None:
+                shared.refill(time.monotonic(), self.global_rate, self.global_burst)
+            return {
+                "settings": dict(self.settings),
+                "admitted": dict(self.admitted),
+                "throttled": dict(self.throttled),
+                "logged": self.logged,
+                "dropped": self.dropped,
+                "devicesTracked": len(self._devices),
+                "globalTokens": round(shared.tokens, 2) if shared is not None else None,
+                "mostThrottled": [
+                    {"deviceId": d, "throttled": n} for d, n in self.throttled_by_device.most_common(5)
+                ],
+            }
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+admission = AdmissionController()
@@ -1,17 +1,36 @@
-from fastapi import FastAPI, HTTPException
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import date
+
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
-import boto3
-import os
-import json
 
-from backend.command_publisher import publish_command
+from backend.admission import admission
+from backend.command_publisher import CommandDropped, get_publisher, publish_command
+from backend.command_tracker import tracker
+from backend.device_registry import registry
+from backend.liveness import liveness
+from backend.log_compaction import iter_archive_bytes, list_partitions
+from backend.rate_control import rate_control, reporting_command
+from backend.storage import get_storage
+from backend.telemetry_rollup import (
+    RESOLUTIONS,
+    parse_time,
+    pick_resolution,
+    query_rollups,
+)
+from backend.topology import topology
+from simulator.shared.logs import get_logger
+
+storage = get_storage()
 
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-STATE_TABLE = os.getenv("STATE_TABLE", "Rakan_DeviceState")
-EVENT_TABLE = os.getenv("EVENT_TABLE", "Rakan_EventLogs")
+LOG = get_logger("api")
 
-dynamodb = boto3.client("dynamodb", region_name=AWS_REGION)
+# How long POST /device/{id}/command waits for delivery before answering "queued"
+COMMAND_WAIT_SECONDS = float(os.getenv("COMMAND_WAIT_SECONDS", "5"))
 
 # ----------------------------------------------------
 # FASTAPI APP + CORS CONFIGURATION
@@ -30,23 +49,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Fleet views (lists, filters, counts) are answered from the in-memory
+# registry: loaded once here, kept current by EventProcessor and reconciled
+# with storage periodically. Single-device reads go to storage.
+@app.on_event("startup")
+def load_device_registry():
+    # Liveness is seeded from the same scans (updatedAt of each device), so
+    # /devices/offline works even when EventProcessor runs elsewhere
+    registry.listeners.append(liveness.seed)
+    liveness.start()
+    try:
+        registry.warm_load()
+    except Exception as e:
+        LOG.error("Device registry warm load failed: %s", e)
+    registry.start_reconciler()
+
+
+# Commands sent from here are retried / timed out by this process
+@app.on_event("startup")
+def start_command_tracker():
+    tracker.start_sweeper()
+
+
 # --------------------------------
 # GET /devices
 # --------------------------------
 @app.get("/devices")
-def get_all_devices():
+def get_all_devices(type: str | None = None, action: str | None = None):
+    """Optional filters: ?type=<event type>&action=<last decided action>"""
     try:
-        resp = dynamodb.scan(TableName=STATE_TABLE)
-        devices = []
+        return registry.list(device_type=type, action=action)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# GET /devices/count
+# --------------------------------
+@app.get("/devices/count")
+def count_devices():
+    try:
+        return registry.counts()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        for item in resp.get("Items", []):
-            devices.append({
-                "deviceId": item["deviceId"]["S"],
-                "state": json.loads(item["state"]["S"]),
-                "updatedAt": item["updatedAt"]["S"]
-            })
 
-        return devices
+# --------------------------------
+# GET /devices/offline
+# --------------------------------
+@app.get("/devices/offline")
+def get_offline_devices(type: str | None = None):
+    """
+    Devices not heard from within LIVENESS_TIMEOUT_SECONDS (longest silent
+    first), answered from backend.liveness without reading storage.
+    """
+    try:
+        devices = liveness.offline(device_type=type)
+        return {"count": len(devices), "devices": devices, "stats": liveness.stats()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -57,21 +116,22 @@ def get_all_devices():
 @app.get("/device/{device_id}")
 def get_device(device_id: str):
     try:
-        resp = dynamodb.get_item(
-            TableName=STATE_TABLE,
-            Key={"deviceId": {"S": device_id}}
-        )
+        # Read through to storage: the registry can be a reconcile interval
+        # behind writes made by the Lambda
+        record = storage.get_device_state(device_id)
 
-        if "Item" not in resp:
+        if record is None:
             raise HTTPException(status_code=404, detail="Device not found")
 
-        item = resp["Item"]
+        registry.refresh(record)
 
         return {
-            "deviceId": item["deviceId"]["S"],
-            "state": json.loads(item["state"]["S"]),
-            "updatedAt": item["updatedAt"]["S"]
+            "deviceId": record["deviceId"],
+            "state": record["state"],
+            "updatedAt": record["updatedAt"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -82,14 +142,13 @@ def get_device(device_id: str):
 @app.get("/logs")
 def get_logs():
     try:
-        resp = dynamodb.scan(TableName=EVENT_TABLE)
         logs = []
 
-        for item in resp.get("Items", []):
+        for record in storage.list_events():
             logs.append({
-                "id": item["id"]["S"],
-                "timestamp": item["timestamp"]["S"],
-                "event": json.loads(item["event"]["S"])
+                "id": record["logId"],
+                "timestamp": record["timestamp"],
+                "event": record["event"]
             })
 
         return logs
@@ -97,6 +156,102 @@ def get_logs():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# --------------------------------
+# GET /logs/archive
+# --------------------------------
+@app.get("/logs/archive")
+def get_log_archive():
+    """Day partitions written by the compaction job."""
+    try:
+        return list_partitions()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# GET /logs/export
+# --------------------------------
+@app.get("/logs/export")
+def export_logs(
+    start: str = Query(..., alias="from"),
+    end: str | None = Query(None, alias="to"),
+):
+    """
+    Stream archived events for days [from, to] (YYYY-MM-DD) as one
+    gzip-compressed NDJSON download. Only serves what the compaction job
+    wrote to this host's ARCHIVE_DIR.
+    """
+    try:
+        first = date.fromisoformat(start)
+        last = date.fromisoformat(end) if end else first
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'from'/'to' must be dates in YYYY-MM-DD form")
+    if first > last:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    # Partitions are named by the canonical form, whatever spelling was sent
+    start, end = first.isoformat(), last.isoformat()
+
+    return StreamingResponse(
+        iter_archive_bytes(start, end),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="events-{start}_{end}.ndjson.gz"'},
+    )
+
+
+# --------------------------------
+# GET /telemetry/{deviceId}
+# --------------------------------
+@app.get("/telemetry/{device_id}")
+def get_telemetry(
+    device_id: str,
+    start: str | None = Query(None, alias="from"),
+    end: str | None = Query(None, alias="to"),
+    resolution: str | None = None,
+):
+    """
+    Aggregated readings for a device, read from the rollup table.
+    from/to accept epoch seconds or ISO-8601 (default: the last 24 hours).
+    resolution is "minute" or "hour" (default: picked from the range).
+    """
+    try:
+        end_ts = parse_time(end) if end is not None else time.time()
+        start_ts = parse_time(start) if start is not None else end_ts - 24 * 3600
+
+        if start_ts is None or end_ts is None:
+            raise HTTPException(status_code=400, detail="'from' and 'to' must be epoch seconds or ISO-8601")
+        if start_ts > end_ts:
+            raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+        if resolution is None:
+            resolution = pick_resolution(start_ts, end_ts)
+        elif resolution not in RESOLUTIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"'resolution' must be one of {sorted(RESOLUTIONS)}"
+            )
+
+        return {
+            "deviceId": device_id,
+            "resolution": resolution,
+            "buckets": query_rollups(device_id, resolution, start_ts, end_ts),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _deliver(device_id: str, command: dict) -> dict:
+    """Publish and wait up to COMMAND_WAIT_SECONDS for delivery."""
+    future = publish_command(device_id, command)
+    try:
+        receipt = future.result(timeout=COMMAND_WAIT_SECONDS)
+    except FutureTimeout:
+        return {"status": "queued", "command": command}
+
+    return {"status": "sent", "command": command, "delivery": receipt}
+
+
 # --------------------------------
 # POST /device/{id}/command
 # --------------------------------
@@ -119,10 +274,206 @@ def send_command(device_id: str, body: dict):
             "reason": "manual override from API"
         }
 
-        publish_command(device_id, command_obj)
+        return _deliver(device_id, command_obj)
+
+    except HTTPException:
+        raise
+    except CommandDropped as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# GET /commands/stats
+# --------------------------------
+@app.get("/commands/stats")
+def command_stats():
+    """Command publisher queue depth, in-flight window and counters."""
+    return get_publisher().stats()
+
+
+# --------------------------------
+# GET /commands/pending
+# --------------------------------
+@app.get("/commands/pending")
+def pending_commands(limit: int = Query(100, ge=1, le=1000)):
+    """
+    Commands published but not yet acknowledged by their device (oldest
+    first), plus ack round-trip histograms, retry and timeout counters.
+    """
+    try:
+        pending = tracker.pending(limit)
+        now = time.time()
+        return {
+            "count": len(pending),
+            "pending": [
+                {
+                    "commandId": p["commandId"],
+                    "deviceId": p["deviceId"],
+                    "action": p["action"],
+                    "attempts": p["attempts"],
+                    "ageSeconds": round(now - p["sentAt"], 3),
+                    "overdue": now > p["deadline"],
+                    "command": p["command"],
+                }
+                for p in pending
+            ],
+            "stats": tracker.stats(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# PUT /device/{id}/reporting
+# --------------------------------
+@app.put("/device/{device_id}/reporting")
+def set_reporting_policy(device_id: str, body: dict):
+    """
+    Body (all optional):
+        { "interval": 1, "reportByException": false, "deadband": 0.1,
+          "heartbeatInterval": 60, "holdSeconds": 600 }
+    Sends set_reporting_policy to the device. With holdSeconds the device
+    keeps this policy (ignoring the rate controller) for that long.
+    """
+    try:
+        policy = dict(body)
+        hold = policy.pop("holdSeconds", None)
+        command_obj = reporting_command(device_id, policy, hold)
+        return _deliver(device_id, command_obj)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CommandDropped as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
-        return {"status": "sent", "command": command_obj}
+# --------------------------------
+# DELETE /device/{id}/reporting
+# --------------------------------
+@app.delete("/device/{device_id}/reporting")
+def reset_reporting_policy(device_id: str):
+    """Return the device to its own reporting settings and end any hold."""
+    try:
+        return _deliver(device_id, reporting_command(device_id, None, reason="Reporting policy reset from API"))
+    except CommandDropped as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# GET /rate-control
+# --------------------------------
+@app.get("/rate-control")
+def rate_control_stats():
+    """Backlog scale, per-device limit and the busiest devices seen by this process."""
+    return rate_control.stats()
 
+
+# --------------------------------
+# GET /admission
+# --------------------------------
+@app.get("/admission")
+def admission_stats():
+    """Admission limits as stored, and admitted / throttled counts for this process."""
+    try:
+        # This process handles no events, so nothing else refreshes them here
+        admission.refresh()
+        return admission.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# PUT /admission
+# --------------------------------
+@app.put("/admission")
+def update_admission(body: dict):
+    """
+    Body (any subset):
+        { "enabled": true, "deviceRate": 1, "deviceBurst": 10,
+          "globalRate": 200, "globalBurst": 400,
+          "priorities": {"motion": "high", "door": "high", "temperature": "low"},
+          "reserve": {"normal": 0.1, "low": 0.3}, "throttled": "log" | "drop" }
+    Stored for every EventProcessor; they pick it up within
+    ADMISSION_REFRESH_SECONDS.
+    """
+    try:
+        return {"status": "updated", "settings": admission.update(body)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# GET /topology
+# --------------------------------
+@app.get("/topology")
+def get_topology():
+    """Rooms and groups with their members, and every compiled route."""
+    try:
+        return topology.summary()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# GET /topology/{id}
+# --------------------------------
+@app.get("/topology/{device_id}")
+def get_device_topology(device_id: str):
+    try:
+        record = topology.get(device_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Device has no topology")
+        return record
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# PUT /topology/{id}
+# --------------------------------
+@app.put("/topology/{device_id}")
+def put_device_topology(device_id: str, body: dict):
+    """
+    Body (all optional):
+        { "room": "kitchen", "groups": ["downstairs"], "role": "sensor" | "actuator",
+          "bindings": ["switch01", "room:kitchen", "group:hall-lights"] }
+    Replaces the device's previous topology.
+    """
+    try:
+        topology.put(
+            device_id,
+            room=body.get("room"),
+            groups=body.get("groups"),
+            role=body.get("role"),
+            bindings=body.get("bindings"),
+        )
+        return topology.get(device_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --------------------------------
+# DELETE /topology/{id}
+# --------------------------------
+@app.delete("/topology/{device_id}")
+def delete_device_topology(device_id: str):
+    try:
+        if not topology.remove(device_id):
+            raise HTTPException(status_code=404, detail="Device has no topology")
+        return {"status": "deleted", "deviceId": device_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
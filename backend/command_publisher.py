@@ -1,11 +1,89 @@
-import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import boto3
 
+from backend.command_tracker import COMMAND_ACK_TRACKING, tracker as ack_tracker
+from simulator.shared.codec import encode_command
+from simulator.shared.logs import COMMAND, get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+COMMAND_TOPIC_FMT = os.getenv("COMMAND_TOPIC_FMT", "rakan/commands/{deviceId}")
+
+# Publishes allowed to be in progress at once, across all devices
+COMMAND_MAX_IN_FLIGHT = int(os.getenv("COMMAND_MAX_IN_FLIGHT", "16"))
+# Distinct pending actions kept per device; the oldest is dropped beyond this
+COMMAND_QUEUE_PER_DEVICE = int(os.getenv("COMMAND_QUEUE_PER_DEVICE", "8"))
+
+LOG = get_logger("command_publisher")
+
+
+class CommandDropped(Exception):
+    """The command was evicted from a full per-device queue before it was sent."""
+
+
+class _Pending:
+    __slots__ = ("command", "future", "queued_at", "coalesced")
+
+    def __init__(self, command):
+        self.command = command
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.coalesced = 0
+
+
 class CommandPublisher:
-    def __init__(self):
-        self.client = boto3.client("iot-data", region_name="us-east-1")
+    """
+    Asynchronous command publishing to AWS IoT Core.
+
+    publish() queues the command and returns a Future that resolves with a
+    delivery receipt once iot-data has accepted it (or raises the publish
+    error / CommandDropped).
+
+    Each device has a bounded queue holding at most one pending command per
+    action: a newer command for the same (device, action) replaces the
+    unsent one, and both callers share the same future. A device has at
+    most one publish in flight, so its commands go out in order; across
+    devices at most `max_in_flight` publishes run at once.
+
+    Every command gets a commandId and is handed to the `tracker`
+    (backend.command_tracker) just before it is published; the tracker
+    waits for the device's ack and re-sends through this publisher if it
+    does not come.
+    """
+
+    def __init__(self, client=None, max_in_flight=COMMAND_MAX_IN_FLIGHT,
+                 max_queue_per_device=COMMAND_QUEUE_PER_DEVICE, tracker=None):
+        self.client = client or boto3.client("iot-data", region_name=AWS_REGION)
+        self.tracker = tracker
+        self.max_in_flight = max_in_flight
+        self.max_queue_per_device = max_queue_per_device
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queues = {}              # deviceId -> OrderedDict(action -> _Pending)
+        self._ready = deque()          # devices with queued commands, none in flight
+        self._busy = set()             # devices with a publish in flight
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight,
+                                            thread_name_prefix="command-publisher")
+
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
 
-    def publish(self, device_id, command: dict):
+    def publish(self, device_id, command: dict, retry: bool = False) -> Future:
         """
         command must contain:
             deviceId
@@ -13,23 +91,164 @@ class CommandPublisher:
             value
             reason (optional)
             timestamp (optional)
+        A commandId is added if missing. retry=True (used by the ack
+        tracker) never replaces a newer queued command for the same action.
         """
+        action = command.get("action")
+        command.setdefault("commandId", uuid.uuid4().hex)
 
-        topic = f"rakan/commands/{device_id}"
-        payload = json.dumps(command)
+        with self._lock:
+            queue = self._queues.get(device_id)
+            new_queue = queue is None
+            if new_queue:
+                queue = self._queues[device_id] = OrderedDict()
 
-        self.client.publish(
-            topic=topic,
-            qos=1,
-            payload=payload
-        )
-        print(f"[CommandPublisher] Published → {topic}: {payload}")
+            pending = queue.get(action)
+            if pending is not None and retry:
+                return pending.future
+            if pending is not None:
+                # Latest wins: the unsent command is replaced in place
+                pending.command = command
+                pending.coalesced += 1
+                self.coalesced += 1
+                return pending.future
+
+            dropped = None
+            if len(queue) >= self.max_queue_per_device:
+                _, dropped = queue.popitem(last=False)
+                self.queued -= 1
+                self.dropped += 1
+
+            pending = queue[action] = _Pending(command)
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+            # An existing queue is already in _ready, or re-queued by _send
+            if new_queue and device_id not in self._busy:
+                self._ready.append(device_id)
+            self._pump()
+
+        if dropped is not None:
+            dropped.future.set_exception(
+                CommandDropped(f"queue for {device_id} is full ({self.max_queue_per_device})")
+            )
+        return pending.future
+
+    def _pump(self):
+        # Caller holds the lock
+        while self.in_flight < self.max_in_flight and self._ready:
+            device_id = self._ready.popleft()
+            queue = self._queues[device_id]
+            _, pending = queue.popitem(last=False)
+            if not queue:
+                del self._queues[device_id]
+
+            self.queued -= 1
+            self.in_flight += 1
+            self._busy.add(device_id)
+            self._executor.submit(self._send, device_id, pending)
+
+    def _send(self, device_id, pending):
+        command = pending.command
+        topic = COMMAND_TOPIC_FMT.format(deviceId=device_id)
+
+        # Track before publishing: the ack can arrive before publish() returns
+        tracked = False
+        if self.tracker is not None:
+            try:
+                self.tracker.track(device_id, command,
+                                   resend=lambda c: self.publish(device_id, c, retry=True))
+                tracked = True
+            except Exception as e:
+                LOG.error("Failed to track %s: %s", command.get("commandId"), e)
+
+        error = None
+        try:
+            self.client.publish(topic=topic, qos=1, payload=encode_command(command))
+        except Exception as e:
+            error = e
+
+        if error is not None and tracked:
+            try:
+                self.tracker.discard(device_id, command)
+            except Exception as e:
+                LOG.error("Failed to discard %s: %s", command.get("commandId"), e)
+
+        # Resolve before the bookkeeping below so flush() implies resolved futures
+        if error is not None:
+            LOG.error("Failed to publish → %s: %s", topic, error)
+            pending.future.set_exception(error)
+        else:
+            LOG.debug("Published → %s: %s", topic, command, extra=COMMAND)
+            pending.future.set_result({
+                "deviceId": device_id,
+                "topic": topic,
+                "action": command.get("action"),
+                "commandId": command.get("commandId"),
+                "coalesced": pending.coalesced,
+                "latencyMs": (time.monotonic() - pending.queued_at) * 1000,
+            })
+
+        with self._lock:
+            self.in_flight -= 1
+            self._busy.discard(device_id)
+            if error is None:
+                self.published += 1
+            else:
+                self.failed += 1
+            if device_id in self._queues:
+                self._ready.append(device_id)
+            self._pump()
+            if not self.in_flight and not self.queued:
+                self._idle.notify_all()
+
+    def queue_depth(self, device_id) -> int:
+        with self._lock:
+            return len(self._queues.get(device_id, ()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            deepest = sorted(
+                ((len(q), d) for d, q in self._queues.items()), reverse=True
+            )[:5]
+            return {
+                "queued": self.queued,
+                "maxQueued": self.max_queued,
+                "inFlight": self.in_flight,
+                "maxInFlight": self.max_in_flight,
+                "devicesWaiting": len(self._queues),
+                "deepestQueues": [{"deviceId": d, "depth": n} for n, d in deepest],
+                "published": self.published,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def flush(self, timeout=None) -> bool:
+        """Wait until every queued command has been sent. False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self.in_flight and not self.queued, timeout)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        self._executor.shutdown(wait=False)
 
 
 # -----------------------------
-# WRAPPER USED BY EVENTPROCESSOR
+# WRAPPER USED BY API / EVENTPROCESSOR
 # -----------------------------
-_publisher = CommandPublisher()
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher() -> CommandPublisher:
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = CommandPublisher(tracker=ack_tracker if COMMAND_ACK_TRACKING else None)
+    return _publisher
+
 
-def publish_command(device_id: str, command: dict):
-    return _publisher.publish(device_id, command)
+def publish_command(device_id: str, command: dict) -> Future:
+    return get_publisher().publish(device_id, command)
@@ -0,0 +1,264 @@
+import copy
+import heapq
+import os
+import threading
+import time
+
+from backend.storage import get_storage
+from backend.tracing import tracer
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# Seconds to wait for a device ack before retrying (doubles per attempt)
+ACK_TIMEOUT_SECONDS = float(os.getenv("ACK_TIMEOUT_SECONDS", "5"))
+ACK_BACKOFF = float(os.getenv("ACK_BACKOFF", "2"))
+# Re-sends of an unacknowledged command before it is counted as timed out
+COMMAND_MAX_RETRIES = int(os.getenv("COMMAND_MAX_RETRIES", "2"))
+ACK_SWEEP_SECONDS = float(os.getenv("ACK_SWEEP_SECONDS", "1"))
+COMMAND_ACK_TRACKING = os.getenv("COMMAND_ACK_TRACKING", "1") == "1"
+
+RTT_HOP = "command_rtt"
+
+LOG = get_logger("command_tracker")
+
+
+class _Tracked:
+    """Process-local half of a pending command: its timer and how to resend it."""
+    __slots__ = ("device_id", "action", "command", "attempts", "deadline", "resend")
+
+    def __init__(self, device_id, action, command, attempts, deadline, resend):
+        self.device_id = device_id
+        self.action = action
+        self.command = command
+        self.attempts = attempts
+        self.deadline = deadline
+        self.resend = resend
+
+
+class CommandTracker:
+    """
+    Pending-command table keyed by commandId.
+
+    track() is called just before a command is published: the entry is
+    written to storage (so an ack handled by another process, e.g. the
+    Lambda for a command sent by the API, can resolve it) and a local timer
+    is armed. Writing it first means even an ack that beats the publish
+    call's return finds its row; if the publish fails, discard() takes the
+    entry back. resolve() is called for every ack event on rakan/events and
+    records the command round trip. sweep() retries commands whose ack is
+    overdue, up to COMMAND_MAX_RETRIES with backoff, then counts a timeout.
+
+    A newer command for the same (device, action) supersedes an older
+    pending one, which is then neither retried nor counted as timed out.
+    """
+
+    def __init__(self, storage=None, timeout=ACK_TIMEOUT_SECONDS,
+                 max_retries=COMMAND_MAX_RETRIES, backoff=ACK_BACKOFF):
+        self._storage = storage
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._lock = threading.Lock()
+        self._local = {}        # commandId -> _Tracked
+        self._latest = {}       # (deviceId, action) -> commandId
+        self._timers = []       # heap of (deadline, commandId, attempts)
+        self._sweeper = None
+        self._stop = threading.Event()
+
+        self.tracked = 0
+        self.acked = 0
+        self.retried = 0
+        self.timed_out = 0
+        self.superseded = 0
+        self.failed = 0
+        self.unmatched_acks = 0
+        self.timeouts_by_device = {}
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    # -----------------------------
+    # Sender side
+    # -----------------------------
+
+    def track(self, device_id: str, command: dict, resend=None) -> None:
+        command_id = command.get("commandId")
+        if not command_id:
+            return
+
+        action = command.get("action")
+        attempts = int(command.get("attempt", 1))
+        now = time.time()
+        deadline = now + self.timeout * self.backoff ** (attempts - 1)
+
+        with self._lock:
+            previous = self._latest.get((device_id, action))
+            if previous and previous != command_id and self._local.pop(previous, None):
+                self.superseded += 1
+            else:
+                previous = None
+            self._latest[(device_id, action)] = command_id
+            self._local[command_id] = _Tracked(device_id, action, command, attempts, deadline, resend)
+            heapq.heappush(self._timers, (deadline, command_id, attempts))
+            if attempts == 1:
+                self.tracked += 1
+
+        if previous:
+            self.storage.take_pending_command(previous)
+        self.storage.put_pending_command({
+            "commandId": command_id,
+            "deviceId": device_id,
+            "action": action,
+            "command": command,
+            "sentAt": now,
+            "deadline": deadline,
+            "attempts": attempts,
+        })
+
+    def discard(self, device_id: str, command: dict) -> None:
+        """Undo track() for a command whose publish failed."""
+        command_id = command.get("commandId")
+        if not command_id:
+            return
+
+        with self._lock:
+            # Its timer is skipped by sweep() once the entry is gone
+            entry = self._local.pop(command_id, None)
+            if entry is not None and self._latest.get((device_id, entry.action)) == command_id:
+                del self._latest[(device_id, entry.action)]
+            self.failed += 1
+        self.storage.take_pending_command(command_id)
+
+    def sweep(self, now: float | None = None) -> None:
+        """Retry or time out every command whose ack deadline has passed."""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._timers and self._timers[0][0] <= now:
+                _, command_id, attempts = heapq.heappop(self._timers)
+                entry = self._local.get(command_id)
+                # Skip timers of acked / superseded / re-armed commands
+                if entry is not None and entry.attempts == attempts:
+                    due.append((command_id, entry))
+
+        for command_id, entry in due:
+            if self.storage.get_pending_command(command_id) is None:
+                # Acknowledged through another process
+                self._forget(command_id, entry)
+                continue
+
+            if entry.attempts <= self.max_retries and entry.resend is not None:
+                retry = copy.copy(entry.command)
+                retry["attempt"] = entry.attempts + 1
+                with self._lock:
+                    self.retried += 1
+                    entry.attempts = retry["attempt"]
+                    # track() re-arms the timer when the retry is sent;
+                    # this one only fires if that never happens
+                    fallback = now + self.timeout * self.backoff ** (entry.attempts - 1)
+                    heapq.heappush(self._timers, (fallback, command_id, entry.attempts))
+                try:
+                    entry.resend(retry)
+                except Exception as e:
+                    LOG.error("Retry of %s failed: %s", command_id, e)
+                continue
+
+            if self.storage.take_pending_command(command_id) is not None:
+                with self._lock:
+                    self.timed_out += 1
+                    self.timeouts_by_device[entry.device_id] = \
+                        self.timeouts_by_device.get(entry.device_id, 0) + 1
+                LOG.warning("No ack for %s → %s after %d attempt(s)",
+                            command_id, entry.device_id, entry.attempts)
+            self._forget(command_id, entry)
+
+    def _forget(self, command_id, entry):
+        with self._lock:
+            self._local.pop(command_id, None)
+            key = (entry.device_id, entry.action)
+            if self._latest.get(key) == command_id:
+                del self._latest[key]
+
+    def start_sweeper(self, interval: float = ACK_SWEEP_SECONDS) -> None:
+        if self._sweeper is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    LOG.error("Sweep failed: %s", e)
+
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=loop, name="command-tracker", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self, timeout: float = 5) -> None:
+        """Stop the background sweeper; a sweep in progress is waited for."""
+        sweeper, self._sweeper = self._sweeper, None
+        if sweeper is None:
+            return
+        self._stop.set()
+        sweeper.join(timeout)
+
+    # -----------------------------
+    # Receiver side
+    # -----------------------------
+
+    def resolve(self, ack: dict) -> dict | None:
+        """Match an ack event to its pending command; returns the entry or None."""
+        command_id = ack.get("commandId")
+        record = self.storage.take_pending_command(command_id) if command_id else None
+
+        with self._lock:
+            entry = self._local.pop(command_id, None)
+            if entry is not None and self._latest.get((entry.device_id, entry.action)) == command_id:
+                del self._latest[(entry.device_id, entry.action)]
+            if record is None:
+                # Duplicate ack, or one for a command that already timed out
+                self.unmatched_acks += 1
+                return None
+            self.acked += 1
+
+        # Measured from the latest (re)send of the command
+        rtt_ms = max(0.0, (time.time() - record["sentAt"]) * 1000)
+        tracer.record(RTT_HOP, ack.get("deviceType"), rtt_ms)
+        record["rttMs"] = rtt_ms
+        return record
+
+    # -----------------------------
+    # Views
+    # -----------------------------
+
+    def pending(self, limit: int | None = None) -> list[dict]:
+        return self.storage.list_pending_commands(limit)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "tracked": self.tracked,
+                "acked": self.acked,
+                "retried": self.retried,
+                "timedOut": self.timed_out,
+                "superseded": self.superseded,
+                "publishFailed": self.failed,
+                "unmatchedAcks": self.unmatched_acks,
+                "awaitingAck": len(self._local),
+                "timeoutsByDevice": dict(self.timeouts_by_device),
+            }
+        counters["rttMs"] = tracer.snapshot().get(RTT_HOP, {})
+        return counters
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+tracker = CommandTracker()
@@ -1,28 +1,14 @@
-import os
-import uuid
 from datetime import datetime, timezone
 
-import boto3
-from boto3.dynamodb.conditions import Key
+from backend.storage import get_storage
 
 # -----------------------------
 # Configuration
 # -----------------------------
 
-# AWS region (same as your DynamoDB tables, e.g., us-east-1)
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-
-# Table names (default to your Rakan_* tables, but allow env override)
-DEVICE_STATE_TABLE = os.getenv("DEVICE_TABLE", "Rakan_DeviceState")
-EVENT_LOGS_TABLE = os.getenv("LOG_TABLE", "Rakan_EventLogs")
-
-# Index name for querying logs by deviceId
-EVENT_LOGS_DEVICE_INDEX = os.getenv("EVENT_LOGS_DEVICE_INDEX", "DeviceIdIndex")
-
-# DynamoDB resource + table objects
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-device_state_table = dynamodb.Table(DEVICE_STATE_TABLE)
-event_logs_table = dynamodb.Table(EVENT_LOGS_TABLE)
+# Device state and event logs live in whichever STORAGE_BACKEND is
+# configured ("dynamodb" by default, "sqlite" for local / edge runs).
+storage = get_storage()
 
 
 # -----------------------------
@@ -48,17 +34,13 @@ def save_device_state(device_id: str, device_type: str, state: dict, extra: dict
         state: dict - e.g., {"value": True}
         extra: dict - additional fields, ex: {"location": "Bedroom"}
     """
-    item: dict = {
-        "deviceId": device_id,
-        "type": device_type,
-        "state": state,
-        "lastSeenAt": _now_iso(),
-    }
-
-    if extra:
-        item.update(extra)
-
-    device_state_table.put_item(Item=item)
+    storage.put_device_state(
+        device_id,
+        state,
+        _now_iso(),
+        device_type=device_type,
+        extra=extra,
+    )
 
 
 def get_device_state(device_id: str) -> dict | None:
@@ -66,8 +48,7 @@ def get_device_state(device_id: str) -> dict | None:
     Get the current state of a device from Rakan_DeviceState.
     Returns a dict or None if not found.
     """
-    resp = device_state_table.get_item(Key={"deviceId": device_id})
-    return resp.get("Item")
+    return storage.get_device_state(device_id)
 
 
 # -----------------------------
@@ -96,42 +77,30 @@ def log_event(
     if created_at is None:
         created_at = _now_iso()
 
-    log_id = str(uuid.uuid4())
-
-    item: dict = {
-        "logId": log_id,
+    event: dict = {
         "deviceId": device_id,
-        "eventType": event_type,
+        "type": event_type,
         "value": value,
         "source": source,
-        "createdAt": created_at,
     }
 
     if details:
-        item["details"] = details
+        event["details"] = details
 
-    event_logs_table.put_item(Item=item)
-    return log_id
+    return storage.log_event(event, created_at)["logId"]
 
 
 def get_recent_events_for_device(device_id: str, limit: int = 20) -> list[dict]:
     """
-    Query Rakan_EventLogs using DeviceIdIndex to fetch the most recent events
-    for a single device.
+    Fetch the most recent events for a single device, newest first
+    (DeviceIdIndex on DynamoDB, the (deviceId, timestamp) index on SQLite).
     """
-    resp = event_logs_table.query(
-        IndexName=EVENT_LOGS_DEVICE_INDEX,
-        KeyConditionExpression=Key("deviceId").eq(device_id),
-        ScanIndexForward=False,  # Newest events first
-        Limit=limit,
-    )
-    return resp.get("Items", [])
+    return storage.get_recent_events_for_device(device_id, limit)
 
 
 def get_recent_events_global(limit: int = 50) -> list[dict]:
     """
-    Scan Rakan_EventLogs for recent events across all devices.
+    Recent events across all devices.
     (Used for frontend dashboard.)
     """
-    resp = event_logs_table.scan(Limit=limit)
-    return resp.get("Items", [])
+    return storage.get_recent_events_global(limit)
@@ -0,0 +1,248 @@
+import os
+import threading
+
+from backend.storage import get_storage
+from backend.telemetry_rollup import parse_time
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# How often the registry is re-read from storage to correct drift
+# (missed updates, writes from other processes). 0 disables it.
+REGISTRY_RECONCILE_SECONDS = float(os.getenv("REGISTRY_RECONCILE_SECONDS", "60"))
+
+LOG = get_logger("device_registry")
+
+
+def _is_newer(updated_at, than) -> bool:
+    """
+    True if updated_at is later than `than`. Both may be epoch numbers or
+    ISO strings (simulators send epochs, the API writes ISO); a missing or
+    unparseable value counts as oldest.
+    """
+    a, b = parse_time(updated_at), parse_time(than)
+    if a is None:
+        return False
+    return b is None or a > b
+
+
+class _DeviceRecord:
+    __slots__ = ("device_id", "device_type", "action", "state", "updated_at")
+
+    def __init__(self, device_id, device_type, state, updated_at):
+        self.device_id = device_id
+        self.device_type = device_type
+        self.state = state
+        self.updated_at = updated_at
+        self.action = state.get("action") if isinstance(state, dict) else None
+
+    def same_as(self, other) -> bool:
+        return (
+            self.device_type == other.device_type
+            and self.state == other.state
+            and self.updated_at == other.updated_at
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "deviceId": self.device_id,
+            "state": self.state,
+            "updatedAt": self.updated_at,
+        }
+
+
+class DeviceRegistry:
+    """
+    In-memory view of Rakan_DeviceState.
+
+    Warm-loaded once from storage, then kept current by EventProcessor as
+    decisions are made. Secondary indexes by type and action make filtered
+    listings and counts dictionary lookups instead of table scans.
+
+    Between reconciles it can lag writes made by other processes, so it
+    serves list, filter and count views only; single-device reads go to
+    storage and are folded back in with refresh().
+    """
+
+    def __init__(self):
+        self._devices = {}
+        self._by_type = {}
+        self._by_action = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reconciler = None
+        self._stop = threading.Event()
+        # Called with the raw storage records after every load / reconcile
+        self.listeners = []
+
+    # -----------------------------
+    # Index maintenance (caller holds the lock)
+    # -----------------------------
+
+    def _index(self, record):
+        self._devices[record.device_id] = record
+        self._by_type.setdefault(record.device_type, set()).add(record.device_id)
+        self._by_action.setdefault(record.action, set()).add(record.device_id)
+
+    def _unindex(self, device_id):
+        record = self._devices.pop(device_id, None)
+        if record is None:
+            return
+        for index, key in ((self._by_type, record.device_type), (self._by_action, record.action)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(device_id)
+                if not ids:
+                    del index[key]
+
+    # -----------------------------
+    # Loading
+    # -----------------------------
+
+    def warm_load(self) -> int:
+        """Replace the registry with the current contents of storage."""
+        rows = get_storage().list_device_states()
+        records = [
+            _DeviceRecord(r["deviceId"], r.get("type"), r.get("state"), r.get("updatedAt"))
+            for r in rows
+        ]
+        with self._lock:
+            self._devices, self._by_type, self._by_action = {}, {}, {}
+            for record in records:
+                self._index(record)
+            self._loaded = True
+        self._notify(rows)
+        return len(records)
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.warm_load()
+
+    def reconcile(self) -> int:
+        """
+        Compare the registry against storage and fix any difference.
+        Returns the number of devices that had drifted.
+        """
+        rows = get_storage().list_device_states()
+        fresh = {
+            r["deviceId"]: _DeviceRecord(r["deviceId"], r.get("type"), r.get("state"), r.get("updatedAt"))
+            for r in rows
+        }
+
+        drift = 0
+        with self._lock:
+            for device_id in list(self._devices):
+                if device_id not in fresh:
+                    self._unindex(device_id)
+                    drift += 1
+
+            for device_id, record in fresh.items():
+                current = self._devices.get(device_id)
+                if current is not None and current.same_as(record):
+                    continue
+                # Never roll back an update that is newer than the table row
+                if current is not None and _is_newer(current.updated_at, record.updated_at):
+                    continue
+                self._unindex(device_id)
+                self._index(record)
+                drift += 1
+
+            self._loaded = True
+
+        if drift:
+            LOG.info("Reconciled %d drifted devices", drift)
+        self._notify(rows)
+        return drift
+
+    def _notify(self, rows):
+        for listener in self.listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                LOG.error("Registry listener failed: %s", e)
+
+    def start_reconciler(self, interval: float = REGISTRY_RECONCILE_SECONDS) -> None:
+        if interval <= 0 or self._reconciler is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    LOG.error("Reconcile failed: %s", e)
+
+        self._reconciler = threading.Thread(target=_loop, daemon=True)
+        self._reconciler.start()
+
+    def stop_reconciler(self) -> None:
+        self._stop.set()
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+
+    def apply(self, device_id: str, state: dict, updated_at: str, device_type: str | None = None) -> None:
+        """Record a new state for a device (called after each decision)."""
+        with self._lock:
+            previous = self._devices.get(device_id)
+            if device_type is None and previous is not None:
+                device_type = previous.device_type
+            self._unindex(device_id)
+            self._index(_DeviceRecord(device_id, device_type, state, updated_at))
+
+    def refresh(self, row: dict) -> None:
+        """
+        Fold one storage record (e.g. from a single-device read) into the
+        registry, unless the registry already holds a newer update.
+        """
+        record = _DeviceRecord(row["deviceId"], row.get("type"), row.get("state"), row.get("updatedAt"))
+        with self._lock:
+            current = self._devices.get(record.device_id)
+            if current is not None and (current.same_as(record) or _is_newer(current.updated_at, record.updated_at)):
+                return
+            if record.device_type is None and current is not None:
+                record.device_type = current.device_type
+            self._unindex(record.device_id)
+            self._index(record)
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+
+    def get(self, device_id: str) -> dict | None:
+        self.ensure_loaded()
+        record = self._devices.get(device_id)
+        return record.to_dict() if record else None
+
+    def list(self, device_type: str | None = None, action: str | None = None) -> list[dict]:
+        self.ensure_loaded()
+        with self._lock:
+            if device_type is None and action is None:
+                records = list(self._devices.values())
+            else:
+                ids = None
+                if device_type is not None:
+                    ids = set(self._by_type.get(device_type, ()))
+                if action is not None:
+                    action_ids = self._by_action.get(action, set())
+                    ids = action_ids.copy() if ids is None else ids & action_ids
+                records = [self._devices[i] for i in ids]
+        return [r.to_dict() for r in records]
+
+    def counts(self) -> dict:
+        self.ensure_loaded()
+        with self._lock:
+            return {
+                "total": len(self._devices),
+                "byType": {k: len(v) for k, v in self._by_type.items() if k is not None},
+                "byAction": {k: len(v) for k, v in self._by_action.items() if k is not None},
+            }
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+registry = DeviceRegistry()
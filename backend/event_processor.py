@@ -1,24 +1,49 @@
+import base64
 import json
 import os
-import uuid
+import time
 from datetime import datetime
 
 import boto3
 
+from backend.admission import admission
+from backend.command_publisher import get_publisher, publish_command
+from backend.command_tracker import tracker
+from backend.device_registry import registry
+from backend.liveness import liveness
+from backend.rate_control import rate_control
+from backend.storage import get_storage
+from backend.telemetry_rollup import flush_telemetry, record_telemetry
+from backend.topology import topology
+from backend.tracing import start_trace
+from simulator.shared import logs
+from simulator.shared.codec import JSON, decode, note_encoding
+from simulator.shared.schemas import validate_event
+
 # -----------------------------
 # AWS CLIENTS & ENV VARS
 # -----------------------------
 
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-EVENT_TABLE = os.getenv("EVENT_TABLE", "Rakan_EventLogs")
-STATE_TABLE = os.getenv("STATE_TABLE", "Rakan_DeviceState")
 LAM_FUNCTION_NAME = os.getenv("LAM_FUNCTION_NAME", "LAMDecisionEngine")
-COMMAND_TOPIC_FMT = os.getenv("COMMAND_TOPIC_FMT", "rakan/commands/{deviceId}")
+VALIDATE_EVENTS = os.getenv("VALIDATE_EVENTS", "1") == "1"
+# Seconds lambda_handler waits for queued commands before returning
+COMMAND_FLUSH_TIMEOUT = float(os.getenv("COMMAND_FLUSH_TIMEOUT", "5"))
+# Least time between lastSeenAt writes for one device from heartbeats, acks
+# and throttled events (0: every event). Keep it well under
+# LIVENESS_TIMEOUT_SECONDS.
+LAST_SEEN_WRITE_SECONDS = float(os.getenv("LAST_SEEN_WRITE_SECONDS", "30"))
+
+# Devices whose last lastSeenAt write is remembered per process
+_MAX_LAST_SEEN_TRACKED = 100_000
+
+# Command telling a sensor that its decision went to bound actuators
+ROUTED_ACTION = "routed"
 
-dynamodb = boto3.client("dynamodb", region_name=AWS_REGION)
-iot = boto3.client("iot-data", region_name=AWS_REGION)
 lam = boto3.client("lambda", region_name=AWS_REGION)
 
+LOG = logs.get_logger("event_processor")
+
 
 # -----------------------------
 # HELPERS
@@ -26,16 +51,9 @@ lam = boto3.client("lambda", region_name=AWS_REGION)
 
 def _log_event(event: dict) -> None:
     try:
-        dynamodb.put_item(
-            TableName=EVENT_TABLE,
-            Item={
-                "logId": {"S": str(uuid.uuid4())},          # MUST match table PK
-                "timestamp": {"S": datetime.utcnow().isoformat() + "Z"},
-                "event": {"S": json.dumps(event)},
-            },
-        )
+        get_storage().log_event(event, datetime.utcnow().isoformat() + "Z")
     except Exception as e:
-        print(f"[EventProcessor] Failed to log event: {e}")
+        LOG.error("Failed to log event: %s", e)
 
 
 
@@ -44,19 +62,12 @@ def _update_device_state(device_id: str, decision: dict, event: dict) -> None:
     Update the DeviceState table with the latest decision + event.
     """
     try:
-        timestamp = event.get("timestamp") or datetime.utcnow().isoformat() + "Z"
-        dynamodb.update_item(
-            TableName=STATE_TABLE,
-            Key={"deviceId": {"S": device_id}},
-            UpdateExpression="SET #s = :state, updatedAt = :ts",
-            ExpressionAttributeNames={"#s": "state"},
-            ExpressionAttributeValues={
-                ":state": {"S": json.dumps(decision)},
-                ":ts": {"S": timestamp},
-            },
-        )
+        timestamp = str(event.get("timestamp") or datetime.utcnow().isoformat() + "Z")
+        device_type = event.get("type")
+        get_storage().put_device_state(device_id, decision, timestamp, device_type=device_type)
+        registry.apply(device_id, decision, timestamp, device_type=device_type)
     except Exception as e:
-        print(f"[EventProcessor] Failed to update device state: {e}")
+        LOG.error("Failed to update device state: %s", e)
 
 
 def _call_lam(event: dict) -> dict:
@@ -71,9 +82,12 @@ def _call_lam(event: dict) -> dict:
         )
         payload_bytes = response.get("Payload").read()
         decision = json.loads(payload_bytes or "{}")
+        # The LAM handler answers in API Gateway shape: {"statusCode", "body"}
+        if isinstance(decision, dict) and isinstance(decision.get("body"), str):
+            decision = json.loads(decision["body"])
         return decision
     except Exception as e:
-        print(f"[EventProcessor] LAM invoke error: {e}")
+        LOG.error("LAM invoke error: %s", e)
         return {"error": str(e)}
 
 
@@ -103,19 +117,49 @@ def _fallback_decision(event: dict) -> dict:
 
 def _publish_command(decision: dict) -> None:
     """
-    Publish the decision as a command to AWS IoT Core.
-    Topic: rakan/commands/{deviceId}
+    Queue the decision as a command for AWS IoT Core
+    (topic rakan/commands/{deviceId}); see backend.command_publisher.
+    Failures are reported by the publisher.
     """
     try:
-        device_id = decision["deviceId"]
-        topic = COMMAND_TOPIC_FMT.format(deviceId=device_id)
-        iot.publish(
-            topic=topic,
-            qos=1,
-            payload=json.dumps(decision),
-        )
+        publish_command(decision["deviceId"], decision)
+    except Exception as e:
+        LOG.error("Failed to publish command: %s", e)
+
+
+def _route_decision(decision: dict) -> list[dict]:
+    """
+    One command per actuator the deciding device is bound to
+    (backend.topology), or the decision itself when it has no bindings.
+    "ignore" decisions are never fanned out.
+    """
+    if decision.get("action") == "ignore":
+        return [decision]
+    source = decision["deviceId"]
+    try:
+        targets = topology.targets(source)
     except Exception as e:
-        print(f"[EventProcessor] Failed to publish command: {e}")
+        LOG.error("Topology lookup failed: %s", e)
+        targets = ()
+    if not targets:
+        return [decision]
+    return [dict(decision, deviceId=target, sourceDeviceId=source) for target in targets]
+
+
+def _routed_notice(decision: dict, commands: list[dict]) -> dict:
+    """
+    Tell the deciding device where its decision went. It carries the
+    event's correlationId, so the device still closes its event -> command
+    round trip when the commands themselves went to other devices.
+    """
+    return {
+        "deviceId": decision["deviceId"],
+        "action": ROUTED_ACTION,
+        "value": [c["deviceId"] for c in commands],
+        "reason": decision["reason"],
+        "timestamp": decision["timestamp"],
+        "correlationId": decision["correlationId"],
+    }
 
 
 # -----------------------------
@@ -125,22 +169,79 @@ def _publish_command(decision: dict) -> None:
 class EventProcessor:
     """
     EventProcessor:
-      1. Receives event from AWS IoT Rule (Lambda trigger)
+      1. Receives event from AWS IoT Rule (Lambda trigger) and validates it
+         against simulator/shared/schemas.py
+         (heartbeats are logged, rolled up and stamp lastSeenAt in
+         DeviceState, then stop before step 3;
+         command acks only resolve backend.command_tracker and stamp
+         lastSeenAt;
+         other events are counted by backend.rate_control, which may
+         push a new reporting interval to the device, then pass
+         backend.admission or are only logged / dropped, stamping
+         lastSeenAt)
       2. Logs the raw event to EventLogs
       3. Calls LAM (AI_DecisionEngine) with the event
       4. Validates LAM decision or uses fallback
-      5. Publishes command to IoT Core
+      5. Publishes command to IoT Core, once per actuator bound to the
+         device in backend.topology (or to the device itself if unbound;
+         a bound device gets a "routed" notice with its correlationId)
       6. Updates device state in DeviceState
       7. Returns decision for debugging / API
+
+    Each event carries a correlationId (stamped by the device, or here if
+    missing) that is copied onto the command, and every step is timed as a
+    span in backend.tracing.
+
+    `decide` and `publish` default to the LAM Lambda and AWS IoT Core;
+    local runs (simulator.local_pipeline) inject in-process versions.
     """
 
+    def __init__(self, decide=None, publish=None):
+        self._decide = decide or _call_lam
+        self._publish = publish or _publish_command
+        self.rejected = 0
+        self.throttled = 0
+        self._last_seen_written = {}
+
+    def _mark_seen(self, device_id: str, now: float) -> None:
+        if len(self._last_seen_written) >= _MAX_LAST_SEEN_TRACKED:
+            self._last_seen_written.clear()
+        self._last_seen_written[device_id] = now
+
+    def _touch_last_seen(self, device_id: str) -> None:
+        """
+        Stamp lastSeenAt for events that write no state (heartbeats, acks,
+        throttled events), so processes that seed liveness from storage
+        (the API) keep the device online. At most once per
+        LAST_SEEN_WRITE_SECONDS per device.
+        """
+        now = time.monotonic()
+        written = self._last_seen_written.get(device_id)
+        if written is not None and now - written < LAST_SEEN_WRITE_SECONDS:
+            return
+        self._mark_seen(device_id, now)
+        try:
+            get_storage().touch_device_state(device_id, datetime.utcnow().isoformat() + "Z")
+        except Exception as e:
+            LOG.error("Failed to record last seen for %s: %s", device_id, e)
+
     def handle_event(self, event: dict) -> dict:
-        # Allow string payloads (just in case)
-        if isinstance(event, str):
+        encoding = JSON
+
+        # Binary payloads reach the Lambda base64-wrapped by the IoT Rule:
+        # SELECT encode(*, 'base64') AS payload FROM 'rakan/events'
+        if isinstance(event, dict) and len(event) == 1 and isinstance(event.get("payload"), str):
+            try:
+                event = base64.b64decode(event["payload"], validate=True)
+            except Exception:
+                return {"error": "Event payload must be base64"}
+
+        # Allow string / raw payloads, JSON or compact (simulator/shared/codec.py)
+        if isinstance(event, (str, bytes, bytearray, memoryview)):
             try:
-                event = json.loads(event)
+                event, encoding = decode(event)
             except Exception:
-                return {"error": "Event must be valid JSON string or dict"}
+                return {"error": "Event must be valid JSON string, compact frame or dict"}
 
         if not isinstance(event, dict):
             return {"error": "Event must be a JSON object"}
@@ -149,11 +250,71 @@ class EventProcessor:
         if not device_id:
             return {"error": "Missing deviceId in event"}
 
+        # Reject malformed events before they cost a log write and a LAM call
+        if VALIDATE_EVENTS:
+            error = validate_event(event)
+            if error:
+                self.rejected += 1
+                return {"error": f"Invalid event: {error}", "deviceId": device_id}
+
+        # Answer the device in the encoding it speaks
+        note_encoding(device_id, encoding)
+
+        # Any valid event, heartbeats and acks included, proves the device is alive
+        liveness.touch(device_id, event.get("deviceType") if event.get("type") == "ack" else event.get("type"))
+
+        # Command acks only resolve the pending-command table. They never go
+        # to LAM, which would answer them with yet another command.
+        if event.get("type") == "ack":
+            try:
+                resolved = tracker.resolve(event)
+            except Exception as e:
+                LOG.error("Failed to resolve ack: %s", e)
+                resolved = None
+            self._touch_last_seen(device_id)
+            return {"status": "ack", "event": event, "resolved": resolved is not None}
+
+        # Slow chatty devices down at the source while we are behind
+        # (backend.rate_control; off unless RATE_CONTROL=1)
+        for command in rate_control.observe(device_id, event.get("timestamp")):
+            self._publish(command)
+
+        # Admission control (backend.admission): an event over its device's
+        # or the global budget never reaches the log / LAM / publish / state
+        # path below; it is only written to EventLogs, or dropped
+        if not admission.admit(device_id, event.get("type"), event.get("heartbeat") is True):
+            self.throttled += 1
+            if admission.log_throttled:
+                event["throttled"] = True
+                _log_event(event)
+            self._touch_last_seen(device_id)
+            return {"status": "throttled", "deviceId": device_id, "logged": admission.log_throttled}
+
+        trace = start_trace(event)
+        event.setdefault("correlationId", trace.correlation_id)
+
         # 1. Log the incoming event
-        _log_event(event)
+        with trace.span("log"):
+            _log_event(event)
+
+        # Fold numeric readings into the per-minute / per-hour rollups
+        with trace.span("rollup"):
+            try:
+                record_telemetry(event)
+            except Exception as e:
+                LOG.error("Failed to record telemetry: %s", e)
+
+        # Report-by-exception keep-alive: the reading has not changed since
+        # the device last reported, so there is nothing new for LAM to decide
+        if event.get("heartbeat") is True:
+            with trace.span("state"):
+                self._touch_last_seen(device_id)
+            trace.finish()
+            return {"status": "heartbeat", "event": event}
 
         # 2. Call LAM to compute a decision
-        lam_decision = _call_lam(event)
+        with trace.span("lam"):
+            lam_decision = self._decide(event)
 
         # 3. Validate or fallback
         if not _valid_decision(lam_decision):
@@ -166,29 +327,82 @@ class EventProcessor:
         lam_decision.setdefault(
             "timestamp", datetime.utcnow().isoformat() + "Z"
         )
+        lam_decision["correlationId"] = trace.correlation_id
 
-        # 4. Publish resulting command to IoT Core
-        _publish_command(lam_decision)
+        # 4. Publish resulting command(s) to IoT Core
+        with trace.span("publish"):
+            commands = _route_decision(lam_decision)
+            for command in commands:
+                self._publish(command)
+            if commands[0] is not lam_decision:
+                self._publish(_routed_notice(lam_decision, commands))
 
         # 5. Update device state
-        _update_device_state(device_id, lam_decision, event)
+        with trace.span("state"):
+            _update_device_state(device_id, lam_decision, event)
+            # The state write carries updatedAt, which liveness seeding
+            # reads as well; no lastSeenAt write is needed for a while
+            self._mark_seen(device_id, time.monotonic())
+
+        spans = trace.finish()
 
         # 6. Return decision + event for debugging / API layers
         return {
             "status": "processed",
             "event": event,
             "decision": lam_decision,
+            "routedTo": [c["deviceId"] for c in commands],
+            "spansMs": spans,
         }
 
 
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+# One per container: the lastSeenAt write limit and the rejected /
+# throttled counters must outlive a single Lambda invocation.
+processor = EventProcessor()
+
+
 # -----------------------------
 # LAMBDA ENTRYPOINT
 # -----------------------------
 
+def drain(command_timeout: float = COMMAND_FLUSH_TIMEOUT, publisher=True) -> None:
+    """
+    Write out everything this process still buffers: queued commands,
+    telemetry rollups, batched storage writes and log records. Called at
+    the end of every Lambda invocation (before the container can be
+    frozen) and when a local processor shuts down. publisher=False skips
+    the IoT command queue for processors that publish elsewhere.
+    """
+    # Commands are published asynchronously; send them first
+    if publisher and not get_publisher().flush(command_timeout):
+        LOG.warning("Timed out waiting for queued commands")
+    # Rollups buffered here would be lost if the process is frozen or
+    # recycled before the next interval flush
+    try:
+        flush_telemetry()
+    except Exception as e:
+        LOG.error("Telemetry rollup flush failed: %s", e)
+    try:
+        get_storage().flush()
+    except Exception as e:
+        LOG.error("Storage flush failed: %s", e)
+    # Log records are written by a background thread; get them out too
+    logs.flush()
+
+
 def lambda_handler(event, context):
     """
     AWS Lambda entrypoint.
     This is what the AWS IoT Rule (rakan/events) should invoke.
     """
-    processor = EventProcessor()
-    return processor.handle_event(event)
+    result = processor.handle_event(event)
+    # Retry / time out commands this container sent whose ack is overdue
+    try:
+        tracker.sweep()
+    except Exception as e:
+        LOG.error("Command ack sweep failed: %s", e)
+    drain()
+    return result
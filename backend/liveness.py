@@ -0,0 +1,274 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from backend.telemetry_rollup import parse_time
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# A device is offline once nothing has been heard from it for this long.
+# The default covers three report-by-exception heartbeats (HEARTBEAT_SECONDS).
+LIVENESS_TIMEOUT_SECONDS = float(os.getenv("LIVENESS_TIMEOUT_SECONDS", "180"))
+# Per-type overrides, e.g. "switch=600,motion=60"
+LIVENESS_TIMEOUT_BY_TYPE = os.getenv("LIVENESS_TIMEOUT_BY_TYPE", "")
+# Timer wheel resolution: offline transitions fire up to one tick late
+LIVENESS_TICK_SECONDS = float(os.getenv("LIVENESS_TICK_SECONDS", "1"))
+
+LOG = get_logger("liveness")
+
+
+def _parse_timeouts(spec: str) -> dict:
+    timeouts = {}
+    for part in spec.split(","):
+        if "=" in part:
+            device_type, seconds = part.split("=", 1)
+            timeouts[device_type.strip()] = float(seconds)
+    return timeouts
+
+
+class _Device:
+    __slots__ = ("device_id", "device_type", "last_seen", "deadline", "online", "scheduled")
+
+    def __init__(self, device_id, device_type, last_seen, deadline):
+        self.device_id = device_id
+        self.device_type = device_type
+        self.last_seen = last_seen
+        self.deadline = deadline
+        self.online = True
+        self.scheduled = False
+
+    def to_dict(self, now) -> dict:
+        return {
+            "deviceId": self.device_id,
+            "type": self.device_type,
+            "online": self.online,
+            "lastSeen": self.last_seen,
+            "silentSeconds": round(max(0.0, now - self.last_seen), 3),
+        }
+
+
+class LivenessTracker:
+    """
+    Online / offline state of every device, fed by EventProcessor.
+
+    Deadlines live in a hashed timer wheel of LIVENESS_TICK_SECONDS slots.
+    touch() only moves a device's deadline forward; the wheel entry is not
+    touched, so an event costs O(1). When a slot comes due, each device in
+    it is either re-filed under its newer deadline or marked offline. A
+    device is therefore re-filed at most once per timeout, however chatty it
+    is. Offline devices are kept in their own index, so listing them reads
+    no storage.
+
+    Listeners are called as listener(device_dict, online) on every
+    transition, outside the lock.
+    """
+
+    def __init__(self, timeout=LIVENESS_TIMEOUT_SECONDS, timeouts_by_type=None,
+                 tick=LIVENESS_TICK_SECONDS):
+        self.timeout = timeout
+        self.timeouts_by_type = dict(
+            _parse_timeouts(LIVENESS_TIMEOUT_BY_TYPE) if timeouts_by_type is None else timeouts_by_type
+        )
+        self.tick = tick
+
+        longest = max([timeout, *self.timeouts_by_type.values()])
+        self._slots = [set() for _ in range(int(math.ceil(longest / tick)) + 1)]
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._offline = {}
+        self._next_tick = None      # index of the next slot to expire
+        self._ticker = None
+        self._stop = threading.Event()
+
+        self.listeners = [self._log_transition]
+        self.transitions = deque(maxlen=1000)
+        self.went_offline = 0
+        self.came_online = 0
+
+    # -----------------------------
+    # Timer wheel (caller holds the lock)
+    # -----------------------------
+
+    def _schedule(self, device):
+        tick = int(device.deadline // self.tick)
+        # Never file into a slot the wheel has already passed
+        if self._next_tick is not None and tick < self._next_tick:
+            tick = self._next_tick
+        self._slots[tick % len(self._slots)].add(device.device_id)
+        device.scheduled = True
+
+    def _advance(self, now, changed):
+        current = int(now // self.tick)
+        if self._next_tick is None:
+            self._next_tick = current
+        # After a long pause every slot is due once; no need to loop per tick
+        first = max(self._next_tick, current - len(self._slots) + 1)
+        for tick in range(first, current + 1):
+            # Set first, so devices re-filed below land in a later slot
+            self._next_tick = tick + 1
+            slot = self._slots[tick % len(self._slots)]
+            if not slot:
+                continue
+            due, slot_ids = [], list(slot)
+            slot.clear()
+            for device_id in slot_ids:
+                device = self._devices.get(device_id)
+                if device is None:
+                    continue
+                device.scheduled = False
+                due.append(device)
+            for device in due:
+                if device.deadline > now:
+                    self._schedule(device)
+                elif device.online:
+                    device.online = False
+                    self._offline[device.device_id] = device
+                    self.went_offline += 1
+                    changed.append((device.to_dict(now), False))
+        self._next_tick = current + 1
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+
+    def timeout_for(self, device_type) -> float:
+        return self.timeouts_by_type.get(device_type, self.timeout)
+
+    def touch(self, device_id: str, device_type: str | None = None, at: float | None = None) -> None:
+        """Record that a device was just heard from (at: epoch seconds, default now)."""
+        now = time.time()
+        at = now if at is None else min(at, now)
+        changed = []
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is None:
+                device = _Device(device_id, device_type, at, at + self.timeout_for(device_type))
+                self._devices[device_id] = device
+                if device.deadline <= now:
+                    # Already silent for longer than the timeout (seeding)
+                    device.online = False
+                    self._offline[device_id] = device
+                else:
+                    self._schedule(device)
+
+            # Ignore anything older than what we know (out-of-order delivery)
+            elif at > device.last_seen:
+                device.last_seen = at
+                if device_type:
+                    device.device_type = device_type
+                device.deadline = at + self.timeout_for(device.device_type)
+                if not device.online and device.deadline > now:
+                    device.online = True
+                    del self._offline[device_id]
+                    self.came_online += 1
+                    changed.append((device.to_dict(now), True))
+                if device.online and not device.scheduled:
+                    self._schedule(device)
+
+            if self._next_tick is None or now >= self._next_tick * self.tick:
+                self._advance(now, changed)
+        self._notify(changed)
+
+    def seed(self, records) -> int:
+        """
+        Pre-load last-seen times from device-state records
+        ({"deviceId", "type", "updatedAt" / "lastSeenAt"}), e.g. on start-up.
+        """
+        count = 0
+        for record in records:
+            times = [parse_time(record.get(k)) for k in ("lastSeenAt", "updatedAt")]
+            times = [t for t in times if t is not None]
+            at = max(times) if times else None
+            if record.get("deviceId") and at is not None:
+                self.touch(record["deviceId"], record.get("type"), at=at)
+                count += 1
+        return count
+
+    def forget(self, device_id: str) -> None:
+        with self._lock:
+            self._devices.pop(device_id, None)
+            self._offline.pop(device_id, None)
+
+    def expire(self, now: float | None = None) -> int:
+        """Run the wheel up to `now`; returns how many devices went offline."""
+        changed = []
+        with self._lock:
+            self._advance(time.time() if now is None else now, changed)
+        self._notify(changed)
+        return sum(1 for _, online in changed if not online)
+
+    def _notify(self, changed):
+        for device, online in changed:
+            self.transitions.append({**device, "at": time.time()})
+            for listener in self.listeners:
+                try:
+                    listener(device, online)
+                except Exception as e:
+                    LOG.error("Liveness listener failed: %s", e)
+
+    @staticmethod
+    def _log_transition(device, online):
+        if online:
+            LOG.info("%s is back online", device["deviceId"])
+        else:
+            LOG.warning("%s went offline (silent for %.0fs)", device["deviceId"], device["silentSeconds"])
+
+    def start(self) -> None:
+        """Expire deadlines on a background thread (processes with idle periods)."""
+        if self._ticker is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.tick):
+                try:
+                    self.expire()
+                except Exception as e:
+                    LOG.error("Liveness tick failed: %s", e)
+
+        self._ticker = threading.Thread(target=loop, name="liveness", daemon=True)
+        self._ticker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+
+    def offline(self, device_type: str | None = None) -> list[dict]:
+        now = time.time()
+        with self._lock:
+            devices = [
+                d.to_dict(now) for d in self._offline.values()
+                if device_type is None or d.device_type == device_type
+            ]
+        devices.sort(key=lambda d: d["lastSeen"])
+        return devices
+
+    def get(self, device_id: str) -> dict | None:
+        with self._lock:
+            device = self._devices.get(device_id)
+            return device.to_dict(time.time()) if device else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked": len(self._devices),
+                "online": len(self._devices) - len(self._offline),
+                "offline": len(self._offline),
+                "wentOffline": self.went_offline,
+                "cameOnline": self.came_online,
+                "timeoutSeconds": self.timeout,
+                "timeoutByType": dict(self.timeouts_by_type),
+            }
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+liveness = LivenessTracker()
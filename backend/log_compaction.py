@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from backend.storage import get_storage
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# Root directory of the archive; one sub-directory per day:
+#   <ARCHIVE_DIR>/date=YYYY-MM-DD/events-<run>.ndjson.gz
+# /logs/export reads the same directory, so the API and the compaction job
+# must run on one host or share it (e.g. a mounted volume).
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+# Archive rows this long before they expire, so the job always runs ahead
+# of DynamoDB's TTL sweep.
+ARCHIVE_LEAD_SECONDS = float(os.getenv("ARCHIVE_LEAD_SECONDS", str(24 * 3600)))
+
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "500"))
+# Batches one run may archive (0: no limit); the next run picks up the rest
+COMPACTION_MAX_BATCHES = int(os.getenv("COMPACTION_MAX_BATCHES", "200"))
+
+_PARTITION_PREFIX = "date="
+
+LOG = get_logger("log_compaction")
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+
+def _partition_for(record: dict) -> str:
+    """Day partition taken from the log timestamp (falls back to 'unknown')."""
+    ts = str(record.get("timestamp") or "")
+    try:
+        day = datetime.fromisoformat(ts.replace("Z", "+00:00")).strftime("%Y-%m-%d")
+    except ValueError:
+        day = "unknown"
+    return f"{_PARTITION_PREFIX}{day}"
+
+
+def _write_archive(partition: str, records: list[dict], run_id: str) -> str:
+    """
+    Append records to this run's file in a partition. Each call writes one
+    gzip member; concatenated members are still a valid gzip stream.
+    The data is fsynced before returning so the rows can be deleted safely.
+    """
+    directory = os.path.join(ARCHIVE_DIR, partition)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"events-{run_id}.ndjson.gz")
+
+    lines = "".join(json.dumps(r, default=str, separators=(",", ":")) + "\n" for r in records)
+    with open(path, "ab") as f:
+        f.write(gzip.compress(lines.encode("utf-8")))
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+# -----------------------------
+# COMPACTION JOB
+# -----------------------------
+
+def compact_expired_events(now: float | None = None, max_batches: int = COMPACTION_MAX_BATCHES,
+                           full_scan: bool = False) -> dict:
+    """
+    Move events that are expired (or about to be) from the hot log table
+    into compressed day partitions, then delete them from the table.
+    Stops after max_batches batches; "complete" is False when rows may
+    be left for the next run. full_scan: see iter_expired_events.
+    """
+    now = time.time() if now is None else now
+    cutoff = now + ARCHIVE_LEAD_SECONDS
+    run_id = datetime.utcfromtimestamp(now).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+    storage = get_storage()
+    archived = 0
+    batches = 0
+    files = set()
+    complete = True
+
+    for batch in storage.iter_expired_events(cutoff, COMPACTION_BATCH_SIZE, full_scan=full_scan):
+        if max_batches and batches >= max_batches:
+            complete = False
+            break
+        by_partition = {}
+        for record in batch:
+            by_partition.setdefault(_partition_for(record), []).append(record)
+
+        for partition, records in by_partition.items():
+            files.add(_write_archive(partition, records, run_id))
+
+        storage.delete_events([r["logId"] for r in batch])
+        archived += len(batch)
+        batches += 1
+
+    LOG.info("Archived %d events into %d files%s", archived, len(files),
+             "" if complete else " (batch limit reached, more left)")
+    return {"archived": archived, "files": sorted(files), "complete": complete}
+
+
+# -----------------------------
+# ARCHIVE READERS (used by the API)
+# -----------------------------
+
+def list_partitions() -> list[dict]:
+    """Return [{"date", "files", "bytes"}] for every archived day."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+
+    partitions = []
+    for name in sorted(os.listdir(ARCHIVE_DIR)):
+        if not name.startswith(_PARTITION_PREFIX):
+            continue
+        directory = os.path.join(ARCHIVE_DIR, name)
+        files = sorted(f for f in os.listdir(directory) if f.endswith(".ndjson.gz"))
+        partitions.append({
+            "date": name[len(_PARTITION_PREFIX):],
+            "files": len(files),
+            "bytes": sum(os.path.getsize(os.path.join(directory, f)) for f in files),
+        })
+    return partitions
+
+
+def iter_archive_bytes(start_day: str, end_day: str, chunk_size: int = 64 * 1024):
+    """
+    Stream the raw gzip bytes of every archive file with a day partition in
+    [start_day, end_day] (YYYY-MM-DD). Concatenated gzip files form one
+    valid gzip stream, so nothing is recompressed.
+    """
+    for partition in list_partitions():
+        if not start_day <= partition["date"] <= end_day:
+            continue
+        directory = os.path.join(ARCHIVE_DIR, _PARTITION_PREFIX + partition["date"])
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".ndjson.gz"):
+                continue
+            with open(os.path.join(directory, name), "rb") as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+
+# ------------------------------
+# LOCAL RUN (cron / systemd timer)
+# ------------------------------
+if __name__ == "__main__":
+    # --scan: one-off full table scan for DynamoDB rows written before
+    # the expiry index existed
+    compact_expired_events(full_scan="--scan" in sys.argv[1:])
@@ -0,0 +1,266 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from backend.telemetry_rollup import parse_time
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# Off by default: when on, EventProcessor sends set_interval commands to
+# devices that report faster than the current per-device limit.
+RATE_CONTROL = os.getenv("RATE_CONTROL", "0") == "1"
+# Events per minute one device may send while the backend keeps up
+RATE_CONTROL_MAX_PER_MINUTE = float(os.getenv("RATE_CONTROL_MAX_PER_MINUTE", "30"))
+# Backlog, measured as event age on arrival (seconds, smoothed). Above HIGH
+# the per-device limit is halved each evaluation; below LOW it is doubled
+# back towards RATE_CONTROL_MAX_PER_MINUTE.
+RATE_CONTROL_LAG_HIGH = float(os.getenv("RATE_CONTROL_LAG_HIGH", "5"))
+RATE_CONTROL_LAG_LOW = float(os.getenv("RATE_CONTROL_LAG_LOW", "1"))
+# Largest slow-down under sustained backlog (limit = max / scale)
+RATE_CONTROL_MAX_SCALE = float(os.getenv("RATE_CONTROL_MAX_SCALE", "16"))
+# Rate window and how often limits are re-evaluated
+RATE_CONTROL_WINDOW_SECONDS = float(os.getenv("RATE_CONTROL_WINDOW_SECONDS", "60"))
+RATE_CONTROL_EVAL_SECONDS = float(os.getenv("RATE_CONTROL_EVAL_SECONDS", "10"))
+
+SET_INTERVAL = "set_interval"
+SET_REPORTING_POLICY = "set_reporting_policy"
+
+LOG = get_logger("rate_control")
+
+# Weight of a new lag sample in the moving average
+_LAG_ALPHA = 0.05
+# Pushed intervals within this factor of the target are left alone
+_HYSTERESIS = 1.25
+
+
+# Keys of a set_reporting_policy value (simulator.base_simulator.BaseDevice)
+REPORTING_POLICY_KEYS = ("interval", "reportByException", "deadband", "heartbeatInterval")
+
+
+def _command(device_id, action, value, reason) -> dict:
+    return {
+        "deviceId": device_id,
+        "action": action,
+        "value": value,
+        "reason": reason,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def reporting_command(device_id: str, policy: dict | None, hold_seconds: float | None = None,
+                      reason: str = "Reporting policy set from API") -> dict:
+    """
+    set_reporting_policy command for one device. Raises ValueError.
+        policy        subset of REPORTING_POLICY_KEYS; None restores the
+                      device's own settings (and ends any hold)
+        hold_seconds  keep this policy for that long, ignoring set_interval
+                      from the rate controller, then revert
+    """
+    if policy is None:
+        return _command(device_id, SET_REPORTING_POLICY, None, reason)
+    if not isinstance(policy, dict):
+        raise ValueError("policy must be an object")
+    unknown = set(policy) - set(REPORTING_POLICY_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown reporting policy keys: {sorted(unknown)}")
+    value = dict(policy)
+    if hold_seconds is not None:
+        if isinstance(hold_seconds, bool) or not isinstance(hold_seconds, (int, float)) or hold_seconds <= 0:
+            raise ValueError("'holdSeconds' must be a positive number")
+        value["holdSeconds"] = hold_seconds
+    return _command(device_id, SET_REPORTING_POLICY, value, reason)
+
+
+class _DeviceRate:
+    __slots__ = ("window", "count", "previous", "pushed", "pushed_at")
+
+    def __init__(self, window):
+        self.window = window        # index of the window `count` belongs to
+        self.count = 0
+        self.previous = 0
+        self.pushed = None          # interval we last sent (None: device default)
+        self.pushed_at = None
+
+
+class RateController:
+    """
+    Shapes ingest load at the source by pushing reporting intervals to
+    devices over rakan/commands/<deviceId>.
+
+    EventProcessor calls observe() for every event. It counts the event
+    against the device in fixed windows, so a rate costs O(1), and folds the
+    event's age into a moving average of the processing backlog. Every
+    RATE_CONTROL_EVAL_SECONDS the backlog moves a global scale up (lag above
+    RATE_CONTROL_LAG_HIGH) or down (below RATE_CONTROL_LAG_LOW), and every
+    device sending more than RATE_CONTROL_MAX_PER_MINUTE / scale is given a
+    set_interval that brings it under the limit. As the backlog clears the
+    pushed intervals are shortened again, and reset to the device's own
+    setting once the scale is back to 1.
+
+    observe() returns the commands to send so they go out through the
+    caller's publish path. To fix a device's policy for a while (e.g. a
+    faster interval while somebody is watching it) send it
+    reporting_command(..., hold_seconds=...): the device ignores
+    set_interval until the hold lapses.
+
+    Rates and backlog are per process: in Lambda every container shapes
+    the devices whose events it happens to see.
+    """
+
+    def __init__(self, enabled=RATE_CONTROL, max_per_minute=RATE_CONTROL_MAX_PER_MINUTE,
+                 lag_high=RATE_CONTROL_LAG_HIGH, lag_low=RATE_CONTROL_LAG_LOW,
+                 max_scale=RATE_CONTROL_MAX_SCALE, window=RATE_CONTROL_WINDOW_SECONDS,
+                 eval_seconds=RATE_CONTROL_EVAL_SECONDS):
+        self.enabled = enabled
+        self.max_per_minute = max_per_minute
+        self.lag_high = lag_high
+        self.lag_low = lag_low
+        self.max_scale = max_scale
+        self.window = window
+        self.eval_seconds = eval_seconds
+
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._next_eval = None
+        self.scale = 1.0
+        self.lag = None
+
+        self.observed = 0
+        self.commands_sent = 0
+        self.slowed = 0
+        self.restored = 0
+
+    # -----------------------------
+    # Measurement
+    # -----------------------------
+
+    def _roll(self, rate, window):
+        # Caller holds the lock. Shift the counters into the current window.
+        if rate.window != window:
+            rate.previous = rate.count if rate.window == window - 1 else 0
+            rate.count = 0
+            rate.window = window
+
+    def _per_minute(self, rate, now):
+        """Sliding estimate: this window plus the overlapping part of the last one."""
+        window = int(now // self.window)
+        self._roll(rate, window)
+        into = now / self.window - window
+        return (rate.count + rate.previous * (1 - into)) * 60 / self.window
+
+    def limit_per_minute(self) -> float:
+        return self.max_per_minute / self.scale
+
+    def observe(self, device_id: str, timestamp=None, now: float | None = None) -> list[dict]:
+        """Count an event; returns the rate commands now due (usually none)."""
+        if not self.enabled:
+            return []
+        now = time.time() if now is None else now
+        sent_at = parse_time(timestamp)
+
+        with self._lock:
+            self.observed += 1
+            rate = self._devices.get(device_id)
+            if rate is None:
+                rate = self._devices[device_id] = _DeviceRate(int(now // self.window))
+            self._roll(rate, int(now // self.window))
+            rate.count += 1
+
+            if sent_at is not None:
+                lag = max(0.0, now - sent_at)
+                self.lag = lag if self.lag is None else self.lag + _LAG_ALPHA * (lag - self.lag)
+
+            if self._next_eval is None:
+                self._next_eval = now + self.eval_seconds
+            if now < self._next_eval:
+                return []
+            self._next_eval = now + self.eval_seconds
+            commands = self._evaluate(now)
+
+        if commands:
+            LOG.info("Rate control: %d interval command(s), limit %.1f/min, lag %.2fs",
+                     len(commands), self.limit_per_minute(), self.lag or 0.0)
+        return commands
+
+    # -----------------------------
+    # Control
+    # -----------------------------
+
+    def _evaluate(self, now) -> list[dict]:
+        # Caller holds the lock
+        if self.lag is not None and self.lag > self.lag_high:
+            self.scale = min(self.max_scale, self.scale * 2)
+        elif self.lag is None or self.lag < self.lag_low:
+            self.scale = max(1.0, self.scale / 2)
+
+        limit = self.limit_per_minute()
+        target = 60 / limit
+        commands = []
+        for device_id, rate in self._devices.items():
+            # Give a pushed interval one full window to show in the rate
+            if rate.pushed_at is not None and now - rate.pushed_at < self.window:
+                continue
+
+            per_minute = self._per_minute(rate, now)
+            # Over the limit and not already asked to slow down this far
+            if per_minute > limit * _HYSTERESIS and (rate.pushed is None or rate.pushed * _HYSTERESIS < target):
+                rate.pushed, rate.pushed_at = round(target, 3), now
+                self.slowed += 1
+                commands.append(_command(
+                    device_id, SET_INTERVAL, rate.pushed,
+                    f"{per_minute:.1f}/min over limit {limit:.1f}/min (backlog scale {self.scale:g})",
+                ))
+            elif rate.pushed is not None and rate.pushed > target * _HYSTERESIS:
+                rate.pushed_at = now
+                if self.scale == 1:
+                    rate.pushed = None
+                    self.restored += 1
+                    reason = "Backlog cleared; back to the device's own interval"
+                else:
+                    rate.pushed = round(target, 3)
+                    reason = f"Backlog easing; limit {limit:.1f}/min"
+                commands.append(_command(device_id, SET_INTERVAL, rate.pushed, reason))
+
+            # Forget devices that went quiet and were never pushed
+            if rate.pushed is None and not rate.count and not rate.previous:
+                rate.window = None
+
+        for device_id in [d for d, r in self._devices.items() if r.window is None]:
+            del self._devices[device_id]
+        self.commands_sent += len(commands)
+        return commands
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            pushed = sum(1 for r in self._devices.values() if r.pushed is not None)
+            busiest = sorted(
+                ((self._per_minute(r, now), d) for d, r in self._devices.items()), reverse=True
+            )[:5]
+            return {
+                "enabled": self.enabled,
+                "scale": self.scale,
+                "limitPerMinute": round(self.limit_per_minute(), 2),
+                "lagSeconds": round(self.lag, 3) if self.lag is not None else None,
+                "devices": len(self._devices),
+                "observed": self.observed,
+                "commandsSent": self.commands_sent,
+                "slowed": self.slowed,
+                "restored": self.restored,
+                "pushedIntervals": pushed,
+                "busiest": [{"deviceId": d, "perMinute": round(n, 2)} for n, d in busiest],
+            }
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+rate_control = RateController()
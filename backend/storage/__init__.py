@@ -0,0 +1,44 @@
+import atexit
+import os
+import threading
+
+from backend.storage.base import StorageBackend, make_log_record, now_iso
+
+# "dynamodb" (default) or "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "dynamodb")
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(name: str = STORAGE_BACKEND) -> StorageBackend:
+    """Instantiate a storage backend by name."""
+    if name == "dynamodb":
+        from backend.storage.dynamodb_backend import DynamoDBStorage
+        return DynamoDBStorage()
+
+    if name == "sqlite":
+        from backend.storage.sqlite_backend import SQLiteStorage
+        return SQLiteStorage()
+
+    raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (expected 'dynamodb' or 'sqlite')")
+
+
+def get_storage() -> StorageBackend:
+    """Return the process-wide backend selected by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+                atexit.register(_storage.close)
+    return _storage
+
+
+__all__ = [
+    "StorageBackend",
+    "create_storage",
+    "get_storage",
+    "make_log_record",
+    "now_iso",
+]
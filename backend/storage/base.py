@@ -0,0 +1,194 @@
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+# Event-log rows expire this many days after they are written (0 = never).
+# DynamoDB uses expiresAt as its TTL attribute; the compaction job archives
+# rows before they are removed.
+EVENT_RETENTION_DAYS = float(os.getenv("EVENT_RETENTION_DAYS", "30"))
+
+
+def now_iso() -> str:
+    """Current UTC time in the format the event log has always used."""
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def make_log_record(event: dict, timestamp: str | None = None,
+                    lam_decision: dict | None = None,
+                    command: dict | None = None) -> dict:
+    """
+    Build a normalized event-log record:
+        {logId, deviceId, timestamp, event, lamDecision, commandSent, expiresAt}
+    expiresAt is epoch seconds, or None when retention is disabled.
+    """
+    expires_at = None
+    if EVENT_RETENTION_DAYS > 0:
+        expires_at = int(time.time() + EVENT_RETENTION_DAYS * 86400)
+
+    return {
+        "logId": str(uuid.uuid4()),
+        "deviceId": event.get("deviceId", "unknown"),
+        "timestamp": timestamp or now_iso(),
+        "event": event,
+        "lamDecision": lam_decision,
+        "commandSent": command,
+        "expiresAt": expires_at,
+    }
+
+
+class StorageBackend(ABC):
+    """
+    Storage interface for device state, the event log and telemetry rollups.
+
+    Device state records are returned as:
+        {"deviceId", "state", "updatedAt", ...extra fields}
+    Event log records are returned in the make_log_record() shape.
+    Rollup metrics are passed and returned as:
+        {metric: {"count", "sum", "min", "max"}}
+    Pending commands (sent, not yet acknowledged) are:
+        {"commandId", "deviceId", "action", "command", "sentAt", "deadline", "attempts"}
+    with sentAt / deadline in epoch seconds.
+    Device topology records (see backend.topology) are:
+        {"deviceId", "room", "groups", "role", "bindings", "updatedAt"}
+    """
+
+    # -----------------------------
+    # Device State
+    # -----------------------------
+
+    @abstractmethod
+    def put_device_state(self, device_id: str, state: dict, updated_at: str | None = None,
+                         device_type: str | None = None, extra: dict | None = None) -> dict:
+        """Create or update the stored state of a device and return the record."""
+
+    @abstractmethod
+    def get_device_state(self, device_id: str) -> dict | None:
+        """Return the stored state of a device, or None if it is unknown."""
+
+    @abstractmethod
+    def list_device_states(self) -> list[dict]:
+        """Return the stored state of every device."""
+
+    @abstractmethod
+    def touch_device_state(self, device_id: str, last_seen_at: str) -> None:
+        """
+        Set lastSeenAt on an existing device record without changing its
+        state (no-op for unknown devices).
+        """
+
+    # -----------------------------
+    # Event Log
+    # -----------------------------
+
+    @abstractmethod
+    def write_log_records(self, records: list[dict]) -> None:
+        """Persist a batch of records built by make_log_record()."""
+
+    def log_event(self, event: dict, timestamp: str | None = None,
+                  lam_decision: dict | None = None, command: dict | None = None) -> dict:
+        """Append one event to the log and return its record."""
+        record = make_log_record(event, timestamp, lam_decision, command)
+        self.write_log_records([record])
+        return record
+
+    @abstractmethod
+    def list_events(self, limit: int | None = None) -> list[dict]:
+        """Return logged events (all of them when limit is None)."""
+
+    @abstractmethod
+    def get_recent_events_for_device(self, device_id: str, limit: int = 20) -> list[dict]:
+        """Return the newest events of one device, newest first."""
+
+    @abstractmethod
+    def get_recent_events_global(self, limit: int = 50) -> list[dict]:
+        """Return recent events across all devices (dashboard feed)."""
+
+    @abstractmethod
+    def iter_expired_events(self, cutoff: float, batch_size: int = 500, full_scan: bool = False):
+        """
+        Yield lists of records whose expiresAt is <= cutoff (epoch seconds).
+        full_scan asks an index-backed backend to scan everything instead.
+        """
+
+    @abstractmethod
+    def delete_events(self, log_ids: list[str]) -> None:
+        """Remove events from the log (after they have been archived)."""
+
+    # -----------------------------
+    # Telemetry Rollups
+    # -----------------------------
+
+    @abstractmethod
+    def merge_rollup(self, device_id: str, resolution: str, bucket: str, metrics: dict) -> None:
+        """Merge partial aggregates into the (device, resolution, bucket) row."""
+
+    @abstractmethod
+    def query_rollups(self, device_id: str, resolution: str,
+                      start_bucket: str, end_bucket: str) -> list[dict]:
+        """
+        Return [{"bucket", "metrics"}] for buckets in [start_bucket, end_bucket],
+        oldest first.
+        """
+
+    # -----------------------------
+    # Pending Commands
+    # -----------------------------
+
+    @abstractmethod
+    def put_pending_command(self, record: dict) -> None:
+        """Create or replace the pending entry for record["commandId"]."""
+
+    @abstractmethod
+    def get_pending_command(self, command_id: str) -> dict | None:
+        """Return a pending command, or None if it was acknowledged / expired."""
+
+    @abstractmethod
+    def take_pending_command(self, command_id: str) -> dict | None:
+        """
+        Atomically remove a pending command and return it (None if it was
+        not pending), so one ack or timeout resolves it exactly once.
+        """
+
+    @abstractmethod
+    def list_pending_commands(self, limit: int | None = None) -> list[dict]:
+        """Return pending commands, oldest first."""
+
+    # -----------------------------
+    # Device Topology
+    # -----------------------------
+
+    @abstractmethod
+    def put_device_topology(self, record: dict) -> None:
+        """Create or replace the topology record of record["deviceId"]."""
+
+    @abstractmethod
+    def delete_device_topology(self, device_id: str) -> bool:
+        """Remove a device's topology record; False if it had none."""
+
+    @abstractmethod
+    def list_device_topology(self) -> list[dict]:
+        """Return every topology record."""
+
+    # -----------------------------
+    # Settings
+    # -----------------------------
+
+    @abstractmethod
+    def get_setting(self, name: str) -> dict | None:
+        """Return a named runtime setting (e.g. admission limits), or None."""
+
+    @abstractmethod
+    def put_setting(self, name: str, value: dict) -> None:
+        """Create or replace a named runtime setting."""
+
+    # -----------------------------
+    # Lifecycle
+    # -----------------------------
+
+    def flush(self) -> None:
+        """Write out anything buffered. No-op for write-through backends."""
+
+    def close(self) -> None:
+        self.flush()
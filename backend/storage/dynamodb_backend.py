@@ -0,0 +1,630 @@
+import heapq
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from backend.storage.base import StorageBackend, now_iso
+
+# -----------------------------
+# Configuration
+# -----------------------------
+
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+
+# The Lambda uses STATE_TABLE / EVENT_TABLE, the helper modules used
+# DEVICE_TABLE / LOG_TABLE; both are honoured.
+STATE_TABLE = os.getenv("STATE_TABLE", os.getenv("DEVICE_TABLE", "Rakan_DeviceState"))
+EVENT_TABLE = os.getenv("EVENT_TABLE", os.getenv("LOG_TABLE", "Rakan_EventLogs"))
+ROLLUP_TABLE = os.getenv("ROLLUP_TABLE", "Rakan_TelemetryRollups")
+COMMAND_TABLE = os.getenv("COMMAND_TABLE", "Rakan_PendingCommands")
+TOPOLOGY_TABLE = os.getenv("TOPOLOGY_TABLE", "Rakan_DeviceTopology")
+SETTINGS_TABLE = os.getenv("SETTINGS_TABLE", "Rakan_Settings")
+
+# Pending-command rows are dropped by TTL this long after they were sent
+# (acks and timeouts normally delete them much sooner)
+PENDING_COMMAND_TTL_SECONDS = 86400
+
+# Index name for querying logs by deviceId (partition deviceId, sort timestamp)
+EVENT_LOGS_DEVICE_INDEX = os.getenv("EVENT_LOGS_DEVICE_INDEX", "DeviceIdIndex")
+
+# Global "most recent events" feed: every log row carries
+# feedKey = "<time bucket>#<shard>", indexed with timestamp as sort key.
+# Shards spread the write load of a bucket over several partitions.
+EVENT_LOGS_FEED_INDEX = os.getenv("EVENT_LOGS_FEED_INDEX", "FeedIndex")
+FEED_SHARDS = int(os.getenv("FEED_SHARDS", "8"))
+FEED_BUCKET_MINUTES = int(os.getenv("FEED_BUCKET_MINUTES", "60"))
+# How many buckets (newest first) a feed read may walk before giving up
+FEED_MAX_BUCKETS = int(os.getenv("FEED_MAX_BUCKETS", "48"))
+
+# Expiry index for the compaction job: every row with expiresAt carries
+# expiryKey = "<expiry day>#<shard>", indexed with expiresAt as sort key, so
+# the job reads only rows that are about to expire instead of scanning the
+# table. Sharded like the feed (FEED_SHARDS).
+EVENT_LOGS_EXPIRY_INDEX = os.getenv("EVENT_LOGS_EXPIRY_INDEX", "ExpiryIndex")
+# Expiry days before the cutoff's that the job still looks at; rows older
+# than that have normally been removed by DynamoDB's TTL sweep already
+EXPIRY_LOOKBACK_DAYS = int(os.getenv("EXPIRY_LOOKBACK_DAYS", "3"))
+
+# batch_write_item accepts at most 25 requests
+_BATCH_WRITE_MAX = 25
+
+_EPOCH = datetime(1970, 1, 1)
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+
+def _json_attr(value) -> dict:
+    return {"S": json.dumps(value, default=str)}
+
+
+def _load_json(value):
+    """State/event columns are JSON strings, but older rows hold native maps."""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _decode_item(item: dict) -> dict:
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def _decode_state(item: dict) -> dict:
+    record = _decode_item(item)
+    record["state"] = _load_json(record.get("state"))
+    record.setdefault("updatedAt", record.get("lastSeenAt") or record.get("lastSeen"))
+    return record
+
+
+def _decode_log(item: dict) -> dict:
+    raw = _decode_item(item)
+
+    if "event" in raw:
+        event = _load_json(raw["event"])
+    else:
+        # Flat rows written by the old db_client.log_event
+        event = {
+            "deviceId": raw.get("deviceId"),
+            "type": raw.get("eventType"),
+            "value": raw.get("value"),
+            "source": raw.get("source"),
+        }
+        if raw.get("details"):
+            event["details"] = raw["details"]
+
+    return {
+        "logId": raw.get("logId"),
+        "deviceId": raw.get("deviceId") or (event or {}).get("deviceId"),
+        "timestamp": raw.get("timestamp") or raw.get("createdAt"),
+        "event": event,
+        "lamDecision": _load_json(raw.get("lamDecision")),
+        "commandSent": _load_json(raw.get("commandSent")),
+        "expiresAt": int(raw["expiresAt"]) if "expiresAt" in raw else None,
+    }
+
+
+def _feed_bucket(dt: datetime) -> datetime:
+    """
+    Aligned to the epoch, not to midnight, so that stepping back
+    FEED_BUCKET_MINUTES from a bucket always lands on the previous one,
+    whatever the bucket size.
+    """
+    minutes = int((dt - _EPOCH).total_seconds() // 60)
+    return _EPOCH + timedelta(minutes=minutes - minutes % FEED_BUCKET_MINUTES)
+
+
+def _feed_key(bucket: datetime, shard: int) -> str:
+    return f"{bucket.strftime('%Y-%m-%dT%H:%M')}#{shard}"
+
+
+def _shard_for(log_id: str) -> int:
+    return zlib.crc32(log_id.encode()) % FEED_SHARDS
+
+
+def _feed_key_for(record: dict) -> str:
+    """Bucket by the write timestamp, shard by a stable hash of the logId."""
+    ts = record["timestamp"].replace("Z", "+00:00")
+    try:
+        dt = datetime.fromisoformat(ts).replace(tzinfo=None)
+    except ValueError:
+        dt = datetime.utcnow()
+    return _feed_key(_feed_bucket(dt), _shard_for(record["logId"]))
+
+
+def _expiry_key(day: date, shard: int) -> str:
+    return f"{day.isoformat()}#{shard}"
+
+
+def _expiry_key_for(record: dict) -> str:
+    day = datetime.utcfromtimestamp(int(record["expiresAt"])).date()
+    return _expiry_key(day, _shard_for(record["logId"]))
+
+
+def _encode_log(record: dict) -> dict:
+    item = {
+        "logId": {"S": record["logId"]},
+        "deviceId": {"S": record["deviceId"]},
+        "timestamp": {"S": record["timestamp"]},
+        "feedKey": {"S": _feed_key_for(record)},
+        "event": _json_attr(record["event"]),
+    }
+    if record.get("lamDecision"):
+        item["lamDecision"] = _json_attr(record["lamDecision"])
+    if record.get("commandSent"):
+        item["commandSent"] = _json_attr(record["commandSent"])
+    if record.get("expiresAt"):
+        item["expiresAt"] = {"N": str(record["expiresAt"])}
+        item["expiryKey"] = {"S": _expiry_key_for(record)}
+    return item
+
+
+def _encode_pending(record: dict) -> dict:
+    return {
+        "commandId": {"S": record["commandId"]},
+        "deviceId": {"S": record["deviceId"]},
+        "action": {"S": str(record.get("action"))},
+        "command": _json_attr(record["command"]),
+        "sentAt": {"N": repr(float(record["sentAt"]))},
+        "deadline": {"N": repr(float(record["deadline"]))},
+        "attempts": {"N": str(record["attempts"])},
+        "expiresAt": {"N": str(int(record["sentAt"] + PENDING_COMMAND_TTL_SECONDS))},
+    }
+
+
+def _decode_pending(item: dict) -> dict:
+    raw = _decode_item(item)
+    return {
+        "commandId": raw["commandId"],
+        "deviceId": raw["deviceId"],
+        "action": raw.get("action"),
+        "command": _load_json(raw.get("command")),
+        "sentAt": float(raw["sentAt"]),
+        "deadline": float(raw["deadline"]),
+        "attempts": int(raw["attempts"]),
+    }
+
+
+def _encode_topology(record: dict) -> dict:
+    item = {
+        "deviceId": {"S": record["deviceId"]},
+        "groups": _serializer.serialize(list(record.get("groups") or [])),
+        "bindings": _serializer.serialize(list(record.get("bindings") or [])),
+        "updatedAt": {"S": record.get("updatedAt") or now_iso()},
+    }
+    for key in ("room", "role"):
+        if record.get(key):
+            item[key] = {"S": record[key]}
+    return item
+
+
+def _decode_topology(item: dict) -> dict:
+    raw = _decode_item(item)
+    return {
+        "deviceId": raw["deviceId"],
+        "room": raw.get("room"),
+        "groups": list(raw.get("groups") or []),
+        "role": raw.get("role"),
+        "bindings": list(raw.get("bindings") or []),
+        "updatedAt": raw.get("updatedAt"),
+    }
+
+
+# -----------------------------
+# Backend
+# -----------------------------
+
+class DynamoDBStorage(StorageBackend):
+    """
+    Storage on the Rakan_* DynamoDB tables (low-level client, same item
+    layout the Lambda and API have always used).
+    """
+
+    def __init__(self, region: str = AWS_REGION):
+        self.client = boto3.client("dynamodb", region_name=region)
+        # boto3 clients are thread-safe; used to query feed shards in parallel
+        self._feed_pool = ThreadPoolExecutor(max_workers=FEED_SHARDS)
+
+    # -----------------------------
+    # Device State
+    # -----------------------------
+
+    def put_device_state(self, device_id, state, updated_at=None, device_type=None, extra=None):
+        updated_at = updated_at or now_iso()
+
+        names = {"#s": "state"}
+        values = {":state": _json_attr(state), ":ts": {"S": updated_at}}
+        sets = ["#s = :state", "updatedAt = :ts"]
+
+        if device_type:
+            names["#t"] = "type"
+            values[":type"] = {"S": device_type}
+            sets.append("#t = :type")
+
+        for i, (key, value) in enumerate((extra or {}).items()):
+            names[f"#e{i}"] = key
+            values[f":e{i}"] = _serializer.serialize(value)
+            sets.append(f"#e{i} = :e{i}")
+
+        self.client.update_item(
+            TableName=STATE_TABLE,
+            Key={"deviceId": {"S": device_id}},
+            UpdateExpression="SET " + ", ".join(sets),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+        record = {"deviceId": device_id, "state": state, "updatedAt": updated_at}
+        if device_type:
+            record["type"] = device_type
+        if extra:
+            record.update(extra)
+        return record
+
+    def get_device_state(self, device_id):
+        resp = self.client.get_item(
+            TableName=STATE_TABLE,
+            Key={"deviceId": {"S": device_id}}
+        )
+        if "Item" not in resp:
+            return None
+        return _decode_state(resp["Item"])
+
+    def list_device_states(self):
+        devices = []
+        paginator = self.client.get_paginator("scan")
+        for page in paginator.paginate(TableName=STATE_TABLE):
+            devices.extend(_decode_state(item) for item in page.get("Items", []))
+        return devices
+
+    def touch_device_state(self, device_id, last_seen_at):
+        try:
+            self.client.update_item(
+                TableName=STATE_TABLE,
+                Key={"deviceId": {"S": device_id}},
+                UpdateExpression="SET lastSeenAt = :ts",
+                ConditionExpression="attribute_exists(deviceId)",
+                ExpressionAttributeValues={":ts": {"S": last_seen_at}},
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            pass
+
+    # -----------------------------
+    # Event Log
+    # -----------------------------
+
+    def write_log_records(self, records):
+        if len(records) == 1:
+            self.client.put_item(TableName=EVENT_TABLE, Item=_encode_log(records[0]))
+            return
+
+        for i in range(0, len(records), _BATCH_WRITE_MAX):
+            requests = [
+                {"PutRequest": {"Item": _encode_log(r)}}
+                for r in records[i:i + _BATCH_WRITE_MAX]
+            ]
+            self._batch_write(EVENT_TABLE, requests)
+
+    def _batch_write(self, table: str, requests: list[dict]) -> None:
+        pending = {table: requests}
+        delay = 0.05
+        while pending:
+            resp = self.client.batch_write_item(RequestItems=pending)
+            pending = resp.get("UnprocessedItems") or {}
+            if pending:
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+    def list_events(self, limit=None):
+        events = []
+        kwargs = {"TableName": EVENT_TABLE}
+        while True:
+            if limit is not None:
+                kwargs["Limit"] = limit - len(events)
+            resp = self.client.scan(**kwargs)
+            events.extend(_decode_log(item) for item in resp.get("Items", []))
+
+            last_key = resp.get("LastEvaluatedKey")
+            if not last_key or (limit is not None and len(events) >= limit):
+                break
+            kwargs["ExclusiveStartKey"] = last_key
+        return events
+
+    def get_recent_events_for_device(self, device_id, limit=20):
+        resp = self.client.query(
+            TableName=EVENT_TABLE,
+            IndexName=EVENT_LOGS_DEVICE_INDEX,
+            KeyConditionExpression="deviceId = :d",
+            ExpressionAttributeValues={":d": {"S": device_id}},
+            ScanIndexForward=False,  # Newest events first
+            Limit=limit,
+        )
+        return [_decode_log(item) for item in resp.get("Items", [])]
+
+    def get_recent_events_global(self, limit=50):
+        """
+        Walk feed buckets newest first. Each bucket costs FEED_SHARDS
+        parallel newest-first queries whose results are merged by timestamp;
+        buckets are disjoint in time, so we stop as soon as we have `limit`.
+        """
+        events = []
+        bucket = _feed_bucket(datetime.utcnow())
+        step = timedelta(minutes=FEED_BUCKET_MINUTES)
+
+        for _ in range(FEED_MAX_BUCKETS):
+            wanted = limit - len(events)
+            shard_results = self._feed_pool.map(
+                lambda shard: self._query_feed_shard(_feed_key(bucket, shard), wanted),
+                range(FEED_SHARDS),
+            )
+            merged = heapq.merge(
+                *shard_results, key=lambda item: item["timestamp"]["S"], reverse=True
+            )
+            for item in merged:
+                events.append(_decode_log(item))
+                if len(events) >= limit:
+                    return events
+            bucket -= step
+
+        return events
+
+    def iter_expired_events(self, cutoff, batch_size=500, full_scan=False):
+        """
+        Query the expiry index, oldest expiry day first, from
+        EXPIRY_LOOKBACK_DAYS before the cutoff's day up to it, one shard at a
+        time. It runs from the compaction job only, and must run before
+        DynamoDB's own TTL sweep deletes the rows.
+
+        full_scan=True does a filtered scan of the whole table instead, for
+        rows written before expiryKey existed.
+        """
+        if full_scan:
+            yield from self._scan_expired_events(cutoff, batch_size)
+            return
+
+        last_day = datetime.utcfromtimestamp(int(cutoff)).date()
+        for offset in range(EXPIRY_LOOKBACK_DAYS, -1, -1):
+            day = last_day - timedelta(days=offset)
+            for shard in range(FEED_SHARDS):
+                kwargs = {
+                    "TableName": EVENT_TABLE,
+                    "IndexName": EVENT_LOGS_EXPIRY_INDEX,
+                    "KeyConditionExpression": "expiryKey = :k AND expiresAt <= :cutoff",
+                    "ExpressionAttributeValues": {
+                        ":k": {"S": _expiry_key(day, shard)},
+                        ":cutoff": {"N": str(int(cutoff))},
+                    },
+                    "Limit": batch_size,
+                }
+                while True:
+                    resp = self.client.query(**kwargs)
+                    items = resp.get("Items", [])
+                    if items:
+                        yield [_decode_log(item) for item in items]
+
+                    last_key = resp.get("LastEvaluatedKey")
+                    if not last_key:
+                        break
+                    kwargs["ExclusiveStartKey"] = last_key
+
+    def _scan_expired_events(self, cutoff, batch_size):
+        kwargs = {
+            "TableName": EVENT_TABLE,
+            "FilterExpression": "expiresAt <= :cutoff",
+            "ExpressionAttributeValues": {":cutoff": {"N": str(int(cutoff))}},
+            "Limit": batch_size,
+        }
+        while True:
+            resp = self.client.scan(**kwargs)
+            items = resp.get("Items", [])
+            if items:
+                yield [_decode_log(item) for item in items]
+
+            last_key = resp.get("LastEvaluatedKey")
+            if not last_key:
+                break
+            kwargs["ExclusiveStartKey"] = last_key
+
+    def delete_events(self, log_ids):
+        for i in range(0, len(log_ids), _BATCH_WRITE_MAX):
+            requests = [
+                {"DeleteRequest": {"Key": {"logId": {"S": log_id}}}}
+                for log_id in log_ids[i:i + _BATCH_WRITE_MAX]
+            ]
+            self._batch_write(EVENT_TABLE, requests)
+
+    def _query_feed_shard(self, feed_key: str, limit: int) -> list[dict]:
+        resp = self.client.query(
+            TableName=EVENT_TABLE,
+            IndexName=EVENT_LOGS_FEED_INDEX,
+            KeyConditionExpression="feedKey = :k",
+            ExpressionAttributeValues={":k": {"S": feed_key}},
+            ScanIndexForward=False,  # Newest events first
+            Limit=limit,
+        )
+        return resp.get("Items", [])
+
+    # -----------------------------
+    # Telemetry Rollups
+    # -----------------------------
+
+    def merge_rollup(self, device_id, resolution, bucket, metrics):
+        """
+        count/sum are added atomically; min/max only need a second,
+        conditional write when the stored value is worse than ours.
+        """
+        names = {}
+        values = {
+            ":device": {"S": device_id},
+            ":res": {"S": resolution},
+        }
+        sets = ["deviceId = :device", "resolution = :res"]
+        adds = []
+
+        for i, (metric, agg) in enumerate(metrics.items()):
+            names[f"#c{i}"] = f"{metric}_count"
+            names[f"#s{i}"] = f"{metric}_sum"
+            names[f"#n{i}"] = f"{metric}_min"
+            names[f"#x{i}"] = f"{metric}_max"
+            values[f":c{i}"] = {"N": str(agg["count"])}
+            values[f":s{i}"] = {"N": repr(agg["sum"])}
+            values[f":n{i}"] = {"N": repr(agg["min"])}
+            values[f":x{i}"] = {"N": repr(agg["max"])}
+            sets.append(f"#n{i} = if_not_exists(#n{i}, :n{i})")
+            sets.append(f"#x{i} = if_not_exists(#x{i}, :x{i})")
+            adds.append(f"#c{i} :c{i}")
+            adds.append(f"#s{i} :s{i}")
+
+        key = {
+            "seriesKey": {"S": f"{device_id}#{resolution}"},
+            "bucket": {"S": bucket},
+        }
+
+        resp = self.client.update_item(
+            TableName=ROLLUP_TABLE,
+            Key=key,
+            UpdateExpression="SET " + ", ".join(sets) + " ADD " + ", ".join(adds),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )
+        stored = resp.get("Attributes", {})
+
+        for metric, agg in metrics.items():
+            for suffix, ours, op in (("min", agg["min"], ">"), ("max", agg["max"], "<")):
+                attr = f"{metric}_{suffix}"
+                current = float(stored.get(attr, {}).get("N", ours))
+                if current == ours or (current < ours if op == ">" else current > ours):
+                    continue
+                try:
+                    self.client.update_item(
+                        TableName=ROLLUP_TABLE,
+                        Key=key,
+                        UpdateExpression="SET #a = :v",
+                        ConditionExpression=f"#a {op} :v",
+                        ExpressionAttributeNames={"#a": attr},
+                        ExpressionAttributeValues={":v": {"N": repr(ours)}},
+                    )
+                except self.client.exceptions.ConditionalCheckFailedException:
+                    # Another writer already stored a better value.
+                    pass
+
+    def query_rollups(self, device_id, resolution, start_bucket, end_bucket):
+        kwargs = {
+            "TableName": ROLLUP_TABLE,
+            "KeyConditionExpression": "seriesKey = :k AND #b BETWEEN :a AND :z",
+            "ExpressionAttributeNames": {"#b": "bucket"},
+            "ExpressionAttributeValues": {
+                ":k": {"S": f"{device_id}#{resolution}"},
+                ":a": {"S": start_bucket},
+                ":z": {"S": end_bucket},
+            },
+        }
+
+        rows = []
+        while True:
+            resp = self.client.query(**kwargs)
+            for item in resp.get("Items", []):
+                metrics = {}
+                for attr, value in item.items():
+                    if not attr.endswith("_count"):
+                        continue
+                    metric = attr[: -len("_count")]
+                    metrics[metric] = {
+                        "count": int(value["N"]),
+                        "sum": float(item[f"{metric}_sum"]["N"]),
+                        "min": float(item[f"{metric}_min"]["N"]),
+                        "max": float(item[f"{metric}_max"]["N"]),
+                    }
+                rows.append({"bucket": item["bucket"]["S"], "metrics": metrics})
+
+            last_key = resp.get("LastEvaluatedKey")
+            if not last_key:
+                break
+            kwargs["ExclusiveStartKey"] = last_key
+
+        return rows
+
+    # -----------------------------
+    # Pending Commands
+    # -----------------------------
+
+    def put_pending_command(self, record):
+        self.client.put_item(TableName=COMMAND_TABLE, Item=_encode_pending(record))
+
+    def get_pending_command(self, command_id):
+        resp = self.client.get_item(
+            TableName=COMMAND_TABLE,
+            Key={"commandId": {"S": command_id}},
+            ConsistentRead=True,
+        )
+        return _decode_pending(resp["Item"]) if "Item" in resp else None
+
+    def take_pending_command(self, command_id):
+        resp = self.client.delete_item(
+            TableName=COMMAND_TABLE,
+            Key={"commandId": {"S": command_id}},
+            ReturnValues="ALL_OLD",
+        )
+        item = resp.get("Attributes")
+        return _decode_pending(item) if item else None
+
+    def list_pending_commands(self, limit=None):
+        # The table only holds in-flight commands, so a scan stays small
+        pending = []
+        paginator = self.client.get_paginator("scan")
+        for page in paginator.paginate(TableName=COMMAND_TABLE):
+            pending.extend(_decode_pending(item) for item in page.get("Items", []))
+        pending.sort(key=lambda r: r["sentAt"])
+        return pending if limit is None else pending[:limit]
+
+    # -----------------------------
+    # Device Topology
+    # -----------------------------
+
+    def put_device_topology(self, record):
+        self.client.put_item(TableName=TOPOLOGY_TABLE, Item=_encode_topology(record))
+
+    def delete_device_topology(self, device_id):
+        resp = self.client.delete_item(
+            TableName=TOPOLOGY_TABLE,
+            Key={"deviceId": {"S": device_id}},
+            ReturnValues="ALL_OLD",
+        )
+        return "Attributes" in resp
+
+    def list_device_topology(self):
+        records = []
+        paginator = self.client.get_paginator("scan")
+        for page in paginator.paginate(TableName=TOPOLOGY_TABLE):
+            records.extend(_decode_topology(item) for item in page.get("Items", []))
+        return records
+
+    # -----------------------------
+    # Settings
+    # -----------------------------
+
+    def get_setting(self, name):
+        resp = self.client.get_item(TableName=SETTINGS_TABLE, Key={"name": {"S": name}})
+        item = resp.get("Item")
+        # Stored as a JSON string: no Decimal round trip for float limits
+        return json.loads(item["value"]["S"]) if item else None
+
+    def put_setting(self, name, value):
+        self.client.put_item(TableName=SETTINGS_TABLE, Item={
+            "name": {"S": name},
+            "value": {"S": json.dumps(value)},
+            "updatedAt": {"S": now_iso()},
+        })
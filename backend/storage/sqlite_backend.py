@@ -0,0 +1,516 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from backend.storage.base import StorageBackend, now_iso
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# Configuration
+# -----------------------------
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "rakan.db")
+
+# Event-log inserts are buffered and committed together once either limit
+# is reached (or before any read, so reads always see every write).
+SQLITE_BATCH_SIZE = int(os.getenv("SQLITE_BATCH_SIZE", "100"))
+SQLITE_BATCH_MS = float(os.getenv("SQLITE_BATCH_MS", "50"))
+
+LOG = get_logger("sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS device_state (
+    device_id   TEXT PRIMARY KEY,
+    device_type TEXT,
+    state       TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    extra       TEXT
+);
+
+CREATE TABLE IF NOT EXISTS event_logs (
+    log_id       TEXT PRIMARY KEY,
+    device_id    TEXT NOT NULL,
+    timestamp    TEXT NOT NULL,
+    event        TEXT NOT NULL,
+    lam_decision TEXT,
+    command_sent TEXT,
+    expires_at   INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_event_logs_device_ts ON event_logs (device_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_event_logs_ts ON event_logs (timestamp);
+
+CREATE TABLE IF NOT EXISTS telemetry_rollups (
+    device_id  TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket     TEXT NOT NULL,
+    metric     TEXT NOT NULL,
+    count      INTEGER NOT NULL,
+    total      REAL NOT NULL,
+    min        REAL NOT NULL,
+    max        REAL NOT NULL,
+    PRIMARY KEY (device_id, resolution, bucket, metric)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS pending_commands (
+    command_id TEXT PRIMARY KEY,
+    device_id  TEXT NOT NULL,
+    action     TEXT,
+    command    TEXT NOT NULL,
+    sent_at    REAL NOT NULL,
+    deadline   REAL NOT NULL,
+    attempts   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_commands_sent ON pending_commands (sent_at);
+
+CREATE TABLE IF NOT EXISTS device_topology (
+    device_id  TEXT PRIMARY KEY,
+    room       TEXT,
+    groups     TEXT NOT NULL,
+    role       TEXT,
+    bindings   TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    name       TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Statements are module constants: sqlite3 keeps a per-connection cache of
+# compiled statements keyed by SQL text, so each one is prepared once.
+_UPSERT_STATE = """
+INSERT INTO device_state (device_id, device_type, state, updated_at, extra)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (device_id) DO UPDATE SET
+    device_type = COALESCE(excluded.device_type, device_state.device_type),
+    state       = excluded.state,
+    updated_at  = excluded.updated_at,
+    -- Merged key by key, as DynamoDB does, so lastSeenAt (touch) survives
+    extra       = COALESCE(json_patch(COALESCE(device_state.extra, '{}'), excluded.extra),
+                           device_state.extra)
+"""
+_SELECT_STATE = "SELECT device_id, device_type, state, updated_at, extra FROM device_state WHERE device_id = ?"
+_SELECT_ALL_STATES = "SELECT device_id, device_type, state, updated_at, extra FROM device_state"
+_TOUCH_STATE = (
+    "UPDATE device_state SET extra = json_set(COALESCE(extra, '{}'), '$.lastSeenAt', ?) "
+    "WHERE device_id = ?"
+)
+
+# A batch that failed is retried whole; rows already stored are skipped
+_INSERT_LOG = """
+INSERT INTO event_logs (log_id, device_id, timestamp, event, lam_decision, command_sent, expires_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (log_id) DO NOTHING
+"""
+_LOG_COLUMNS = "log_id, device_id, timestamp, event, lam_decision, command_sent, expires_at"
+_SELECT_LOGS = f"SELECT {_LOG_COLUMNS} FROM event_logs"
+_SELECT_LOGS_LIMIT = f"SELECT {_LOG_COLUMNS} FROM event_logs LIMIT ?"
+_SELECT_DEVICE_LOGS = (
+    f"SELECT {_LOG_COLUMNS} FROM event_logs WHERE device_id = ? "
+    "ORDER BY timestamp DESC LIMIT ?"
+)
+_SELECT_RECENT_LOGS = f"SELECT {_LOG_COLUMNS} FROM event_logs ORDER BY timestamp DESC LIMIT ?"
+# Keyset pagination on (expires_at, log_id) so callers may delete as they go
+_SELECT_EXPIRED_LOGS = (
+    f"SELECT {_LOG_COLUMNS} FROM event_logs "
+    "WHERE expires_at <= ? AND (expires_at, log_id) > (?, ?) "
+    "ORDER BY expires_at, log_id LIMIT ?"
+)
+_DELETE_LOG = "DELETE FROM event_logs WHERE log_id = ?"
+
+_UPSERT_ROLLUP = """
+INSERT INTO telemetry_rollups (device_id, resolution, bucket, metric, count, total, min, max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (device_id, resolution, bucket, metric) DO UPDATE SET
+    count = telemetry_rollups.count + excluded.count,
+    total = telemetry_rollups.total + excluded.total,
+    min   = MIN(telemetry_rollups.min, excluded.min),
+    max   = MAX(telemetry_rollups.max, excluded.max)
+"""
+_SELECT_ROLLUPS = """
+SELECT bucket, metric, count, total, min, max FROM telemetry_rollups
+WHERE device_id = ? AND resolution = ? AND bucket BETWEEN ? AND ?
+ORDER BY bucket
+"""
+
+_PENDING_COLUMNS = "command_id, device_id, action, command, sent_at, deadline, attempts"
+_UPSERT_PENDING = f"INSERT OR REPLACE INTO pending_commands ({_PENDING_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+_SELECT_PENDING = f"SELECT {_PENDING_COLUMNS} FROM pending_commands WHERE command_id = ?"
+_DELETE_PENDING = "DELETE FROM pending_commands WHERE command_id = ?"
+_SELECT_ALL_PENDING = f"SELECT {_PENDING_COLUMNS} FROM pending_commands ORDER BY sent_at"
+_SELECT_ALL_PENDING_LIMIT = f"{_SELECT_ALL_PENDING} LIMIT ?"
+
+_TOPOLOGY_COLUMNS = "device_id, room, groups, role, bindings, updated_at"
+_UPSERT_TOPOLOGY = f"INSERT OR REPLACE INTO device_topology ({_TOPOLOGY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)"
+_DELETE_TOPOLOGY = "DELETE FROM device_topology WHERE device_id = ?"
+_SELECT_ALL_TOPOLOGY = f"SELECT {_TOPOLOGY_COLUMNS} FROM device_topology"
+
+_UPSERT_SETTING = "INSERT OR REPLACE INTO settings (name, value, updated_at) VALUES (?, ?, ?)"
+_SELECT_SETTING = "SELECT value FROM settings WHERE name = ?"
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+
+def _dumps(value) -> str | None:
+    return None if value is None else json.dumps(value, default=str)
+
+
+def _loads(value):
+    return None if value is None else json.loads(value)
+
+
+def _decode_state(row) -> dict:
+    device_id, device_type, state, updated_at, extra = row
+    record = _loads(extra) or {}
+    record.update({"deviceId": device_id, "state": _loads(state), "updatedAt": updated_at})
+    if device_type:
+        record["type"] = device_type
+    return record
+
+
+def _decode_log(row) -> dict:
+    log_id, device_id, timestamp, event, lam_decision, command_sent, expires_at = row
+    return {
+        "logId": log_id,
+        "deviceId": device_id,
+        "timestamp": timestamp,
+        "event": _loads(event),
+        "lamDecision": _loads(lam_decision),
+        "commandSent": _loads(command_sent),
+        "expiresAt": expires_at,
+    }
+
+
+def _decode_pending(row) -> dict:
+    command_id, device_id, action, command, sent_at, deadline, attempts = row
+    return {
+        "commandId": command_id,
+        "deviceId": device_id,
+        "action": action,
+        "command": _loads(command),
+        "sentAt": sent_at,
+        "deadline": deadline,
+        "attempts": attempts,
+    }
+
+
+def _decode_topology(row) -> dict:
+    device_id, room, groups, role, bindings, updated_at = row
+    return {
+        "deviceId": device_id,
+        "room": room,
+        "groups": _loads(groups),
+        "role": role,
+        "bindings": _loads(bindings),
+        "updatedAt": updated_at,
+    }
+
+
+# -----------------------------
+# Backend
+# -----------------------------
+
+class SQLiteStorage(StorageBackend):
+    """
+    Embedded storage for edge gateways and local integration runs.
+    WAL mode lets the API read while the processor writes; event-log
+    inserts are grouped into one transaction per batch. A background
+    thread commits a batch once it is batch_ms old, so a processor that
+    goes quiet never holds rows back from other readers of the file.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, batch_size: int = SQLITE_BATCH_SIZE,
+                 batch_ms: float = SQLITE_BATCH_MS):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+
+        self._lock = threading.RLock()
+        self._pending = []
+        self._pending_since = None
+        self._flusher = None
+        self._closed = threading.Event()
+
+        # isolation_level=None: transactions are opened explicitly below
+        self._conn = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=128,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns introduced after a database file was created."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(event_logs)")}
+        if "expires_at" not in columns:
+            self._conn.execute("ALTER TABLE event_logs ADD COLUMN expires_at INTEGER")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_event_logs_expires ON event_logs (expires_at, log_id)"
+        )
+
+    # -----------------------------
+    # Device State
+    # -----------------------------
+
+    def put_device_state(self, device_id, state, updated_at=None, device_type=None, extra=None):
+        updated_at = updated_at or now_iso()
+        with self._lock:
+            self._conn.execute(
+                _UPSERT_STATE,
+                (device_id, device_type, _dumps(state), updated_at, _dumps(extra or None)),
+            )
+
+        record = {"deviceId": device_id, "state": state, "updatedAt": updated_at}
+        if device_type:
+            record["type"] = device_type
+        if extra:
+            record.update(extra)
+        return record
+
+    def get_device_state(self, device_id):
+        with self._lock:
+            row = self._conn.execute(_SELECT_STATE, (device_id,)).fetchone()
+        return _decode_state(row) if row else None
+
+    def list_device_states(self):
+        with self._lock:
+            rows = self._conn.execute(_SELECT_ALL_STATES).fetchall()
+        return [_decode_state(row) for row in rows]
+
+    def touch_device_state(self, device_id, last_seen_at):
+        with self._lock:
+            self._conn.execute(_TOUCH_STATE, (last_seen_at, device_id))
+
+    # -----------------------------
+    # Event Log
+    # -----------------------------
+
+    def write_log_records(self, records):
+        rows = [
+            (
+                r["logId"],
+                r["deviceId"],
+                r["timestamp"],
+                _dumps(r["event"]),
+                _dumps(r.get("lamDecision")),
+                _dumps(r.get("commandSent")),
+                r.get("expiresAt"),
+            )
+            for r in records
+        ]
+
+        with self._lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.extend(rows)
+
+            age_ms = (time.monotonic() - self._pending_since) * 1000
+            if len(self._pending) >= self.batch_size or age_ms >= self.batch_ms:
+                self._flush_locked()
+            elif self._flusher is None:
+                self._start_flusher()
+
+    def _start_flusher(self):
+        # Caller holds the lock
+        def loop():
+            while not self._closed.wait(self.batch_ms / 1000):
+                try:
+                    with self._lock:
+                        if self._pending and \
+                                (time.monotonic() - self._pending_since) * 1000 >= self.batch_ms:
+                            self._flush_locked()
+                except Exception as e:
+                    LOG.error("SQLite batch flush failed: %s", e)
+
+        self._flusher = threading.Thread(target=loop, name="sqlite-flush", daemon=True)
+        self._flusher.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(_INSERT_LOG, self._pending)
+            self._conn.execute("COMMIT")
+        except Exception:
+            # Keep the rows buffered for the next flush (e.g. database is locked)
+            self._conn.execute("ROLLBACK")
+            raise
+        self._pending = []
+
+    def list_events(self, limit=None):
+        with self._lock:
+            self._flush_locked()
+            if limit is None:
+                rows = self._conn.execute(_SELECT_LOGS).fetchall()
+            else:
+                rows = self._conn.execute(_SELECT_LOGS_LIMIT, (limit,)).fetchall()
+        return [_decode_log(row) for row in rows]
+
+    def get_recent_events_for_device(self, device_id, limit=20):
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(_SELECT_DEVICE_LOGS, (device_id, limit)).fetchall()
+        return [_decode_log(row) for row in rows]
+
+    def get_recent_events_global(self, limit=50):
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(_SELECT_RECENT_LOGS, (limit,)).fetchall()
+        return [_decode_log(row) for row in rows]
+
+    def iter_expired_events(self, cutoff, batch_size=500, full_scan=False):
+        # The (expires_at, log_id) index serves both cases
+        last = (-1, "")
+        while True:
+            with self._lock:
+                self._flush_locked()
+                rows = self._conn.execute(
+                    _SELECT_EXPIRED_LOGS, (int(cutoff), last[0], last[1], batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last = (rows[-1][6], rows[-1][0])
+            yield [_decode_log(row) for row in rows]
+
+    def delete_events(self, log_ids):
+        with self._lock:
+            self._flush_locked()
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(_DELETE_LOG, [(log_id,) for log_id in log_ids])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # -----------------------------
+    # Telemetry Rollups
+    # -----------------------------
+
+    def merge_rollup(self, device_id, resolution, bucket, metrics):
+        rows = [
+            (device_id, resolution, bucket, metric,
+             agg["count"], agg["sum"], agg["min"], agg["max"])
+            for metric, agg in metrics.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(_UPSERT_ROLLUP, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def query_rollups(self, device_id, resolution, start_bucket, end_bucket):
+        with self._lock:
+            rows = self._conn.execute(
+                _SELECT_ROLLUPS, (device_id, resolution, start_bucket, end_bucket)
+            ).fetchall()
+
+        buckets = {}
+        for bucket, metric, count, total, mn, mx in rows:
+            buckets.setdefault(bucket, {})[metric] = {
+                "count": count, "sum": total, "min": mn, "max": mx,
+            }
+        return [{"bucket": b, "metrics": m} for b, m in buckets.items()]
+
+    # -----------------------------
+    # Pending Commands
+    # -----------------------------
+
+    def put_pending_command(self, record):
+        with self._lock:
+            self._conn.execute(_UPSERT_PENDING, (
+                record["commandId"], record["deviceId"], record.get("action"),
+                _dumps(record["command"]), record["sentAt"], record["deadline"],
+                record["attempts"],
+            ))
+
+    def get_pending_command(self, command_id):
+        with self._lock:
+            row = self._conn.execute(_SELECT_PENDING, (command_id,)).fetchone()
+        return _decode_pending(row) if row else None
+
+    def take_pending_command(self, command_id):
+        with self._lock:
+            # IMMEDIATE: another process on the same file cannot take it in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(_SELECT_PENDING, (command_id,)).fetchone()
+                if row:
+                    self._conn.execute(_DELETE_PENDING, (command_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return _decode_pending(row) if row else None
+
+    def list_pending_commands(self, limit=None):
+        with self._lock:
+            if limit is None:
+                rows = self._conn.execute(_SELECT_ALL_PENDING).fetchall()
+            else:
+                rows = self._conn.execute(_SELECT_ALL_PENDING_LIMIT, (limit,)).fetchall()
+        return [_decode_pending(row) for row in rows]
+
+    # -----------------------------
+    # Device Topology
+    # -----------------------------
+
+    def put_device_topology(self, record):
+        with self._lock:
+            self._conn.execute(_UPSERT_TOPOLOGY, (
+                record["deviceId"], record.get("room"), _dumps(record.get("groups") or []),
+                record.get("role"), _dumps(record.get("bindings") or []),
+                record.get("updatedAt") or now_iso(),
+            ))
+
+    def delete_device_topology(self, device_id):
+        with self._lock:
+            cursor = self._conn.execute(_DELETE_TOPOLOGY, (device_id,))
+        return cursor.rowcount > 0
+
+    def list_device_topology(self):
+        with self._lock:
+            rows = self._conn.execute(_SELECT_ALL_TOPOLOGY).fetchall()
+        return [_decode_topology(row) for row in rows]
+
+    # -----------------------------
+    # Settings
+    # -----------------------------
+
+    def get_setting(self, name):
+        with self._lock:
+            row = self._conn.execute(_SELECT_SETTING, (name,)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def put_setting(self, name, value):
+        with self._lock:
+            self._conn.execute(_UPSERT_SETTING, (name, _dumps(value), now_iso()))
+
+    # -----------------------------
+    # Lifecycle
+    # -----------------------------
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
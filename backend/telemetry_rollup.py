@@ -0,0 +1,249 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from backend.storage import get_storage
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# How long readings are aggregated in memory before being merged into the
+# storage. 0 writes through on every event.
+ROLLUP_FLUSH_SECONDS = float(os.getenv("ROLLUP_FLUSH_SECONDS", "30"))
+
+LOG = get_logger("telemetry_rollup")
+
+# Bucket width in seconds for every stored resolution.
+RESOLUTIONS = {
+    "minute": 60,
+    "hour": 3600,
+}
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+
+def parse_time(value) -> float | None:
+    """
+    Convert an epoch number or ISO-8601 string into epoch seconds.
+    Simulators send float epochs, the contract uses ISO strings.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+
+    return None
+
+
+def _bucket_start(epoch: float, resolution: str) -> int:
+    width = RESOLUTIONS[resolution]
+    return int(epoch // width) * width
+
+
+def _bucket_key(bucket_epoch: int) -> str:
+    """ISO bucket start, which sorts correctly as a range/sort key."""
+    return datetime.fromtimestamp(bucket_epoch, tz=timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+def numeric_readings(event: dict) -> dict:
+    """
+    Extract the numeric readings of an event as {metric: float}.
+
+    Readings nested under "data" (simulator format) use their own key as the
+    metric name; a top-level "value" (contract format) is named after the
+    event type. Booleans are stored as 0/1 so their average is a duty cycle.
+    """
+    readings = {}
+
+    data = event.get("data")
+    if isinstance(data, dict):
+        for metric, value in data.items():
+            if isinstance(value, (bool, int, float)):
+                readings[metric] = float(value)
+
+    value = event.get("value")
+    if isinstance(value, (bool, int, float)):
+        readings[event.get("type") or "value"] = float(value)
+
+    return readings
+
+
+class _Aggregate:
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+
+# -----------------------------
+# QUERIES
+# -----------------------------
+
+def query_rollups(device_id: str, resolution: str, start: float, end: float) -> list[dict]:
+    """
+    Return the rollup buckets of a device in [start, end], oldest first:
+        [{"bucket": iso, "metrics": {metric: {min, max, avg, count}}}]
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}'")
+
+    rows = get_storage().query_rollups(
+        device_id,
+        resolution,
+        _bucket_key(_bucket_start(start, resolution)),
+        _bucket_key(_bucket_start(end, resolution)),
+    )
+
+    buckets = []
+    for row in rows:
+        metrics = {}
+        for metric, agg in row["metrics"].items():
+            count = agg["count"]
+            metrics[metric] = {
+                "min": agg["min"],
+                "max": agg["max"],
+                "avg": agg["sum"] / count if count else None,
+                "count": count,
+            }
+        buckets.append({"bucket": row["bucket"], "metrics": metrics})
+
+    return buckets
+
+
+def pick_resolution(start: float, end: float) -> str:
+    """Minute buckets up to 6 hours of range, hour buckets beyond that."""
+    return "minute" if end - start <= 6 * 3600 else "hour"
+
+
+# -----------------------------
+# ACCUMULATOR
+# -----------------------------
+
+class RollupAccumulator:
+    """
+    Buffers per-device, per-bucket aggregates in memory and merges them into
+    storage every ROLLUP_FLUSH_SECONDS. Partial aggregates merge
+    associatively, so flushing a bucket several times is safe.
+
+    The interval flush runs on a background thread (started with the first
+    reading), never inside add_event, so no event pays for the writes.
+    Short-lived callers flush explicitly: lambda_handler after every
+    invocation, before the container can be frozen.
+    """
+
+    def __init__(self, flush_seconds: float = ROLLUP_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._ticker = None
+        self._stop = threading.Event()
+
+    def add_event(self, event: dict) -> None:
+        device_id = event.get("deviceId")
+        readings = numeric_readings(event)
+        if not device_id or not readings:
+            return
+
+        epoch = parse_time(event.get("timestamp")) or time.time()
+
+        with self._lock:
+            for resolution in RESOLUTIONS:
+                key = (device_id, resolution, _bucket_start(epoch, resolution))
+                metrics = self._buckets.setdefault(key, {})
+                for metric, value in readings.items():
+                    metrics.setdefault(metric, _Aggregate()).add(value)
+
+        if self.flush_seconds <= 0:
+            self.flush()
+        elif self._ticker is None:
+            self.start()
+
+    def start(self) -> None:
+        """Flush every flush_seconds on a daemon thread, and once more at exit."""
+        with self._lock:
+            if self._ticker is not None:
+                return
+
+            def loop():
+                while not self._stop.wait(self.flush_seconds):
+                    self.flush()
+
+            self._ticker = threading.Thread(target=loop, name="telemetry-rollup", daemon=True)
+            self._ticker.start()
+        atexit.register(self.flush)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._buckets = self._buckets, {}
+        if not pending:
+            return
+
+        # Serialise flushes so a timer flush and an explicit one never
+        # interleave their merges for the same bucket
+        with self._flush_lock:
+            self._write(pending)
+
+    def _write(self, pending: dict) -> None:
+        storage = get_storage()
+        for (device_id, resolution, bucket_epoch), metrics in pending.items():
+            try:
+                storage.merge_rollup(
+                    device_id,
+                    resolution,
+                    _bucket_key(bucket_epoch),
+                    {
+                        metric: {"count": agg.count, "sum": agg.total, "min": agg.min, "max": agg.max}
+                        for metric, agg in metrics.items()
+                    },
+                )
+            except Exception as e:
+                LOG.error("Failed to write rollup for %s: %s", device_id, e)
+
+
+# -----------------------------
+# WRAPPER USED BY EVENTPROCESSOR
+# -----------------------------
+_accumulator = RollupAccumulator()
+
+def record_telemetry(event: dict) -> None:
+    return _accumulator.add_event(event)
+
+def flush_telemetry() -> None:
+    return _accumulator.flush()
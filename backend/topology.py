@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+
+from backend.storage import get_storage, now_iso
+from simulator.shared.logs import get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# How often a process re-reads the topology table to pick up changes made
+# by another process (e.g. the Lambda after an edit through the API).
+# Changes made through this module are applied immediately.
+TOPOLOGY_REFRESH_SECONDS = float(os.getenv("TOPOLOGY_REFRESH_SECONDS", "30"))
+
+ACTUATOR = "actuator"
+SENSOR = "sensor"
+ROLES = (SENSOR, ACTUATOR)
+
+# Binding targets: a deviceId, or every actuator of a room / group
+ROOM_PREFIX = "room:"
+GROUP_PREFIX = "group:"
+
+LOG = get_logger("topology")
+
+
+def make_topology_record(device_id: str, room: str | None = None, groups=None,
+                         role: str | None = None, bindings=None) -> dict:
+    """
+    Validate and normalise one device's topology. Raises ValueError.
+        room      room the device is in (optional)
+        groups    names of the groups it belongs to
+        role      "sensor" or "actuator"; only actuators are reached
+                  through room: / group: bindings
+        bindings  targets a sensor's decisions are sent to:
+                  "<deviceId>", "room:<room>" or "group:<group>"
+    """
+    groups = [] if groups is None else groups
+    bindings = [] if bindings is None else bindings
+
+    if room is not None and (not isinstance(room, str) or not room):
+        raise ValueError("'room' must be a non-empty string")
+    if role is not None and role not in ROLES:
+        raise ValueError(f"'role' must be one of {list(ROLES)}")
+    if not isinstance(groups, list) or not all(isinstance(g, str) and g for g in groups):
+        raise ValueError("'groups' must be a list of non-empty strings")
+    if not isinstance(bindings, list) or not all(isinstance(b, str) and b for b in bindings):
+        raise ValueError("'bindings' must be a list of non-empty strings")
+    for target in bindings:
+        if target in (ROOM_PREFIX, GROUP_PREFIX):
+            raise ValueError(f"Binding '{target}' has no name")
+
+    return {
+        "deviceId": device_id,
+        "room": room,
+        "groups": list(dict.fromkeys(groups)),
+        "role": role,
+        "bindings": list(dict.fromkeys(bindings)),
+        "updatedAt": now_iso(),
+    }
+
+
+def compile_routes(records: dict) -> tuple[dict, dict, dict]:
+    """
+    Expand every binding into concrete actuator ids.
+    Returns (routes, rooms, groups):
+        routes  sensor deviceId -> tuple of target deviceIds
+        rooms   room -> set of member deviceIds
+        groups  group -> set of member deviceIds
+    """
+    rooms, groups = {}, {}
+    for device_id, record in records.items():
+        if record.get("room"):
+            rooms.setdefault(record["room"], set()).add(device_id)
+        for group in record.get("groups") or ():
+            groups.setdefault(group, set()).add(device_id)
+
+    def actuators(members):
+        return sorted(m for m in members if records[m].get("role") == ACTUATOR)
+
+    routes = {}
+    for device_id, record in records.items():
+        targets = []
+        for binding in record.get("bindings") or ():
+            if binding.startswith(ROOM_PREFIX):
+                targets.extend(actuators(rooms.get(binding[len(ROOM_PREFIX):], ())))
+            elif binding.startswith(GROUP_PREFIX):
+                targets.extend(actuators(groups.get(binding[len(GROUP_PREFIX):], ())))
+            else:
+                targets.append(binding)
+        # A sensor never routes to itself; overlapping bindings send once
+        targets = tuple(t for t in dict.fromkeys(targets) if t != device_id)
+        if targets:
+            routes[device_id] = targets
+    return routes, rooms, groups
+
+
+class TopologyIndex:
+    """
+    Rooms, groups and sensor -> actuator bindings from the topology table
+    (Rakan_DeviceTopology, next to Rakan_DeviceState), compiled into a
+    routing index so EventProcessor finds a decision's targets with one
+    dictionary lookup.
+
+    The whole index is recompiled on every change and swapped in at once;
+    readers never take the lock. It is loaded lazily and re-read every
+    TOPOLOGY_REFRESH_SECONDS so a Lambda container sees edits made through
+    the API without reading the table per event.
+    """
+
+    def __init__(self, storage=None, refresh_seconds=TOPOLOGY_REFRESH_SECONDS):
+        self._storage = storage
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.Lock()
+        self._records = {}
+        self._routes = {}
+        self._rooms = {}
+        self._groups = {}
+        self._loaded_at = None
+        self.version = 0
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    # -----------------------------
+    # Loading
+    # -----------------------------
+
+    def _install(self, records: dict) -> None:
+        # Caller holds the lock
+        routes, rooms, groups = compile_routes(records)
+        self._records = records
+        self._routes, self._rooms, self._groups = routes, rooms, groups
+        self.version += 1
+
+    def load(self) -> int:
+        """Replace the index with the current contents of storage."""
+        records = {r["deviceId"]: r for r in self.storage.list_device_topology()}
+        with self._lock:
+            self._install(records)
+            self._loaded_at = time.monotonic()
+        return len(records)
+
+    def _maybe_refresh(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.refresh_seconds:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            # Keep routing with what we have; try again after another interval
+            self._loaded_at = time.monotonic()
+            LOG.error("Failed to load topology: %s", e)
+
+    # -----------------------------
+    # Routing
+    # -----------------------------
+
+    def targets(self, device_id: str) -> tuple:
+        """Actuators bound to a device (empty if it has no bindings)."""
+        self._maybe_refresh()
+        return self._routes.get(device_id, ())
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+
+    def put(self, device_id: str, room=None, groups=None, role=None, bindings=None) -> dict:
+        record = make_topology_record(device_id, room, groups, role, bindings)
+        self._maybe_refresh()
+        self.storage.put_device_topology(record)
+        with self._lock:
+            records = dict(self._records)
+            records[device_id] = record
+            self._install(records)
+        return record
+
+    def remove(self, device_id: str) -> bool:
+        self._maybe_refresh()
+        removed = self.storage.delete_device_topology(device_id)
+        with self._lock:
+            if device_id in self._records:
+                records = dict(self._records)
+                del records[device_id]
+                self._install(records)
+        return removed
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+
+    def get(self, device_id: str) -> dict | None:
+        self._maybe_refresh()
+        record = self._records.get(device_id)
+        if record is None:
+            return None
+        return {**record, "targets": list(self._routes.get(device_id, ()))}
+
+    def summary(self) -> dict:
+        self._maybe_refresh()
+        with self._lock:
+            return {
+                "version": self.version,
+                "devices": len(self._records),
+                "rooms": {name: sorted(ids) for name, ids in self._rooms.items()},
+                "groups": {name: sorted(ids) for name, ids in self._groups.items()},
+                "routes": {device_id: list(t) for device_id, t in self._routes.items()},
+            }
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+topology = TopologyIndex()
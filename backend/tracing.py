@@ -0,0 +1,169 @@
+import bisect
+import os
+import threading
+import time
+import uuid
+
+from simulator.shared.logs import TRACE, JsonArg, get_logger
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+
+# Log one JSON line per processed event with its span timings
+# (for CloudWatch Logs Insights when running as a Lambda; sample with
+# LOG_SAMPLE=trace=<rate>).
+TRACE_LOG = os.getenv("TRACE_LOG", "0") == "1"
+
+LOG = get_logger("trace")
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (
+    0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 30000, float("inf"),
+)
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles resolve to a bucket bound."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, pct: float) -> float | None:
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": {
+                ("+inf" if b == float("inf") else str(b)): n
+                for b, n in zip(BUCKETS_MS, self.counts) if n
+            },
+        }
+
+
+class Tracer:
+    """Latency histograms keyed by (hop, device type)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def record(self, hop: str, device_type: str | None, ms: float) -> None:
+        with self._lock:
+            for key in ((hop, device_type or "unknown"), (hop, "*")):
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = LatencyHistogram()
+                hist.add(ms)
+
+    def snapshot(self) -> dict:
+        """{hop: {device type or "*": histogram dict}}"""
+        with self._lock:
+            out = {}
+            for (hop, device_type), hist in self._histograms.items():
+                out.setdefault(hop, {})[device_type] = hist.to_dict()
+            return out
+
+    def summary(self) -> dict:
+        """Like snapshot() but only count/p50/p99, for console reports."""
+        return {
+            hop: {
+                device_type: {"count": h["count"], "p50": round(h["p50"], 3), "p99": round(h["p99"], 3)}
+                for device_type, h in by_type.items()
+            }
+            for hop, by_type in self.snapshot().items()
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+
+
+class Trace:
+    """Span timings for one event as it moves through EventProcessor."""
+
+    def __init__(self, tracer: Tracer, event: dict):
+        self.tracer = tracer
+        self.correlation_id = event.get("correlationId") or new_correlation_id()
+        self.device_type = event.get("type")
+        self.spans = {}
+        self._started = time.perf_counter()
+
+        # Device -> processor transit (MQTT, IoT Rule, Lambda start-up).
+        # Only meaningful when clocks are in sync; skipped for ISO timestamps.
+        sent_at = event.get("timestamp")
+        if isinstance(sent_at, (int, float)) and not isinstance(sent_at, bool):
+            self.spans["transit"] = max(0.0, (time.time() - sent_at) * 1000)
+
+    def span(self, hop: str):
+        return _Span(self, hop)
+
+    def finish(self) -> dict:
+        self.spans["processor_total"] = (time.perf_counter() - self._started) * 1000
+        for hop, ms in self.spans.items():
+            self.tracer.record(hop, self.device_type, ms)
+
+        if TRACE_LOG:
+            LOG.info("%s", JsonArg({
+                "correlationId": self.correlation_id,
+                "type": self.device_type,
+                "spansMs": {k: round(v, 3) for k, v in self.spans.items()},
+            }), extra=TRACE)
+        return self.spans
+
+
+class _Span:
+    __slots__ = ("trace", "hop", "_t")
+
+    def __init__(self, trace, hop):
+        self.trace = trace
+        self.hop = hop
+
+    def __enter__(self):
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.spans[self.hop] = (time.perf_counter() - self._t) * 1000
+        return False
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+tracer = Tracer()
+
+
+def start_trace(event: dict) -> Trace:
+    return Trace(tracer, event)
@@ -0,0 +1,343 @@
+"""
+Load test for backend/api.py against a seeded local storage stand-in.
+
+    python -m bench.api_load --devices 10000 --logs 50000 --concurrency 8
+    python -m bench.api_load --compare bench/baselines/api_load.json
+    python -m bench.api_load --output bench/baselines/api_load.json   # new baseline
+
+Storage is seeded with --devices device-state rows and --logs event-log rows,
+then each endpoint is driven in-process (httpx ASGI transport, no network)
+by --concurrency workers for --requests requests or --duration seconds,
+whichever comes first. Reported per endpoint: throughput, p50/p99/max
+latency, the first (cold) request, average response size and process RSS.
+
+--storage sqlite (default) uses backend/storage/sqlite_backend.py on a temp
+file. --storage dynamodb uses DynamoDBStorage: against DynamoDB Local when
+AWS_ENDPOINT_URL_DYNAMODB is set, otherwise in-process moto (if installed).
+
+Commands go to a no-op IoT client (--iot-latency-ms simulates the publish
+round trip); they are still queued, coalesced and written to the
+pending-command table as in production.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from simulator.shared.utils import percentile
+
+ENDPOINTS = ("devices", "devices_count", "device", "logs", "command")
+DEVICE_TYPES = ("motion", "temperature", "switch")
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+
+def rss_mb():
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def device_ids(n):
+    return [f"bench-{DEVICE_TYPES[i % 3]}-{i:06d}" for i in range(n)]
+
+
+class NullIoT:
+    """iot-data stand-in: accepts every publish after an optional delay."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.published = 0
+
+    def publish(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.published += 1
+        return {}
+
+
+# -----------------------------
+# STORAGE
+# -----------------------------
+
+def create_dynamodb_tables():
+    import boto3
+    from backend.storage import dynamodb_backend as ddb
+
+    client = boto3.client("dynamodb", region_name=ddb.AWS_REGION)
+    existing = set(client.list_tables()["TableNames"])
+
+    def table(name, key, attrs=None, gsis=None):
+        if name in existing:
+            return
+        kwargs = {
+            "TableName": name,
+            "KeySchema": [{"AttributeName": key, "KeyType": "HASH"}],
+            "AttributeDefinitions": [
+                {"AttributeName": a, "AttributeType": "N" if a == "expiresAt" else "S"}
+                for a in (attrs or [key])
+            ],
+            "BillingMode": "PAY_PER_REQUEST",
+        }
+        if gsis:
+            kwargs["GlobalSecondaryIndexes"] = [
+                {
+                    "IndexName": index,
+                    "KeySchema": [
+                        {"AttributeName": hash_key, "KeyType": "HASH"},
+                        {"AttributeName": range_key, "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+                for index, hash_key, range_key in gsis
+            ]
+        client.create_table(**kwargs)
+
+    table(ddb.STATE_TABLE, "deviceId")
+    table(ddb.EVENT_TABLE, "logId",
+          attrs=["logId", "deviceId", "timestamp", "feedKey", "expiryKey", "expiresAt"],
+          gsis=[(ddb.EVENT_LOGS_DEVICE_INDEX, "deviceId", "timestamp"),
+                (ddb.EVENT_LOGS_FEED_INDEX, "feedKey", "timestamp"),
+                (ddb.EVENT_LOGS_EXPIRY_INDEX, "expiryKey", "expiresAt")])
+    table(ddb.COMMAND_TABLE, "commandId")
+
+
+def seed(storage, n_devices, n_logs, days, batch=1000, seed_value=1):
+    """Write n_devices state rows and n_logs event rows spread over `days`."""
+    from backend.storage import make_log_record
+
+    rng = random.Random(seed_value)
+    ids = device_ids(n_devices)
+    now = datetime.utcnow()
+
+    for i, device_id in enumerate(ids):
+        device_type = DEVICE_TYPES[i % 3]
+        action = "switch" if device_type != "temperature" else rng.choice(("ignore", "cooling"))
+        storage.put_device_state(device_id, {
+            "deviceId": device_id,
+            "action": action,
+            "value": rng.random() < 0.5,
+            "reason": "Seeded by bench.api_load",
+            "timestamp": now.isoformat() + "Z",
+        }, now.isoformat() + "Z", device_type=device_type)
+
+    span = days * 86400
+    for start in range(0, n_logs, batch):
+        records = []
+        for _ in range(min(batch, n_logs - start)):
+            device_id = ids[rng.randrange(n_devices)] if n_devices else "bench-unknown"
+            device_type = device_id.split("-")[1]
+            at = now - timedelta(seconds=rng.random() * span)
+            data = ({"temperature": round(rng.uniform(15, 30), 2)} if device_type == "temperature"
+                    else {"motion": rng.random() < 0.2})
+            event = {"deviceId": device_id, "type": device_type, "data": data,
+                     "timestamp": at.timestamp()}
+            records.append(make_log_record(event, at.isoformat() + "Z"))
+        storage.write_log_records(records)
+    storage.flush()
+    return ids
+
+
+# -----------------------------
+# LOAD
+# -----------------------------
+
+def request_for(name, ids, rng):
+    if name == "devices":
+        return "GET", "/devices", None
+    if name == "devices_count":
+        return "GET", "/devices/count", None
+    if name == "device":
+        return "GET", f"/device/{rng.choice(ids)}", None
+    if name == "logs":
+        return "GET", "/logs", None
+    if name == "command":
+        body = {"action": "switch", "value": rng.random() < 0.5}
+        return "POST", f"/device/{rng.choice(ids)}/command", body
+    raise ValueError(f"Unknown endpoint '{name}'")
+
+
+async def drive(client, name, ids, requests, duration, concurrency, seed_value=1):
+    rng = random.Random(seed_value)
+    latencies, sizes = [], []
+    errors = 0
+    remaining = requests
+
+    # First request on its own: cold caches, registry warm load, ...
+    method, path, body = request_for(name, ids, rng)
+    started = time.perf_counter()
+    resp = await client.request(method, path, json=body)
+    first_ms = (time.perf_counter() - started) * 1000
+
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0 and time.monotonic() < deadline:
+            remaining -= 1
+            method, path, body = request_for(name, ids, rng)
+            t = time.perf_counter()
+            resp = await client.request(method, path, json=body)
+            latencies.append((time.perf_counter() - t) * 1000)
+            sizes.append(len(resp.content))
+            if resp.status_code >= 400:
+                errors += 1
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors + (resp.status_code >= 400),
+        "throughputRps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "firstMs": round(first_ms, 2),
+        "p50Ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p99Ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "maxMs": round(latencies[-1], 2) if latencies else None,
+        "avgBytes": round(sum(sizes) / len(sizes)) if sizes else len(resp.content),
+        "rssMb": rss_mb(),
+        "rssDeltaMb": round(rss_mb() - rss_before, 1),
+    }
+
+
+async def run(app, endpoints, ids, args):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 timeout=None) as client:
+        results = {}
+        for name in endpoints:
+            results[name] = await drive(client, name, ids, args.requests,
+                                        args.duration, args.concurrency)
+            print(f"[Bench] {name:<14} {results[name]}")
+        return results
+
+
+# -----------------------------
+# BASELINE
+# -----------------------------
+
+def compare(results, path):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != results["config"]:
+        print(f"[Bench] Note: config differs from baseline {baseline.get('config')}")
+
+    for name, now in results["endpoints"].items():
+        then = baseline.get("endpoints", {}).get(name)
+        if not then:
+            continue
+        changes = []
+        for key in ("throughputRps", "p50Ms", "p99Ms", "avgBytes", "rssMb"):
+            old, new = then.get(key), now.get(key)
+            if old and new is not None:
+                changes.append(f"{key} {old} -> {new} ({100 * (new - old) / old:+.0f}%)")
+        print(f"[Bench] {name:<14} " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the FastAPI backend on seeded local storage")
+    parser.add_argument("--storage", choices=("sqlite", "dynamodb"), default="sqlite")
+    parser.add_argument("--db", default=None, help="SQLite file (default: a temp file)")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--logs", type=int, default=50000)
+    parser.add_argument("--days", type=float, default=7, help="time span of the seeded log")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="per endpoint")
+    parser.add_argument("--duration", type=float, default=15, help="max seconds per endpoint")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help=f"comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--iot-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", default=None, help="baseline JSON to diff against")
+    args = parser.parse_args()
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    for name in endpoints:
+        if name not in ENDPOINTS:
+            parser.error(f"unknown endpoint '{name}'")
+
+    # Backend modules read these at import time
+    os.environ["STORAGE_BACKEND"] = args.storage
+    if args.storage == "sqlite":
+        os.environ["SQLITE_PATH"] = args.db or os.path.join(tempfile.mkdtemp(prefix="rakan-bench-"), "bench.db")
+
+    mock = None
+    if args.storage == "dynamodb" and not os.getenv("AWS_ENDPOINT_URL_DYNAMODB"):
+        try:
+            from moto import mock_aws
+        except ImportError:
+            parser.error("--storage dynamodb needs AWS_ENDPOINT_URL_DYNAMODB (DynamoDB Local) or moto")
+        for key in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+            os.environ.setdefault(key, "bench")
+        mock = mock_aws()
+        mock.start()
+
+    try:
+        if args.storage == "dynamodb":
+            create_dynamodb_tables()
+
+        from backend import command_publisher
+        from backend.command_tracker import tracker
+        from backend.storage import get_storage
+
+        storage = get_storage()
+        started = time.perf_counter()
+        ids = seed(storage, args.devices, args.logs, args.days)
+        seed_s = time.perf_counter() - started
+        print(f"[Bench] Seeded {args.devices} devices / {args.logs} log rows "
+              f"into {args.storage} in {seed_s:.1f}s (rss {rss_mb()} MB)")
+
+        command_publisher._publisher = command_publisher.CommandPublisher(
+            client=NullIoT(args.iot_latency_ms), tracker=tracker,
+        )
+        from backend.api import app
+
+        results = {
+            "config": {
+                "storage": args.storage,
+                "devices": args.devices,
+                "logs": args.logs,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "duration": args.duration,
+                "iotLatencyMs": args.iot_latency_ms,
+            },
+            "python": sys.version.split()[0],
+            "seedSeconds": round(seed_s, 1),
+            "endpoints": asyncio.run(run(app, endpoints, ids, args)),
+        }
+        command_publisher.get_publisher().close(5)
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"[Bench] Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
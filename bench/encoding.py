@@ -0,0 +1,86 @@
+"""
+Wire size and encode/decode cost: JSON vs the compact encoding.
+
+    python -m bench.encoding --messages 50000
+
+Uses the payload shapes the system actually sends: motion and temperature
+telemetry (fixed struct frames), switch acks and commands (MessagePack
+frames).
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from simulator.shared import codec
+
+
+def sample_messages(n, seed=1):
+    rng = random.Random(seed)
+    kinds = {"motion": [], "temperature": [], "switch_ack": [], "command": []}
+    for i in range(n):
+        correlation_id = uuid.UUID(int=rng.getrandbits(128)).hex
+        kinds["motion"].append({
+            "deviceId": f"fleet-motion-{i % 5000:05d}", "type": "motion",
+            "data": {"motion": rng.random() < 0.1}, "timestamp": time.time(),
+            "correlationId": correlation_id,
+        })
+        kinds["temperature"].append({
+            "deviceId": f"fleet-temperature-{i % 5000:05d}", "type": "temperature",
+            "data": {"temperature": 22 + rng.uniform(-0.5, 0.5)}, "timestamp": time.time(),
+            "correlationId": correlation_id,
+        })
+        kinds["switch_ack"].append({
+            "deviceId": f"fleet-switch-{i % 5000:05d}", "sensor": "switch_state",
+            "state": {"power": "ON", "brightness": rng.randint(0, 100)},
+            "timestamp": time.time(), "correlationId": correlation_id,
+        })
+        kinds["command"].append({
+            "deviceId": f"fleet-motion-{i % 5000:05d}", "action": "switch", "value": True,
+            "reason": "Motion detected — switching device ON.",
+            "timestamp": "2025-11-19T12:00:00.000000Z", "correlationId": correlation_id,
+        })
+    return kinds
+
+
+def measure(messages, encoding):
+    started = time.perf_counter()
+    encoded = [codec.encode(m, encoding) for m in messages]
+    encode_s = time.perf_counter() - started
+
+    # What travels on the wire is bytes either way
+    wire = [e.encode("utf-8") if isinstance(e, str) else e for e in encoded]
+
+    started = time.perf_counter()
+    for raw in wire:
+        codec.decode(raw)
+    decode_s = time.perf_counter() - started
+
+    n = len(messages)
+    return {
+        "avg_bytes": round(sum(map(len, wire)) / n, 1),
+        "encode_us": round(encode_s / n * 1e6, 2),
+        "decode_us": round(decode_s / n * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs compact payload encoding")
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"[Bench] msgpack package: {'yes' if codec.msgpack else 'no (built-in packer)'}")
+    for kind, messages in sample_messages(args.messages).items():
+        # Round trip must be lossless before timings mean anything
+        for m in messages[:100]:
+            assert codec.decode(codec.encode(m, codec.COMPACT))[0] == json.loads(json.dumps(m))
+
+        as_json = measure(messages, codec.JSON)
+        compact = measure(messages, codec.COMPACT)
+        saved = 100 * (1 - compact["avg_bytes"] / as_json["avg_bytes"])
+        print(f"[Bench] {kind:<12} json={as_json} compact={compact} bytes_saved={saved:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Ingress validation throughput.
+
+    python -m bench.validation --events 50000
+
+Compares the cached, per-type validators in simulator/shared/schemas.py
+against calling jsonschema.validate() per event (which re-checks the
+schema and builds a new validator every time), on a mix of valid and
+malformed events.
+"""
+import argparse
+import random
+import time
+
+import jsonschema
+
+from simulator.shared.schemas import EVENT_SCHEMAS, BASE_EVENT_SCHEMA, validate_event
+
+
+def make_events(n, invalid_ratio, seed=1):
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        if rng.random() < 0.5:
+            event = {"deviceId": f"motion-{i % 1000:05d}", "type": "motion",
+                     "data": {"motion": rng.random() < 0.1}, "timestamp": time.time()}
+        else:
+            event = {"deviceId": f"temp-{i % 1000:05d}", "type": "temperature",
+                     "data": {"temperature": 22 + rng.uniform(-0.5, 0.5)}, "timestamp": time.time()}
+
+        if rng.random() < invalid_ratio:
+            # Typical breakage: flat legacy payload, wrong type, missing field
+            broken = rng.choice(("flat", "type", "missing"))
+            if broken == "flat":
+                event["value"] = event.pop("data")
+            elif broken == "type":
+                event["data"] = {k: str(v) for k, v in event["data"].items()}
+            else:
+                del event["timestamp"]
+        events.append(event)
+    return events
+
+
+def _uncached(event):
+    schema = EVENT_SCHEMAS.get(event.get("type"), BASE_EVENT_SCHEMA)
+    try:
+        jsonschema.validate(event, schema)
+        return None
+    except jsonschema.ValidationError as e:
+        return e.message
+
+
+def run(fn, events):
+    started = time.perf_counter()
+    rejected = sum(1 for e in events if fn(e))
+    elapsed = time.perf_counter() - started
+    return {
+        "events_per_s": round(len(events) / elapsed),
+        "us_per_event": round(elapsed / len(events) * 1e6, 2),
+        "rejected": rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark event schema validation")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--invalid-ratio", type=float, default=0.05)
+    parser.add_argument("--uncached-events", type=int, default=2000,
+                        help="events for the (slow) per-call jsonschema.validate baseline")
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.invalid_ratio)
+    validate_event(events[0])  # build the cached validators outside the timing
+
+    print(f"[Bench] cached validators:      {run(validate_event, events)}")
+    print(f"[Bench] jsonschema.validate():  {run(_uncached, events[:args.uncached_events])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,59 @@
 import threading
 import time
-import json
+import uuid
+from collections import OrderedDict, deque
 
-from simulator.shared.mqtt_client import DeviceClient
-from simulator.shared.utils import ensure_timestamp, safe_dumps
+from simulator.config import EVENT_ENCODING, REPORT_BY_EXCEPTION, HEARTBEAT_SECONDS
+from simulator.shared.codec import decode, encode
+from simulator.shared.logs import COMMAND, PUBLISH, get_logger
+from simulator.shared.mqtt_client import create_client
+
+LOG = get_logger("device")
 
 
 class BaseDevice:
+    # Seconds between readings; subclasses override
+    interval = 5
+
+    # Reported in acks so the backend can break metrics down by type
+    device_type = None
+
+    # Acknowledge every command carrying a commandId (an "ack" event on
+    # rakan/events), so the backend can tell slow or lost devices apart
+    ack_commands = True
+
+    # Wire encoding for published events ("json" or "compact")
+    encoding = EVENT_ENCODING
+
+    # Report-by-exception: a reading is published only when a value moves by
+    # more than `deadband` (numbers) or changes (anything else); otherwise a
+    # heartbeat goes out every `heartbeat_interval` seconds.
+    report_by_exception = REPORT_BY_EXCEPTION
+    deadband = 0.0
+    heartbeat_interval = HEARTBEAT_SECONDS
+
+    # Published events still waiting for their command (correlationId -> send time)
+    max_inflight_traces = 1024
+
+    # Bounds on intervals pushed by the backend (backend.rate_control)
+    min_interval = 0.5
+    max_interval = 3600
+
     def __init__(self, device_id, client_id, endpoint, cert, key, ca,
-                 topic_events, topic_command=None):
+                 topic_events, topic_command=None, client=None):
 
         self.device_id = device_id
         self.topic_events = topic_events
         self.topic_command = topic_command
 
-        self.client = DeviceClient(client_id, endpoint, cert, key, ca)
+        # A shared/pooled client can be injected (see simulator.fleet);
+        # otherwise every device owns its own MQTT connection.
+        self.client = client or create_client(client_id, endpoint, cert, key, ca)
         self.client.set_message_callback(self._on_message)
 
         self._stop_event = threading.Event()
+        # Set to cut the current wait short (stop, or a new interval)
+        self._wake = threading.Event()
         self._thread = None
 
         self.state = {}
@@ -25,14 +61,28 @@ class BaseDevice:
         self.sent_count = 0
         self.received_commands_count = 0
         self.last_error = None
+        self.suppressed_count = 0
+        self.heartbeat_count = 0
+
+        self._last_reported = None
+        self._last_publish_at = None
+        # Reporting policy before the backend first changed it (restored by a None value)
+        self._policy_defaults = None
+        # While held (monotonic deadline), set_interval commands are ignored
+        self._hold_until = None
+
+        self._trace_lock = threading.Lock()
+        self._inflight = OrderedDict()
+        self.round_trips_ms = deque(maxlen=1000)
+        self.last_round_trip_ms = None
 
     def start(self):
-        print(f"[{self.__class__.__name__}] Starting device {self.device_id}...")
+        LOG.info("%s starting device %s...", self.__class__.__name__, self.device_id)
 
         self.client.connect()
 
         if self.topic_command:
-            print(f"[MQTT] Subscribing to {self.topic_command}")
+            LOG.info("Subscribing to %s", self.topic_command)
             self.client.subscribe(self.topic_command)
 
         self._thread = threading.Thread(target=self._run_loop, daemon=True)
@@ -40,32 +90,245 @@ class BaseDevice:
 
     def stop(self):
         self._stop_event.set()
+        self._wake.set()
         self.client.disconnect()
 
     def _run_loop(self):
         while not self._stop_event.is_set():
             try:
-                self.publish_event()
-                time.sleep(5)
+                self.tick()
             except Exception as e:
                 self.last_error = str(e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def read(self):
+        """Produce the next event payload. None publishes the generic state."""
+        return None
+
+    def tick(self):
+        """Take one reading and publish it (if it is worth reporting)."""
+        if self._hold_until is not None and time.monotonic() >= self._hold_until:
+            # A held policy lapses back to the device's own settings
+            self.apply_reporting_command({"action": "set_reporting_policy", "value": None})
+
+        payload = self.read()
+        if not self.report_by_exception:
+            self.publish_event(payload)
+            return
+
+        if payload is None:
+            payload = self._state_payload()
+        readings = self._readings(payload)
+
+        if not self._changed(readings):
+            due = self._last_publish_at is None or \
+                time.monotonic() - self._last_publish_at >= self.heartbeat_interval
+            if not due:
+                self.suppressed_count += 1
+                return
+            payload["heartbeat"] = True
+            self.heartbeat_count += 1
+
+        self._last_reported = dict(readings)
+        self.publish_event(payload)
+
+    def _state_payload(self):
+        return {
+            "deviceId": self.device_id,
+            "timestamp": time.time(),
+            "state": self.state
+        }
+
+    @staticmethod
+    def _readings(payload):
+        readings = payload.get("data")
+        if not isinstance(readings, dict):
+            readings = payload.get("state")
+        return readings if isinstance(readings, dict) else {}
+
+    def _changed(self, readings):
+        """True if any reading differs from the last reported one beyond the deadband."""
+        last = self._last_reported
+        if last is None or last.keys() != readings.keys():
+            return True
+        for key, value in readings.items():
+            previous = last[key]
+            numeric = (
+                isinstance(value, (int, float)) and not isinstance(value, bool)
+                and isinstance(previous, (int, float)) and not isinstance(previous, bool)
+            )
+            if numeric:
+                if abs(value - previous) > self.deadband:
+                    return True
+            elif value != previous:
+                return True
+        return False
 
     def publish_event(self, payload=None):
         if payload is None:
-            payload = {
-                "deviceId": self.device_id,
-                "timestamp": ensure_timestamp(),
-                "state": self.state
-            }
-
-        print(f"[EVENT] Publishing → {self.topic_events}: {payload}")
-        self.client.publish(self.topic_events, safe_dumps(payload))
+            payload = self._state_payload()
+
+        # Heartbeats and acks get no command back, so there is nothing to correlate
+        if isinstance(payload, dict) and not payload.get("heartbeat") and payload.get("type") != "ack":
+            self._track_event(payload)
+
+        LOG.debug("Publishing → %s: %s", self.topic_events, payload, extra=PUBLISH)
+        self.client.publish(self.topic_events, encode(payload, self.encoding))
         self.sent_count += 1
         self.last_seen = time.time()
+        self._last_publish_at = time.monotonic()
 
-    def _on_message(self, client, userdata, msg):
-        # to be overridden
+    def _track_event(self, payload):
+        """Stamp a correlationId so the resulting command can be matched."""
+        correlation_id = payload.setdefault("correlationId", uuid.uuid4().hex)
+        with self._trace_lock:
+            self._inflight[correlation_id] = time.monotonic()
+            if len(self._inflight) > self.max_inflight_traces:
+                self._inflight.popitem(last=False)
+
+    def _record_command(self, command):
+        """
+        Count a received command and, when it answers one of our events,
+        record the event -> command round trip in ms.
+        """
         self.received_commands_count += 1
+        correlation_id = command.get("correlationId") if isinstance(command, dict) else None
+        with self._trace_lock:
+            sent_at = self._inflight.pop(correlation_id, None)
+        if sent_at is None:
+            return None
+
+        rtt_ms = (time.monotonic() - sent_at) * 1000
+        self.round_trips_ms.append(rtt_ms)
+        self.last_round_trip_ms = rtt_ms
+        return rtt_ms
+
+    def _ack(self, command, **fields):
+        """Publish an ack for a command (after it has been applied)."""
+        if not self.ack_commands or not isinstance(command, dict) or not command.get("commandId"):
+            return
+        ack = {
+            "deviceId": self.device_id,
+            "type": "ack",
+            "commandId": command["commandId"],
+            "timestamp": time.time(),
+        }
+        if self.device_type:
+            ack["deviceType"] = self.device_type
+        ack.update(fields)
+        self.publish_event(ack)
+
+    # -----------------------------
+    # Commands
+    # -----------------------------
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            command, _ = decode(msg.payload)
+            rtt_ms = self._record_command(command)
+            LOG.debug("%s command received: %s (round trip %s ms)",
+                      self.device_id, command, rtt_ms, extra=COMMAND)
+
+            if command.get("action") in ("set_interval", "set_reporting_policy"):
+                try:
+                    fields = {"reporting": self.apply_reporting_command(command)}
+                except (TypeError, ValueError) as e:
+                    self.last_error = str(e)
+                    fields = {"error": str(e)}
+            else:
+                fields = self.apply_command(command)
+            self._ack(command, **(fields or {}))
+
+        except Exception as e:
+            self.last_error = str(e)
+
+    def apply_command(self, command):
+        """
+        Apply a device-specific command; subclasses override. Returns extra
+        fields for the ack (or None).
+        """
+        return None
+
+    def reporting_policy(self):
+        return {
+            "interval": self.interval,
+            "reportByException": self.report_by_exception,
+            "deadband": self.deadband,
+            "heartbeatInterval": self.heartbeat_interval,
+        }
+
+    def apply_reporting_command(self, command):
+        """
+        Change how often / when the device reports, as pushed by the backend:
+
+            {"action": "set_interval", "value": <seconds>}
+            {"action": "set_reporting_policy",
+             "value": {"interval", "reportByException", "deadband",
+                       "heartbeatInterval", "holdSeconds"}}
+
+        Keys may be omitted. A None value (or key) restores the device's own
+        setting. Intervals are clamped to [min_interval, max_interval].
+        A policy with holdSeconds stays in force for that long: set_interval
+        commands (backend.rate_control) are ignored until it lapses back to
+        the device's own settings. Returns the policy now in force; raises
+        ValueError if invalid.
+        """
+        if self._policy_defaults is None:
+            self._policy_defaults = self.reporting_policy()
+
+        value = command.get("value")
+        hold = None
+        if command.get("action") == "set_interval":
+            if self._hold_until is not None and time.monotonic() < self._hold_until:
+                LOG.debug("%s ignoring %s while its policy is held", self.device_id, command)
+                return self.reporting_policy()
+            policy = {"interval": value}
+        elif value is None:
+            policy = dict.fromkeys(self._policy_defaults)
+        elif isinstance(value, dict):
+            policy = dict(value)
+            hold = policy.pop("holdSeconds", None)
+            if hold is not None and (isinstance(hold, bool) or not isinstance(hold, (int, float)) or hold <= 0):
+                raise ValueError("holdSeconds must be a positive number")
+        else:
+            raise ValueError("set_reporting_policy value must be an object or null")
+
+        unknown = set(policy) - set(self._policy_defaults)
+        if unknown:
+            raise ValueError(f"Unknown reporting policy keys: {sorted(unknown)}")
+
+        # Validate everything before changing anything
+        updates = {}
+        for key, setting in policy.items():
+            if setting is None:
+                updates[key] = self._policy_defaults[key]
+            elif key == "reportByException":
+                if not isinstance(setting, bool):
+                    raise ValueError("reportByException must be a boolean")
+                updates[key] = setting
+            else:
+                if isinstance(setting, bool) or not isinstance(setting, (int, float)) or setting < 0:
+                    raise ValueError(f"{key} must be a non-negative number")
+                if key != "deadband":
+                    setting = max(self.min_interval, min(self.max_interval, setting))
+                updates[key] = setting
+
+        if "interval" in updates:
+            self.interval = updates["interval"]
+        if "reportByException" in updates:
+            self.report_by_exception = updates["reportByException"]
+        if "deadband" in updates:
+            self.deadband = updates["deadband"]
+        if "heartbeatInterval" in updates:
+            self.heartbeat_interval = updates["heartbeatInterval"]
+        if command.get("action") == "set_reporting_policy":
+            # A new policy replaces (or ends) any hold
+            self._hold_until = time.monotonic() + hold if hold else None
+
+        # Start the next cycle at the new pace rather than after the old wait
+        self._wake.set()
+        return self.reporting_policy()
 
     def status(self):
         return {
@@ -73,6 +336,10 @@ class BaseDevice:
             "state": self.state,
             "sent_count": self.sent_count,
             "received_commands_count": self.received_commands_count,
+            "suppressed_count": self.suppressed_count,
+            "heartbeat_count": self.heartbeat_count,
             "last_seen": self.last_seen,
+            "last_round_trip_ms": self.last_round_trip_ms,
+            "interval": self.interval,
             "last_error": self.last_error
         }
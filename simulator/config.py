@@ -13,3 +13,14 @@ COMMANDS_TOPIC_FMT = "rakan/commands/{deviceId}"
 
 QOS = 1
 USE_TLS = True
+
+# "aws" (TLS to MQTT_ENDPOINT) or "loopback" (in-process broker, no network)
+MQTT_TRANSPORT = os.getenv("MQTT_TRANSPORT", "aws")
+
+# "json" or "compact" (binary frames, see simulator/shared/codec.py)
+EVENT_ENCODING = os.getenv("EVENT_ENCODING", "json")
+
+# Report-by-exception: publish only on change (beyond a device's deadband),
+# plus a heartbeat every HEARTBEAT_SECONDS to prove liveness
+REPORT_BY_EXCEPTION = os.getenv("REPORT_BY_EXCEPTION", "0") == "1"
+HEARTBEAT_SECONDS = float(os.getenv("HEARTBEAT_SECONDS", "60"))
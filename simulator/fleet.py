@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import random
+import time
+
+from simulator.config import (
+    MQTT_ENDPOINT,
+    CA_PATH,
+    CERT_PATH,
+    KEY_PATH,
+    COMMANDS_TOPIC_FMT,
+    QOS,
+)
+
+from simulator.shared.codec import ENCODINGS
+from simulator.shared.mqtt_client import create_client
+from simulator.shared.utils import percentile
+from simulator.motion_sensor import MotionSensor
+from simulator.temperature_sensor import TemperatureSensor
+from simulator.smart_switch import SmartSwitch
+
+
+DEVICE_TYPES = {
+    "motion": MotionSensor,
+    "temperature": TemperatureSensor,
+    "switch": SmartSwitch,
+}
+
+
+class PooledClient:
+    """
+    DeviceClient stand-in handed to each virtual device. Publishes go out on
+    a shared pool connection; commands are routed back to the device by topic.
+    """
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._callback = None
+
+    def set_message_callback(self, cb):
+        self._callback = cb
+
+    def connect(self, keepalive=60):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload, qos=QOS):
+        return self._connection.publish(topic, payload, qos=qos)
+
+    def subscribe(self, topic, qos=QOS):
+        self._pool.route(topic, self)
+
+    def deliver(self, msg):
+        if self._callback is not None:
+            self._callback(self, None, msg)
+
+
+class ConnectionPool:
+    """
+    A small, fixed set of MQTT connections shared by many virtual devices.
+    Devices are assigned round-robin; a single wildcard subscription on the
+    first connection carries every command, dispatched by topic lookup.
+    """
+
+    def __init__(self, size=4, client_id_prefix="fleet",
+                 endpoint=MQTT_ENDPOINT, cert=CERT_PATH, key=KEY_PATH, ca=CA_PATH,
+                 transport=None):
+        self.connections = [
+            create_client(f"{client_id_prefix}-conn{i}", endpoint, cert, key, ca, transport=transport)
+            for i in range(size)
+        ]
+        self.command_filter = COMMANDS_TOPIC_FMT.format(deviceId="+")
+        self._routes = {}
+        self._next = 0
+        self._loop = None
+
+    def client_for_device(self):
+        connection = self.connections[self._next % len(self.connections)]
+        self._next += 1
+        return PooledClient(self, connection)
+
+    def route(self, topic, client):
+        self._routes[topic] = client
+
+    def connect(self, loop):
+        self._loop = loop
+        self.connections[0].set_message_callback(self._on_message)
+        for connection in self.connections:
+            connection.connect()
+        self.connections[0].subscribe(self.command_filter)
+
+    def disconnect(self):
+        for connection in self.connections:
+            connection.disconnect()
+
+    def _on_message(self, client, userdata, msg):
+        # Runs on the MQTT network thread; hand off to the event loop so
+        # device state is only ever touched from one thread.
+        target = self._routes.get(msg.topic)
+        if target is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(target.deliver, msg)
+
+
+class FleetRunner:
+    """
+    Runs thousands of virtual devices as coroutines on one asyncio loop.
+
+    Each device publishes every `device.interval` seconds (its class
+    default times `rate_scale`), jittered by +/- `jitter` per tick, and
+    starts at a random phase so the fleet does not publish in lock-step.
+    An interval pushed by the backend (set_interval) applies from the
+    device's next tick.
+    """
+
+    def __init__(self, counts, connections=4, jitter=0.2, rate_scale=1.0,
+                 prefix="fleet", seed=None, pool=None, transport=None, encoding=None,
+                 report_by_exception=None, heartbeat=None):
+        self.counts = counts
+        self.jitter = jitter
+        self.rate_scale = rate_scale
+        self.prefix = prefix
+        self.encoding = encoding
+        self.report_by_exception = report_by_exception
+        self.heartbeat = heartbeat
+        self.random = random.Random(seed)
+        self.pool = pool or ConnectionPool(connections, client_id_prefix=prefix, transport=transport)
+        self.devices = []
+        self._tasks = []
+
+    def build(self):
+        for kind, count in self.counts.items():
+            cls = DEVICE_TYPES[kind]
+            for i in range(count):
+                device_id = f"{self.prefix}-{kind}-{i:05d}"
+                client = self.pool.client_for_device()
+                device = cls(device_id=device_id, client_id=device_id, client=client)
+                if self.encoding:
+                    device.encoding = self.encoding
+                if self.report_by_exception is not None:
+                    device.report_by_exception = self.report_by_exception
+                if self.heartbeat:
+                    device.heartbeat_interval = self.heartbeat
+                device.interval *= self.rate_scale
+                if device.topic_command:
+                    client.subscribe(device.topic_command)
+                self.devices.append(device)
+        return self.devices
+
+    async def _drive(self, device):
+        rng = self.random
+        await asyncio.sleep(rng.uniform(0, device.interval))
+
+        while True:
+            try:
+                device.tick()
+            except Exception as e:
+                device.last_error = str(e)
+
+            period = device.interval
+            await asyncio.sleep(period * rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _report(self, every):
+        last_sent, last_t = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(every)
+            stats = self.stats()
+            now = time.monotonic()
+            rate = (stats["sent"] - last_sent) / (now - last_t)
+            last_sent, last_t = stats["sent"], now
+            print(
+                f"[Fleet] devices={stats['devices']} sent={stats['sent']} "
+                f"rate={rate:.0f}/s commands={stats['commands']} errors={stats['errors']}"
+            )
+
+    async def run(self, duration=None, report_every=10):
+        if not self.devices:
+            self.build()
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.pool.connect, loop)
+
+        self._tasks = [asyncio.create_task(self._drive(d)) for d in self.devices]
+        if report_every:
+            self._tasks.append(asyncio.create_task(self._report(report_every)))
+
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.Event().wait()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self.pool.disconnect()
+
+        return self.stats()
+
+    def round_trips(self):
+        """Event -> command round trip (ms) per device type, as reported by the devices."""
+        names = {cls: kind for kind, cls in DEVICE_TYPES.items()}
+        samples = {}
+        for d in self.devices:
+            if d.round_trips_ms:
+                samples.setdefault(names.get(type(d), type(d).__name__), []).extend(d.round_trips_ms)
+
+        out = {}
+        for kind, values in samples.items():
+            values.sort()
+            out[kind] = {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p99": round(percentile(values, 99), 3),
+                "max": round(values[-1], 3),
+            }
+        return out
+
+    def stats(self):
+        return {
+            "devices": len(self.devices),
+            "sent": sum(d.sent_count for d in self.devices),
+            "suppressed": sum(d.suppressed_count for d in self.devices),
+            "heartbeats": sum(d.heartbeat_count for d in self.devices),
+            "commands": sum(d.received_commands_count for d in self.devices),
+            "errors": sum(1 for d in self.devices if d.last_error),
+            "round_trip_ms": self.round_trips(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fleet of virtual devices on one event loop")
+    parser.add_argument("--motion", type=int, default=100)
+    parser.add_argument("--temperature", type=int, default=100)
+    parser.add_argument("--switch", type=int, default=0)
+    parser.add_argument("--connections", type=int, default=4, help="size of the MQTT connection pool")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction applied to every interval")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="multiplier on each device's interval")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default: forever)")
+    parser.add_argument("--prefix", default="fleet")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--encoding", choices=ENCODINGS, default=None,
+                        help="event encoding (default: EVENT_ENCODING)")
+    parser.add_argument("--report-by-exception", action="store_true",
+                        help="publish only on change, plus heartbeats")
+    parser.add_argument("--heartbeat", type=float, default=None,
+                        help="heartbeat seconds (default: HEARTBEAT_SECONDS)")
+    args = parser.parse_args()
+
+    runner = FleetRunner(
+        {"motion": args.motion, "temperature": args.temperature, "switch": args.switch},
+        connections=args.connections,
+        jitter=args.jitter,
+        rate_scale=args.rate_scale,
+        prefix=args.prefix,
+        seed=args.seed,
+        encoding=args.encoding,
+        report_by_exception=args.report_by_exception or None,
+        heartbeat=args.heartbeat,
+    )
+
+    try:
+        print(f"[Fleet] Final stats: {asyncio.run(runner.run(args.duration))}")
+    except KeyboardInterrupt:
+        print("[Fleet] Stopping...")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import json
 import random
 import time
 
@@ -15,7 +14,10 @@ from simulator.base_simulator import BaseDevice
 
 
 class MotionSensor(BaseDevice):
-    def __init__(self, device_id="motion01", client_id="motion01"):
+    interval = 5
+    device_type = "motion"
+
+    def __init__(self, device_id="motion01", client_id="motion01", client=None):
 
         command_topic = COMMANDS_TOPIC_FMT.format(deviceId=device_id)
 
@@ -27,38 +29,26 @@ class MotionSensor(BaseDevice):
             key=KEY_PATH,
             ca=CA_PATH,
             topic_events=EVENTS_TOPIC,
-            topic_command=command_topic
+            topic_command=command_topic,
+            client=client,
         )
 
         self.random = random.Random()
         self.motion_prob = 0.10  # 10% chance per cycle
 
 
-    def _run_loop(self):
-        while not self._stop_event.is_set():
-            motion_detected = self.random.random() < self.motion_prob
-
-            # NEW backend-compliant payload
-            payload = {
-                "deviceId": self.device_id,
-                "type": "motion",
-                "data": {
-                    "motion": motion_detected
-                },
-                "timestamp": time.time()
-            }
-
-            self.publish_event(payload)
-            time.sleep(5)
-
-
-    def _on_message(self, client, userdata, msg):
-        try:
-            command = json.loads(msg.payload.decode())
-            print(f"[COMMAND RECEIVED] {command}")
+    def read(self):
+        motion_detected = self.random.random() < self.motion_prob
 
-        except Exception as e:
-            self.last_error = str(e)
+        # NEW backend-compliant payload
+        return {
+            "deviceId": self.device_id,
+            "type": "motion",
+            "data": {
+                "motion": motion_detected
+            },
+            "timestamp": time.time()
+        }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+"""
+Record an event stream into a capture file and replay it.
+
+    python -m simulator.replay record events.rkcap --duration 300
+    python -m simulator.replay record events.rkcap --fleet --motion 500 --duration 60
+    python -m simulator.replay replay events.rkcap --speed 10 --target processor --offline
+    python -m simulator.replay replay events.rkcap --speed max --target mqtt
+    python -m simulator.replay info events.rkcap
+
+`record` subscribes to rakan/events (or runs a local fleet over the loopback
+transport) and appends every message with its arrival time. `replay`
+feeds the messages, in order and on their original schedule scaled by
+--speed, into EventProcessor.handle_event or back onto MQTT.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from simulator.config import (
+    MQTT_ENDPOINT,
+    CA_PATH,
+    CERT_PATH,
+    KEY_PATH,
+    EVENTS_TOPIC,
+    QOS,
+)
+from simulator.shared.capture import CaptureReader, CaptureWriter
+from simulator.shared.codec import decode, encode
+from simulator.shared.mqtt_client import create_client
+from simulator.shared.utils import percentile
+
+
+# -----------------------------
+# RECORDING
+# -----------------------------
+
+def record_topic(path, topic=EVENTS_TOPIC, duration=None, transport=None):
+    """Append every message on `topic` to the capture at `path`."""
+    writer = CaptureWriter(path)
+    client = create_client("rakan-recorder", MQTT_ENDPOINT, CERT_PATH, KEY_PATH, CA_PATH,
+                           transport=transport)
+    client.set_message_callback(lambda c, u, msg: writer.write(msg.topic, msg.payload))
+    client.connect()
+    client.subscribe(topic, qos=QOS)
+
+    print(f"[Replay] Recording {topic} → {path}")
+    try:
+        if duration:
+            time.sleep(duration)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.disconnect()
+        writer.close()
+
+    print(f"[Replay] Captured {writer.count} messages")
+    return writer.count
+
+
+def record_fleet(path, counts, duration, rate_scale=1.0, seed=None):
+    """Run a local fleet over the loopback transport and capture its events."""
+    from simulator.fleet import FleetRunner
+    from simulator.shared.loopback import LoopbackClient
+
+    writer = CaptureWriter(path)
+    recorder = LoopbackClient("rakan-recorder")
+    recorder.set_message_callback(lambda c, u, msg: writer.write(msg.topic, msg.payload))
+    recorder.connect()
+    recorder.subscribe(EVENTS_TOPIC, qos=QOS)
+
+    runner = FleetRunner(counts, rate_scale=rate_scale, seed=seed, prefix="rec", transport="loopback")
+    asyncio.run(runner.run(duration))
+
+    recorder.disconnect()
+    writer.close()
+    print(f"[Replay] Captured {writer.count} messages from {len(runner.devices)} devices")
+    return writer.count
+
+
+# -----------------------------
+# REPLAY
+# -----------------------------
+
+class Replayer:
+    """
+    Deterministic replay: messages are dispatched one at a time, in capture
+    order, on a single thread. speed=1 keeps the original timing, speed=N
+    compresses it N times, speed=None dispatches as fast as the sink allows.
+    """
+
+    def __init__(self, reader, sink, speed=1.0):
+        self.reader = reader
+        self.sink = sink
+        self.speed = speed
+
+    def run(self, start_seconds=0.0, limit=None):
+        first = self.reader.index_at(start_seconds)
+        stop = None if limit is None else first + limit
+
+        handle_ms = []
+        lag_ms = []
+        base = None
+        started = time.perf_counter()
+
+        for offset, topic, payload in self.reader.iter_from(first, stop):
+            if base is None:
+                base = offset
+
+            if self.speed:
+                due = started + (offset - base) / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    lag_ms.append(-delay * 1000)
+
+            t = time.perf_counter()
+            self.sink(topic, payload)
+            handle_ms.append((time.perf_counter() - t) * 1000)
+
+        elapsed = time.perf_counter() - started
+        handle_ms.sort()
+        lag_ms.sort()
+
+        return {
+            "messages": len(handle_ms),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(len(handle_ms) / elapsed, 1) if elapsed else None,
+            "handle_ms_p50": percentile(handle_ms, 50),
+            "handle_ms_p99": percentile(handle_ms, 99),
+            "handle_ms_max": handle_ms[-1] if handle_ms else None,
+            "late_messages": len(lag_ms),
+            "lag_ms_p99": percentile(lag_ms, 99),
+        }
+
+
+def restamp(payload):
+    """
+    Give a replayed event the replay time as its timestamp, in the same
+    encoding, so transit spans and rollup buckets describe this run rather
+    than the capture. Payloads that do not decode are passed on untouched.
+    """
+    try:
+        event, encoding = decode(payload)
+    except Exception:
+        return payload
+    if not isinstance(event, dict) or "timestamp" not in event:
+        return payload
+    if isinstance(event["timestamp"], str):
+        event["timestamp"] = datetime.utcnow().isoformat() + "Z"
+    else:
+        event["timestamp"] = time.time()
+    return encode(event, encoding)
+
+
+def processor_sink(offline=False, original_timestamps=False):
+    """
+    Sink that runs EventProcessor.handle_event on every rakan/events message.
+    offline=True uses the local LAM logic, SQLite storage and discards
+    commands, so replays are repeatable without AWS. Events are re-stamped
+    with the replay time (see restamp) unless original_timestamps=True.
+    """
+    if offline:
+        os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+        os.environ.setdefault("SQLITE_PATH", "rakan-replay.db")
+
+    from backend.event_processor import EventProcessor, drain
+
+    if offline:
+        from LAM.ai_decision_engine import make_decision
+        processor = EventProcessor(decide=make_decision, publish=lambda decision: None)
+    else:
+        processor = EventProcessor()
+
+    def sink(topic, payload):
+        if topic == EVENTS_TOPIC:
+            processor.handle_event(payload if original_timestamps else restamp(payload))
+
+    # Called once the replay is over: commit what the processor buffered
+    sink.close = lambda: drain(publisher=not offline)
+    return sink
+
+
+def mqtt_sink(transport=None):
+    client = create_client("rakan-replayer", MQTT_ENDPOINT, CERT_PATH, KEY_PATH, CA_PATH,
+                           transport=transport)
+    client.connect()
+
+    def sink(topic, payload):
+        client.publish(topic, payload, qos=QOS)
+
+    sink.close = client.disconnect
+    return sink
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+
+def _parse_speed(value):
+    return None if value in ("max", "0") else float(value.rstrip("x"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay rakan/events streams")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record")
+    rec.add_argument("path")
+    rec.add_argument("--topic", default=EVENTS_TOPIC)
+    rec.add_argument("--duration", type=float, default=None)
+    rec.add_argument("--transport", default=None, help="aws | loopback (default: MQTT_TRANSPORT)")
+    rec.add_argument("--fleet", action="store_true", help="record a local simulated fleet instead")
+    rec.add_argument("--motion", type=int, default=100)
+    rec.add_argument("--temperature", type=int, default=100)
+    rec.add_argument("--switch", type=int, default=0)
+    rec.add_argument("--rate-scale", type=float, default=1.0)
+    rec.add_argument("--seed", type=int, default=None)
+
+    rep = sub.add_parser("replay")
+    rep.add_argument("path")
+    rep.add_argument("--speed", default="1", help="1, 10, 10x ... or 'max'")
+    rep.add_argument("--target", choices=["processor", "mqtt"], default="processor")
+    rep.add_argument("--offline", action="store_true", help="processor target without AWS")
+    rep.add_argument("--transport", default=None, help="mqtt target: aws | loopback")
+    rep.add_argument("--start", type=float, default=0.0, help="seconds into the capture")
+    rep.add_argument("--limit", type=int, default=None)
+    rep.add_argument("--original-timestamps", action="store_true",
+                     help="processor target: keep the captured event timestamps")
+
+    info = sub.add_parser("info")
+    info.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if args.fleet:
+            counts = {"motion": args.motion, "temperature": args.temperature, "switch": args.switch}
+            record_fleet(args.path, counts, args.duration or 60, args.rate_scale, args.seed)
+        else:
+            record_topic(args.path, args.topic, args.duration, args.transport)
+
+    elif args.command == "replay":
+        reader = CaptureReader(args.path)
+        try:
+            if args.target == "processor":
+                sink = processor_sink(offline=args.offline,
+                                      original_timestamps=args.original_timestamps)
+            else:
+                sink = mqtt_sink(args.transport)
+            try:
+                report = Replayer(reader, sink, _parse_speed(args.speed)).run(args.start, args.limit)
+            finally:
+                sink.close()
+        finally:
+            reader.close()
+        print(f"[Replay] {report}")
+
+    else:
+        reader = CaptureReader(args.path)
+        print(
+            f"[Replay] {args.path}: {len(reader)} messages over {reader.duration:.1f}s, "
+            f"topics={sorted(reader.topics.values())}, {os.path.getsize(args.path)} bytes"
+        )
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# simulator/shared/capture.py
+"""
+Append-only capture format for MQTT event streams.
+
+Layout (little-endian):
+    header   8s magic "RKCAP1\\0\\0" | d start epoch (seconds)
+    records  B kind | q offset_us since start | H topic id | I length | bytes
+
+kind 0 defines a topic: the record body is the topic name and `topic id`
+is the id later records refer to. Kind 1 is a message whose body is the
+raw payload. Topic names are therefore stored once per file.
+
+CaptureReader memory-maps the file and builds an index of
+(offset_us, file position) on open, so seeking to any point in time is a
+binary search and a payload read is a single slice of the map.
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+MAGIC = b"RKCAP1\x00\x00"
+_HEADER = struct.Struct("<8sd")
+_RECORD = struct.Struct("<BqHI")
+
+KIND_TOPIC = 0
+KIND_MESSAGE = 1
+
+
+class CaptureWriter:
+    """Appends messages to a capture file; reopening an existing file continues it."""
+
+    def __init__(self, path, flush_every=256):
+        self.path = path
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._pending = 0
+        self.count = 0
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            reader = CaptureReader(path)
+            self.start = reader.start
+            self._topics = {name: tid for tid, name in reader.topics.items()}
+            self.count = len(reader)
+            valid_size = reader.valid_size
+            reader.close()
+            # Drop a partially written last record before appending
+            os.truncate(path, valid_size)
+            self._file = open(path, "ab")
+        else:
+            self.start = time.time()
+            self._file = open(path, "wb")
+            self._file.write(_HEADER.pack(MAGIC, self.start))
+
+    def write(self, topic, payload, t=None):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        with self._lock:
+            # Taken under the lock so offsets stay ordered for bisect
+            offset_us = int(((time.time() if t is None else t) - self.start) * 1_000_000)
+            topic_id = self._topics.get(topic)
+            if topic_id is None:
+                topic_id = len(self._topics)
+                self._topics[topic] = topic_id
+                name = topic.encode("utf-8")
+                self._file.write(_RECORD.pack(KIND_TOPIC, offset_us, topic_id, len(name)) + name)
+
+            self._file.write(_RECORD.pack(KIND_MESSAGE, offset_us, topic_id, len(payload)))
+            self._file.write(payload)
+            self.count += 1
+
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._file.flush()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            self._file.close()
+
+
+class CaptureReader:
+    """Random-access, memory-mapped view of a capture file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.start = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+
+        self.topics = {}
+        self._offsets_us = array("q")
+        self._positions = array("Q")
+        self._build_index()
+
+    def _build_index(self):
+        pos = _HEADER.size
+        size = len(self._map)
+
+        while pos + _RECORD.size <= size:
+            kind, offset_us, topic_id, length = _RECORD.unpack_from(self._map, pos)
+            body = pos + _RECORD.size
+            if body + length > size:
+                break  # truncated tail from an interrupted write
+
+            if kind == KIND_TOPIC:
+                self.topics[topic_id] = bytes(self._map[body:body + length]).decode("utf-8")
+            else:
+                self._offsets_us.append(offset_us)
+                self._positions.append(pos)
+            pos = body + length
+
+        self.valid_size = pos
+
+    def __len__(self):
+        return len(self._positions)
+
+    @property
+    def duration(self):
+        """Seconds between the first and last message."""
+        if not self._offsets_us:
+            return 0.0
+        return (self._offsets_us[-1] - self._offsets_us[0]) / 1_000_000
+
+    def index_at(self, seconds):
+        """Index of the first message at or after `seconds` into the capture."""
+        return bisect.bisect_left(self._offsets_us, int(seconds * 1_000_000))
+
+    def get(self, index):
+        """Return (offset seconds, topic, payload bytes) of one message."""
+        pos = self._positions[index]
+        _, offset_us, topic_id, length = _RECORD.unpack_from(self._map, pos)
+        body = pos + _RECORD.size
+        return offset_us / 1_000_000, self.topics[topic_id], self._map[body:body + length]
+
+    def iter_from(self, index=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        for i in range(index, stop):
+            yield self.get(i)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
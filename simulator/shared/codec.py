@@ -0,0 +1,356 @@
+# simulator/shared/codec.py
+"""
+Wire encodings for rakan/events and rakan/commands/<deviceId>.
+
+"json"     UTF-8 JSON, the default and what the API / dashboard expect.
+"compact"  Binary frames, always starting with 0xC1 (a byte that never
+           begins JSON and that MessagePack leaves unused):
+
+    motion / temperature telemetry (fixed struct layout, no keys):
+        B magic | B kind | B flags | B id length | device id
+        | [16 bytes correlationId if flags & 1] | d timestamp | ? motion / d temperature
+        (flags & 2 marks a heartbeat)
+    anything else:
+        B magic | B kind=MSGPACK | MessagePack body
+
+decode() accepts either encoding, so receivers never need to know which
+one a sender chose. Encoding is negotiated per device: a device picks one
+for its events, and the backend answers each device in the encoding it
+last used (note_encoding / encode_command). Devices decode both, so a
+JSON command to a compact device still works.
+
+MessagePack bodies use the msgpack package when it is installed and a
+small pure-Python implementation of the same format otherwise.
+"""
+import json
+import struct
+import threading
+from collections import OrderedDict
+
+from simulator.shared.utils import safe_dumps
+
+try:
+    import msgpack
+except ImportError:  # optional; the built-in packer below is wire compatible
+    msgpack = None
+
+JSON = "json"
+COMPACT = "compact"
+ENCODINGS = (JSON, COMPACT)
+
+MAGIC = 0xC1
+KIND_MOTION = 1
+KIND_TEMPERATURE = 2
+KIND_MSGPACK = 3
+
+FLAG_CORRELATION = 0x01
+FLAG_HEARTBEAT = 0x02
+
+_HEAD = struct.Struct("<BBBB")
+_MOTION = struct.Struct("<d?")
+_TEMPERATURE = struct.Struct("<dd")
+
+_TELEMETRY_KEYS = {"deviceId", "type", "data", "timestamp", "correlationId", "heartbeat"}
+
+
+# -----------------------------
+# MESSAGEPACK (fallback)
+# -----------------------------
+
+def _pack(obj, out):
+    if obj is None:
+        out.append(b"\xc0")
+    elif obj is True:
+        out.append(b"\xc3")
+    elif obj is False:
+        out.append(b"\xc2")
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(struct.pack("B", obj))
+        elif -0x20 <= obj < 0:
+            out.append(struct.pack("b", obj))
+        elif -0x80000000 <= obj < 0x80000000:
+            out.append(struct.pack(">Bi", 0xD2, obj))
+        elif -0x8000000000000000 <= obj < 0x8000000000000000:
+            out.append(struct.pack(">Bq", 0xD3, obj))
+        else:
+            out.append(struct.pack(">BQ", 0xCF, obj))
+    elif isinstance(obj, float):
+        out.append(struct.pack(">Bd", 0xCB, obj))
+    elif isinstance(obj, str):
+        raw = obj.encode("utf-8")
+        n = len(raw)
+        if n < 32:
+            out.append(struct.pack("B", 0xA0 | n))
+        elif n < 0x100:
+            out.append(struct.pack(">BB", 0xD9, n))
+        elif n < 0x10000:
+            out.append(struct.pack(">BH", 0xDA, n))
+        else:
+            out.append(struct.pack(">BI", 0xDB, n))
+        out.append(raw)
+    elif isinstance(obj, (bytes, bytearray)):
+        n = len(obj)
+        if n < 0x100:
+            out.append(struct.pack(">BB", 0xC4, n))
+        elif n < 0x10000:
+            out.append(struct.pack(">BH", 0xC5, n))
+        else:
+            out.append(struct.pack(">BI", 0xC6, n))
+        out.append(bytes(obj))
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            out.append(struct.pack("B", 0x90 | n))
+        elif n < 0x10000:
+            out.append(struct.pack(">BH", 0xDC, n))
+        else:
+            out.append(struct.pack(">BI", 0xDD, n))
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(struct.pack("B", 0x80 | n))
+        elif n < 0x10000:
+            out.append(struct.pack(">BH", 0xDE, n))
+        else:
+            out.append(struct.pack(">BI", 0xDF, n))
+        for key, value in obj.items():
+            _pack(key if isinstance(key, str) else str(key), out)
+            _pack(value, out)
+    else:
+        # Same fallback as safe_dumps(default=str)
+        _pack(str(obj), out)
+
+
+_FIXED = {
+    0xCC: struct.Struct(">B"), 0xCD: struct.Struct(">H"),
+    0xCE: struct.Struct(">I"), 0xCF: struct.Struct(">Q"),
+    0xD0: struct.Struct(">b"), 0xD1: struct.Struct(">h"),
+    0xD2: struct.Struct(">i"), 0xD3: struct.Struct(">q"),
+    0xCA: struct.Struct(">f"), 0xCB: struct.Struct(">d"),
+}
+_LEN = {1: struct.Struct(">B"), 2: struct.Struct(">H"), 4: struct.Struct(">I")}
+_STR_LEN = {0xD9: 1, 0xDA: 2, 0xDB: 4}
+_BIN_LEN = {0xC4: 1, 0xC5: 2, 0xC6: 4}
+_ARRAY_LEN = {0xDC: 2, 0xDD: 4}
+_MAP_LEN = {0xDE: 2, 0xDF: 4}
+
+
+def _unpack(buf, pos):
+    b = buf[pos]
+    pos += 1
+
+    if b < 0x80:
+        return b, pos
+    if b >= 0xE0:
+        return b - 0x100, pos
+    if 0xA0 <= b <= 0xBF:
+        n = b & 0x1F
+        return bytes(buf[pos:pos + n]).decode("utf-8"), pos + n
+    if 0x90 <= b <= 0x9F:
+        return _unpack_array(buf, pos, b & 0x0F)
+    if 0x80 <= b <= 0x8F:
+        return _unpack_map(buf, pos, b & 0x0F)
+    if b == 0xC0:
+        return None, pos
+    if b == 0xC2:
+        return False, pos
+    if b == 0xC3:
+        return True, pos
+
+    fixed = _FIXED.get(b)
+    if fixed is not None:
+        return fixed.unpack_from(buf, pos)[0], pos + fixed.size
+
+    for table in (_STR_LEN, _BIN_LEN, _ARRAY_LEN, _MAP_LEN):
+        width = table.get(b)
+        if width is None:
+            continue
+        n = _LEN[width].unpack_from(buf, pos)[0]
+        pos += width
+        if table is _STR_LEN:
+            return bytes(buf[pos:pos + n]).decode("utf-8"), pos + n
+        if table is _BIN_LEN:
+            return bytes(buf[pos:pos + n]), pos + n
+        if table is _ARRAY_LEN:
+            return _unpack_array(buf, pos, n)
+        return _unpack_map(buf, pos, n)
+
+    raise ValueError(f"Unsupported MessagePack type byte 0x{b:02x}")
+
+
+def _unpack_array(buf, pos, n):
+    items = []
+    for _ in range(n):
+        item, pos = _unpack(buf, pos)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(buf, pos, n):
+    result = {}
+    for _ in range(n):
+        key, pos = _unpack(buf, pos)
+        result[key], pos = _unpack(buf, pos)
+    return result, pos
+
+
+def packb(obj) -> bytes:
+    if msgpack is not None:
+        return msgpack.packb(obj, default=str)
+    out = []
+    _pack(obj, out)
+    return b"".join(out)
+
+
+def unpackb(buf):
+    if msgpack is not None:
+        return msgpack.unpackb(buf, raw=False)
+    obj, _ = _unpack(buf, 0)
+    return obj
+
+
+# -----------------------------
+# FRAMES
+# -----------------------------
+
+def _telemetry_frame(payload):
+    """Fixed-layout frame for plain motion / temperature readings, else None."""
+    kind = payload.get("type")
+    data = payload.get("data")
+    if kind not in ("motion", "temperature") or not isinstance(data, dict) or len(data) != 1:
+        return None
+    if not _TELEMETRY_KEYS.issuperset(payload):
+        return None
+
+    device_id = payload.get("deviceId")
+    timestamp = payload.get("timestamp")
+    if not isinstance(device_id, str) or isinstance(timestamp, bool) \
+            or not isinstance(timestamp, (int, float)):
+        return None
+    raw_id = device_id.encode("utf-8")
+    if len(raw_id) > 255:
+        return None
+
+    if kind == "motion":
+        value = data.get("motion")
+        if not isinstance(value, bool):
+            return None
+        body = _MOTION.pack(timestamp, value)
+        frame_kind = KIND_MOTION
+    else:
+        value = data.get("temperature")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        body = _TEMPERATURE.pack(timestamp, value)
+        frame_kind = KIND_TEMPERATURE
+
+    flags = 0
+    heartbeat = payload.get("heartbeat")
+    if heartbeat is True:
+        flags |= FLAG_HEARTBEAT
+    elif heartbeat is not None:
+        return None
+
+    correlation = b""
+    correlation_id = payload.get("correlationId")
+    if correlation_id is not None:
+        try:
+            correlation = bytes.fromhex(correlation_id)
+        except (TypeError, ValueError):
+            return None
+        if len(correlation) != 16:
+            return None
+        flags |= FLAG_CORRELATION
+
+    return _HEAD.pack(MAGIC, frame_kind, flags, len(raw_id)) + raw_id + correlation + body
+
+
+def _decode_frame(buf):
+    kind = buf[1]
+    if kind == KIND_MSGPACK:
+        return unpackb(buf[2:])
+
+    _, kind, flags, id_len = _HEAD.unpack_from(buf, 0)
+    pos = _HEAD.size
+    payload = {"deviceId": bytes(buf[pos:pos + id_len]).decode("utf-8")}
+    pos += id_len
+
+    if flags & FLAG_CORRELATION:
+        payload["correlationId"] = bytes(buf[pos:pos + 16]).hex()
+        pos += 16
+
+    if kind == KIND_MOTION:
+        timestamp, value = _MOTION.unpack_from(buf, pos)
+        payload["type"] = "motion"
+        payload["data"] = {"motion": value}
+    elif kind == KIND_TEMPERATURE:
+        timestamp, value = _TEMPERATURE.unpack_from(buf, pos)
+        payload["type"] = "temperature"
+        payload["data"] = {"temperature": value}
+    else:
+        raise ValueError(f"Unknown compact frame kind {kind}")
+
+    payload["timestamp"] = timestamp
+    if flags & FLAG_HEARTBEAT:
+        payload["heartbeat"] = True
+    return payload
+
+
+# -----------------------------
+# PUBLIC API
+# -----------------------------
+
+def encode(payload, encoding=JSON):
+    """Serialise an event or command; returns str for JSON, bytes for compact."""
+    if encoding != COMPACT:
+        return safe_dumps(payload)
+    frame = _telemetry_frame(payload)
+    if frame is not None:
+        return frame
+    return bytes((MAGIC, KIND_MSGPACK)) + packb(payload)
+
+
+def decode(raw):
+    """Return (payload, encoding) for a JSON or compact message."""
+    if isinstance(raw, str):
+        return json.loads(raw), JSON
+    if isinstance(raw, memoryview):
+        raw = bytes(raw)
+    if raw and raw[0] == MAGIC:
+        return _decode_frame(memoryview(raw)), COMPACT
+    return json.loads(raw), JSON
+
+
+# -----------------------------
+# PER-DEVICE NEGOTIATION
+# -----------------------------
+
+# Bounded so a large or churning fleet cannot grow it without limit
+MAX_TRACKED_DEVICES = 100_000
+
+_lock = threading.Lock()
+_device_encodings = OrderedDict()
+
+
+def note_encoding(device_id, encoding):
+    """Remember the encoding a device last sent in (JSON is the default)."""
+    with _lock:
+        if encoding == JSON:
+            _device_encodings.pop(device_id, None)
+            return
+        _device_encodings[device_id] = encoding
+        _device_encodings.move_to_end(device_id)
+        if len(_device_encodings) > MAX_TRACKED_DEVICES:
+            _device_encodings.popitem(last=False)
+
+
+def encoding_for(device_id):
+    return _device_encodings.get(device_id, JSON)
+
+
+def encode_command(command):
+    """Encode a command in the encoding its target device uses."""
+    return encode(command, encoding_for(command.get("deviceId")))
@@ -0,0 +1,253 @@
+# simulator/shared/logs.py
+"""
+Logging for the simulators and the backend.
+
+get_logger("mqtt") returns the "rakan.mqtt" logger. Every "rakan.*" record
+goes through one non-blocking QueueHandler. The logging thread only fills
+in the %-arguments; a listener thread formats the output line (timestamp,
+JSON, tracebacks) and writes it, so the publish and processing paths never
+wait on stdout or disk. If the queue is full, the record is dropped and
+counted.
+
+Log with %-style arguments, not f-strings:
+
+    LOG.debug("Publishing → %s: %s", topic, payload, extra=PUBLISH)
+
+Then a payload is only turned into text when the record passes the level
+check and sampling.
+
+Environment:
+    LOG_LEVEL     DEBUG / INFO (default) / WARNING / ERROR
+    LOG_FORMAT    "text" (default) or "json" (one JSON object per line)
+    LOG_FILE      file to append to (default: stdout)
+    LOG_SAMPLE    per-kind sampling rates, e.g. "publish=0.01,command=0.1".
+                  A record logged with extra={"kind": "publish"} is kept
+                  1 in 100 times. Kinds not listed are always kept.
+    LOG_QUEUE_SIZE  records buffered for the listener (default 10000)
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_FILE = os.getenv("LOG_FILE", "")
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+ROOT = "rakan"
+
+# Shared `extra` dicts for the high-volume record kinds
+PUBLISH = {"kind": "publish"}
+COMMAND = {"kind": "command"}
+TRACE = {"kind": "trace"}
+
+
+class JsonArg:
+    """Log argument rendered with json.dumps, only if the record is emitted."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, default=str)
+
+
+def parse_sampling(spec: str) -> dict:
+    """"publish=0.01,command=0.1" -> {"publish": 0.01, "command": 0.1}"""
+    rates = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        kind, rate = part.split("=", 1)
+        rates[kind.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps 1 in round(1 / rate) records of each sampled kind. Counter based
+    rather than random, so a rate of 0.01 logs exactly every 100th record.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._every = {}
+        self._seen = {}
+        self._kept = {}
+        for kind, rate in (rates or {}).items():
+            self.set_rate(kind, rate)
+
+    def set_rate(self, kind: str, rate: float | None) -> None:
+        """Sample `kind` at `rate` (0 drops it, None / 1 keeps every record)."""
+        with self._lock:
+            if rate is None or rate >= 1:
+                self._every.pop(kind, None)
+            else:
+                self._every[kind] = 0 if rate <= 0 else max(1, round(1 / rate))
+
+    def filter(self, record):
+        kind = getattr(record, "kind", None)
+        if kind is None:
+            return True
+        with self._lock:
+            seen = self._seen.get(kind, 0)
+            self._seen[kind] = seen + 1
+            every = self._every.get(kind, 1)
+            keep = every != 0 and seen % every == 0
+            if keep:
+                self._kept[kind] = self._kept.get(kind, 0) + 1
+            return keep
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {k: {"seen": n, "kept": self._kept.get(k, 0)} for k, n in self._seen.items()}
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # The stdlib version runs the whole formatter here, in the logging
+        # thread. Only the message is rendered now, so a payload mutated
+        # after the call is logged as it was; the line itself is formatted
+        # by the listener.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        kind = getattr(record, "kind", None)
+        if kind is not None:
+            line["kind"] = kind
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+# -----------------------------
+# SETUP
+# -----------------------------
+
+_lock = threading.Lock()
+_configured = False
+_queue = None
+_listener = None
+_handler = None
+sampling = SamplingFilter()
+
+
+def configure(level=None, fmt=None, path=None, sample=None) -> None:
+    """
+    Install the queue handler and listener on the "rakan" logger.
+    Called automatically by get_logger(); call it explicitly (before
+    logging) to override the LOG_* environment variables.
+    """
+    global _configured, _queue, _listener, _handler
+    with _lock:
+        if _configured:
+            _shutdown_locked()
+
+        if path or LOG_FILE:
+            output = logging.FileHandler(path or LOG_FILE, encoding="utf-8")
+        else:
+            output = logging.StreamHandler(sys.stdout)
+        if (fmt or LOG_FORMAT) == "json":
+            output.setFormatter(JsonLinesFormatter())
+        else:
+            output.setFormatter(logging.Formatter(
+                "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+            ))
+
+        for kind, rate in parse_sampling(sample if sample is not None else LOG_SAMPLE).items():
+            sampling.set_rate(kind, rate)
+
+        _queue = queue.Queue(LOG_QUEUE_SIZE)
+        _handler = _DroppingQueueHandler(_queue)
+        _handler.addFilter(sampling)
+        _listener = logging.handlers.QueueListener(_queue, output, respect_handler_level=False)
+        _listener.start()
+
+        root = logging.getLogger(ROOT)
+        root.handlers = [_handler]
+        root.setLevel(level or LOG_LEVEL)
+        # The Lambda runtime puts its own handler on the root logger
+        root.propagate = False
+        _configured = True
+
+
+def _shutdown_locked():
+    global _configured
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _configured = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    if not _configured:
+        configure()
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def set_level(level) -> None:
+    logging.getLogger(ROOT).setLevel(level)
+
+
+def flush(timeout: float = 2.0) -> bool:
+    """
+    Wait until the listener has written every queued record (e.g. before a
+    Lambda invocation returns and the container is frozen).
+    """
+    q = _queue
+    if q is None:
+        return True
+    deadline = time.monotonic() + timeout
+    while q.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def stats() -> dict:
+    return {
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "dropped": _handler.dropped if _handler is not None else 0,
+        "sampled": sampling.stats(),
+    }
+
+
+@atexit.register
+def _stop():
+    with _lock:
+        if _configured:
+            _shutdown_locked()
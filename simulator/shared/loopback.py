@@ -0,0 +1,208 @@
+# simulator/shared/loopback.py
+"""
+In-process MQTT stand-in for offline runs.
+
+LoopbackBroker routes messages between LoopbackClient instances in the same
+process using MQTT topic-filter matching (+ and #). QoS 1 is honoured the
+way a broker would: every matching subscriber gets the message at least
+once. A delivery is retried, flagged dup, if the subscriber's callback
+raises. Messages published while a subscriber is disconnected are kept
+for it until it reconnects (persistent session).
+"""
+import itertools
+import queue
+import threading
+import time
+
+from simulator.shared.logs import get_logger
+
+LOG = get_logger("loopback")
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+# Redelivery attempts for a QoS 1 message whose handler keeps failing
+MAX_REDELIVERIES = 3
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic-filter match with single (+) and multi-level (#) wildcards."""
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[i]:
+            return False
+
+    return len(filter_parts) == len(topic_parts)
+
+
+class LoopbackMessage:
+    """Same attributes paho's MQTTMessage exposes to on_message callbacks."""
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "dup", "timestamp")
+
+    def __init__(self, topic, payload, qos, mid):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = False
+        self.mid = mid
+        self.dup = False
+        self.timestamp = time.monotonic()
+
+
+class PublishResult:
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+    def is_published(self):
+        return self.rc == MQTT_ERR_SUCCESS
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+
+class LoopbackBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = []      # [(topic_filter, qos, client)]
+        self._mids = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, client, topic_filter, qos):
+        with self._lock:
+            self._subscriptions = [
+                s for s in self._subscriptions
+                if not (s[0] == topic_filter and s[2] is client)
+            ]
+            self._subscriptions.append((topic_filter, qos, client))
+
+    def unsubscribe_all(self, client):
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s[2] is not client]
+
+    def publish(self, topic, payload, qos):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        mid = next(self._mids)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            self.published += 1
+
+        # One copy per subscribing client, at the lower of the two QoS levels
+        targets = {}
+        for topic_filter, sub_qos, client in subscriptions:
+            if topic_matches(topic_filter, topic):
+                granted = min(qos, sub_qos)
+                previous = targets.get(id(client))
+                if previous is None or granted > previous[1]:
+                    targets[id(client)] = (client, granted)
+
+        for client, effective_qos in targets.values():
+            client._enqueue(LoopbackMessage(topic, payload, effective_qos, mid))
+
+        return mid
+
+    def _count_delivery(self):
+        with self._lock:
+            self.delivered += 1
+
+    def reset(self):
+        with self._lock:
+            self._subscriptions = []
+            self.published = 0
+            self.delivered = 0
+
+
+# Process-wide broker shared by every LoopbackClient
+broker = LoopbackBroker()
+
+
+class LoopbackClient:
+    """Drop-in replacement for DeviceClient that talks to the in-process broker."""
+
+    def __init__(self, client_id, endpoint=None, cert=None, key=None, ca=None,
+                 use_ws=False, broker_instance=None):
+        self.client_id = client_id
+        self.endpoint = endpoint
+        self.broker = broker_instance or broker
+
+        self.on_message = None
+        self.on_publish = None
+
+        self._inbox = queue.Queue()
+        self._connected = False
+        self._thread = None
+
+    def set_message_callback(self, cb):
+        self.on_message = cb
+
+    def connect(self, keepalive=60):
+        if self._connected:
+            return
+        self._connected = True
+        self._thread = threading.Thread(
+            target=self._delivery_loop, name=f"loopback-{self.client_id}", daemon=True
+        )
+        self._thread.start()
+
+    def disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._inbox.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=1)
+
+    def publish(self, topic, payload, qos=1):
+        if not self._connected:
+            return PublishResult(MQTT_ERR_NO_CONN, 0)
+
+        mid = self.broker.publish(topic, payload, qos)
+        if self.on_publish is not None:
+            self.on_publish(self, None, mid)
+        return PublishResult(MQTT_ERR_SUCCESS, mid)
+
+    def subscribe(self, topic, qos=1):
+        self.broker.subscribe(self, topic, qos)
+        return (MQTT_ERR_SUCCESS, 0)
+
+    # -----------------------------
+    # Delivery
+    # -----------------------------
+
+    def _enqueue(self, msg):
+        # Queued even while disconnected; delivered after the next connect()
+        self._inbox.put(msg)
+
+    def _delivery_loop(self):
+        while self._connected:
+            msg = self._inbox.get()
+            if msg is None:
+                # Wake-up from disconnect(); a stale one after reconnect is ignored
+                if not self._connected:
+                    break
+                continue
+
+            attempts = 0
+            while True:
+                try:
+                    if self.on_message is not None:
+                        self.on_message(self, None, msg)
+                    self.broker._count_delivery()
+                    break
+                except Exception as e:
+                    if msg.qos == 0 or attempts >= MAX_REDELIVERIES:
+                        LOG.warning("%s dropped mid=%s: %s", self.client_id, msg.mid, e)
+                        break
+                    attempts += 1
+                    msg.dup = True
@@ -1,9 +1,10 @@
 # simulator/shared/mqtt_client.py
-import ssl, time, logging
+import ssl, time
 import paho.mqtt.client as mqtt
 
-LOG = logging.getLogger("mqtt_client")
-LOG.setLevel(logging.INFO)
+from simulator.shared.logs import PUBLISH, get_logger
+
+LOG = get_logger("mqtt")
 
 class DeviceClient:
     def __init__(self, client_id, endpoint, cert=None, key=None, ca=None, use_ws=False):
@@ -13,7 +14,7 @@ class DeviceClient:
         self.key = key
         self.ca = ca
 
-        print(f"[MQTT] Initializing client {client_id}")
+        LOG.info("Initializing client %s", client_id)
 
         # Set transport
         self.client = mqtt.Client(
@@ -30,7 +31,7 @@ class DeviceClient:
 
         # TLS Setup
         if not use_ws:
-            print(f"[MQTT] Setting TLS with cert={self.cert}, key={self.key}, ca={self.ca}")
+            LOG.debug("Setting TLS with cert=%s, key=%s, ca=%s", self.cert, self.key, self.ca)
             self.client.tls_set(
                 ca_certs=self.ca,
                 certfile=self.cert,
@@ -39,42 +40,59 @@ class DeviceClient:
             )
 
     def _on_connect(self, client, userdata, flags, rc):
-        print(f"[MQTT] {self.client_id} connected rc={rc}")
+        LOG.info("%s connected rc=%s", self.client_id, rc)
 
     def _on_disconnect(self, client, userdata, rc):
-        print(f"[MQTT] {self.client_id} disconnected rc={rc}")
+        LOG.info("%s disconnected rc=%s", self.client_id, rc)
 
     def _on_publish(self, client, userdata, mid):
-        print(f"[MQTT] {self.client_id} published mid={mid}")
+        LOG.debug("%s published mid=%s", self.client_id, mid, extra=PUBLISH)
 
     def set_message_callback(self, cb):
         self.client.on_message = cb
 
     def connect(self, keepalive=60):
-        print(f"[MQTT] Connecting to {self.endpoint}:8883 ...")
+        LOG.info("Connecting to %s:8883 ...", self.endpoint)
         try:
             self.client.connect(self.endpoint, 8883, keepalive)
             self.client.loop_start()
             time.sleep(0.4)  # allow connection time
         except Exception as e:
-            print(f"[MQTT ERROR] Failed to connect: {e}")
+            LOG.error("Failed to connect: %s", e)
 
     def disconnect(self):
         try:
             self.client.loop_stop()
             self.client.disconnect()
         except Exception as e:
-            print(f"[MQTT ERROR] Disconnect failed: {e}")
+            LOG.error("Disconnect failed: %s", e)
 
     def publish(self, topic, payload, qos=1):
-        print(f"[MQTT] Publishing to {topic} → {payload}")
+        LOG.debug("Publishing to %s → %s", topic, payload, extra=PUBLISH)
         result = self.client.publish(topic, payload, qos=qos)
 
         if result.rc != mqtt.MQTT_ERR_SUCCESS:
-            print(f"[MQTT ERROR] Publish failed rc={result.rc}")
+            LOG.error("Publish failed rc=%s", result.rc)
 
         return result
 
     def subscribe(self, topic, qos=1):
-        print(f"[MQTT] Subscribing to {topic}")
+        LOG.info("Subscribing to %s", topic)
         return self.client.subscribe(topic, qos=qos)
+
+
+def create_client(client_id, endpoint, cert=None, key=None, ca=None, transport=None):
+    """
+    Build the MQTT client selected by MQTT_TRANSPORT (simulator/config.py):
+    "aws" -> DeviceClient over TLS, "loopback" -> in-process LoopbackClient.
+    """
+    from simulator.config import MQTT_TRANSPORT
+
+    transport = transport or MQTT_TRANSPORT
+    if transport == "loopback":
+        from simulator.shared.loopback import LoopbackClient
+        return LoopbackClient(client_id, endpoint, cert, key, ca)
+    if transport == "aws":
+        return DeviceClient(client_id, endpoint, cert, key, ca)
+
+    raise ValueError(f"Unknown MQTT_TRANSPORT '{transport}' (expected 'aws' or 'loopback')")
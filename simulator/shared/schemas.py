@@ -1,32 +1,140 @@
 # shared/schemas.py
+"""
+Payload contract for rakan/events and rakan/commands/<deviceId>.
+
+Sensor readings are nested under "data"; timestamps are epoch seconds
+(float, as sent by the simulators) or ISO-8601 strings. Extra keys such as
+correlationId are allowed. "heartbeat": true marks a report-by-exception
+keep-alive that repeats the current reading rather than reporting a change.
+
+Validators are built once per schema and cached; validate_event()
+dispatches on the event "type".
+"""
+from functools import lru_cache
+
+from jsonschema import Draft7Validator
+
+TIMESTAMP = {"type": ["number", "string"]}
+
+BASE_EVENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "deviceId": {"type": "string", "minLength": 1},
+        "type": {"type": "string"},
+        "timestamp": TIMESTAMP,
+        "correlationId": {"type": "string"},
+        "heartbeat": {"type": "boolean"},
+    },
+    "required": ["deviceId"]
+}
+
 MOTION_SCHEMA = {
     "type": "object",
     "properties": {
-        "deviceId": {"type": "string"},
+        "deviceId": {"type": "string", "minLength": 1},
         "type": {"const": "motion"},
-        "motion": {"type": "boolean"},
-        "timestamp": {"type": "integer"}
+        "data": {
+            "type": "object",
+            "properties": {"motion": {"type": "boolean"}},
+            "required": ["motion"]
+        },
+        "timestamp": TIMESTAMP,
+        "correlationId": {"type": "string"},
+        "heartbeat": {"type": "boolean"},
     },
-    "required": ["deviceId", "type", "motion", "timestamp"]
+    "required": ["deviceId", "type", "data", "timestamp"]
 }
 
 TEMP_SCHEMA = {
     "type": "object",
     "properties": {
-        "deviceId": {"type": "string"},
+        "deviceId": {"type": "string", "minLength": 1},
         "type": {"const": "temperature"},
-        "value": {"type": "number"},
-        "timestamp": {"type": "integer"}
+        "data": {
+            "type": "object",
+            "properties": {"temperature": {"type": "number"}},
+            "required": ["temperature"]
+        },
+        "timestamp": TIMESTAMP,
+        "correlationId": {"type": "string"},
+        "heartbeat": {"type": "boolean"},
     },
-    "required": ["deviceId", "type", "value", "timestamp"]
+    "required": ["deviceId", "type", "data", "timestamp"]
 }
 
 COMMAND_SCHEMA = {
     "type": "object",
     "properties": {
-        "deviceId": {"type": "string"},
-        "command": {"type": "string"},
-        "value": {}
+        "deviceId": {"type": "string", "minLength": 1},
+        "action": {"type": "string"},
+        "value": {},
+        "reason": {"type": "string"},
+        "timestamp": TIMESTAMP,
+        "correlationId": {"type": "string"},
+        "commandId": {"type": "string"},
+        "attempt": {"type": "integer", "minimum": 1},
+        # Set when the command was routed from a bound sensor's decision
+        "sourceDeviceId": {"type": "string"},
+    },
+    "required": ["deviceId", "action", "value"]
+}
+
+# Command acknowledgement published by a device after applying a command
+ACK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "deviceId": {"type": "string", "minLength": 1},
+        "type": {"const": "ack"},
+        "commandId": {"type": "string", "minLength": 1},
+        "deviceType": {"type": "string"},
+        "state": {"type": "object"},
+        "timestamp": TIMESTAMP,
     },
-    "required": ["deviceId", "command"]
+    "required": ["deviceId", "type", "commandId", "timestamp"]
 }
+
+# Event "type" -> schema. Types not listed (switch acks, door, humidity, ...)
+# only have to satisfy BASE_EVENT_SCHEMA.
+EVENT_SCHEMAS = {
+    "motion": MOTION_SCHEMA,
+    "temperature": TEMP_SCHEMA,
+    "ack": ACK_SCHEMA,
+}
+
+
+_SCHEMAS_BY_NAME = {**EVENT_SCHEMAS, "command": COMMAND_SCHEMA}
+
+
+@lru_cache(maxsize=None)
+def _validator(name):
+    schema = _SCHEMAS_BY_NAME.get(name, BASE_EVENT_SCHEMA)
+    Draft7Validator.check_schema(schema)
+    return Draft7Validator(schema)
+
+
+def get_validator(event_type=None):
+    """Cached validator for an event type (unknown types share the base one)."""
+    return _validator(event_type if event_type in EVENT_SCHEMAS else None)
+
+
+def _first_error(validator, payload):
+    error = next(validator.iter_errors(payload))
+    path = ".".join(str(p) for p in error.absolute_path)
+    return f"{path}: {error.message}" if path else error.message
+
+
+def validate_event(event):
+    """Return None if the event is valid, else a short error message."""
+    event_type = event.get("type") if isinstance(event, dict) else None
+    validator = get_validator(event_type if isinstance(event_type, str) else None)
+    if validator.is_valid(event):
+        return None
+    # Only build the detailed error on the (rare) failure path
+    return _first_error(validator, event)
+
+
+def validate_command(command):
+    validator = _validator("command")
+    if validator.is_valid(command):
+        return None
+    return _first_error(validator, command)
@@ -7,3 +7,10 @@ def ensure_timestamp(payload):
 
 def safe_dumps(payload):
     return json.dumps(payload, default=str)
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None if empty)."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
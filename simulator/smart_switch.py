@@ -1,5 +1,4 @@
 import time
-import json
 
 from simulator.config import (
     MQTT_ENDPOINT,
@@ -14,7 +13,9 @@ from simulator.base_simulator import BaseDevice
 
 
 class SmartSwitch(BaseDevice):
-    def __init__(self, device_id="switch01", client_id="switch01"):
+    device_type = "switch"
+
+    def __init__(self, device_id="switch01", client_id="switch01", client=None):
         command_topic = COMMANDS_TOPIC_FMT.format(deviceId=device_id)
 
         super().__init__(
@@ -26,36 +27,27 @@ class SmartSwitch(BaseDevice):
             ca=CA_PATH,
             topic_events=EVENTS_TOPIC,
             topic_command=command_topic,
+            client=client,
         )
 
         self.state = {"power": "OFF", "brightness": 0}
 
-    def _on_message(self, client, userdata, msg):
-        self.received_commands_count += 1
-        try:
-            command = json.loads(msg.payload.decode())
-            action = command.get("action")
-
-            if action == "turn_on":
-                self.state["power"] = "ON"
-            elif action == "turn_off":
-                self.state["power"] = "OFF"
-            elif action == "set_brightness":
-                value = command.get("value", 0)
-                self.state["brightness"] = max(0, min(100, value))
-
-            print(f"[SmartSwitch] Command received: {command}")
-            # publish ack
-            ack = {
-                "deviceId": self.device_id,
-                "sensor": "switch_state",
-                "state": self.state,
-                "timestamp": time.time(),
-            }
-            self.publish_event(ack)
-
-        except Exception as e:
-            self.last_error = str(e)
+    def apply_command(self, command):
+        action = command.get("action")
+
+        if action == "turn_on":
+            self.state["power"] = "ON"
+        elif action == "turn_off":
+            self.state["power"] = "OFF"
+        elif action == "switch":
+            # Decision routed from a bound sensor (value True / False)
+            self.state["power"] = "ON" if command.get("value") else "OFF"
+        elif action == "set_brightness":
+            value = command.get("value", 0)
+            self.state["brightness"] = max(0, min(100, value))
+
+        # ack with the resulting state
+        return {"sensor": "switch_state", "state": dict(self.state)}
 
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import random
 import time
-import json
 
 from simulator.config import (
     MQTT_ENDPOINT,
@@ -15,8 +14,13 @@ from simulator.base_simulator import BaseDevice
 
 
 class TemperatureSensor(BaseDevice):
+    interval = 3
+    device_type = "temperature"
+    # Report-by-exception: ignore drift smaller than this (degrees)
+    deadband = 0.5
+
     def __init__(self, device_id="temp01", client_id="temp01",
-                 baseline=22.0, seed=None):
+                 baseline=22.0, seed=None, client=None):
 
         command_topic = COMMANDS_TOPIC_FMT.format(deviceId=device_id)
 
@@ -29,6 +33,7 @@ class TemperatureSensor(BaseDevice):
             ca=CA_PATH,
             topic_events=EVENTS_TOPIC,
             topic_command=command_topic,
+            client=client,
         )
 
         self.baseline = baseline
@@ -36,43 +41,32 @@ class TemperatureSensor(BaseDevice):
         self.random = random.Random(seed)
 
 
-    def _run_loop(self):
-        while not self._stop_event.is_set():
-            drift = self.random.uniform(-0.5, 0.5)
-            temp = (
-                self.setpoint
-                if self.setpoint is not None
-                else self.baseline + drift
-            )
-
-            payload = {
-                "deviceId": self.device_id,
-                "type": "temperature",
-                "data": {
-                    "temperature": temp
-                },
-                "timestamp": time.time(),
-            }
-
-            self.publish_event(payload)
-            time.sleep(3)
-
+    def read(self):
+        drift = self.random.uniform(-0.5, 0.5)
+        temp = (
+            self.setpoint
+            if self.setpoint is not None
+            else self.baseline + drift
+        )
 
-    def _on_message(self, client, userdata, msg):
-        try:
-            command = json.loads(msg.payload.decode())
-            action = command.get("action")
+        return {
+            "deviceId": self.device_id,
+            "type": "temperature",
+            "data": {
+                "temperature": temp
+            },
+            "timestamp": time.time(),
+        }
 
-            if action == "set_setpoint":
-                self.setpoint = command.get("value")
 
-            elif action == "clear_setpoint":
-                self.setpoint = None
+    def apply_command(self, command):
+        action = command.get("action")
 
-            print(f"[TemperatureSensor] Command received: {command}")
+        if action == "set_setpoint":
+            self.setpoint = command.get("value")
 
-        except Exception as e:
-            self.last_error = str(e)
+        elif action == "clear_setpoint":
+            self.setpoint = None
 
 
 if __name__ == "__main__":
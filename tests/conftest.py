@@ -0,0 +1,34 @@
+"""
+Test configuration. Backend modules read their settings at import time, so
+the environment is fixed here, before any of them is imported: SQLite in a
+temp directory instead of DynamoDB, and dummy AWS settings so boto3 clients
+can be created without credentials (no test talks to AWS).
+
+    python -m pytest tests
+"""
+import os
+import tempfile
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="rakan-tests-")
+
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_TMP, "rakan-test.db")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """A fresh SQLite backend, installed as the process-wide get_storage()."""
+    import backend.storage as storage_module
+    from backend.storage.sqlite_backend import SQLiteStorage
+
+    backend = SQLiteStorage(str(tmp_path / "rakan.db"))
+    monkeypatch.setattr(storage_module, "_storage", backend)
+    yield backend
+    backend.close()
@@ -0,0 +1,156 @@
+import threading
+
+import pytest
+
+from backend import admission as admission_module
+from backend import event_processor
+from backend.admission import AdmissionController, default_settings, validate_settings
+from backend.command_tracker import CommandTracker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(admission_module, "time", clock)
+    return clock
+
+
+def _controller(storage=None, refresh_seconds=0, **changes):
+    settings = validate_settings({
+        **default_settings(),
+        "enabled": True,
+        "deviceRate": 1,
+        "deviceBurst": 10,
+        "globalRate": 0,
+        "globalBurst": 0,
+        "priorities": {"motion": "high", "temperature": "low"},
+        "reserve": {"normal": 0.1, "low": 0.3},
+        **changes,
+    })
+    return AdmissionController(storage=storage, settings=settings, refresh_seconds=refresh_seconds)
+
+
+def test_bucket_allows_burst_then_refills_at_rate(clock):
+    controller = _controller(deviceRate=2, deviceBurst=3)
+
+    assert [controller.admit("m1", "motion") for _ in range(4)] == [True, True, True, False]
+    clock.now += 0.5            # one token back
+    assert controller.admit("m1", "motion")
+    assert not controller.admit("m1", "motion")
+    clock.now += 60             # never above the burst
+    assert [controller.admit("m1", "motion") for _ in range(4)] == [True, True, True, False]
+    # Other devices have their own bucket
+    assert controller.admit("m2", "motion")
+
+
+def test_reserve_floors_keep_the_last_tokens_for_higher_classes(clock):
+    controller = _controller()
+
+    # low must leave 0.3 * 9 = 2.7 tokens: 7 of the 10 are usable
+    assert sum(controller.admit("t1", "temperature") for _ in range(10)) == 7
+    # normal must leave 0.9 of the remaining 3
+    assert sum(controller.admit("t1", "switch") for _ in range(5)) == 2
+    assert controller.admit("t1", "motion")
+    assert not controller.admit("t1", "motion")
+
+    stats = controller.stats()
+    assert stats["admitted"] == {"low": 7, "normal": 2, "high": 1}
+    assert stats["throttled"] == {"low": 3, "normal": 3, "high": 1}
+    assert stats["mostThrottled"] == [{"deviceId": "t1", "throttled": 7}]
+
+
+def test_heartbeats_are_low_and_a_burst_of_one_still_admits_them(clock):
+    controller = _controller(deviceBurst=1)
+
+    assert controller.priority("motion", heartbeat=True) == "low"
+    assert controller.admit("m1", "motion", heartbeat=True)
+    assert not controller.admit("m1", "motion", heartbeat=True)
+
+
+def test_global_bucket_is_shared_by_all_devices(clock):
+    controller = _controller(globalRate=3, globalBurst=3)
+
+    admitted = [controller.admit(f"m{i}", "motion") for i in range(5)]
+
+    assert admitted == [True, True, True, False, False]
+    assert controller.stats()["globalTokens"] == 0
+
+
+def test_disabled_controller_admits_everything(clock):
+    controller = _controller(enabled=False, deviceBurst=1)
+    assert all(controller.admit("m1", "motion") for _ in range(100))
+
+
+def test_update_is_stored_and_picked_up_by_other_processes(storage):
+    api_side = _controller(storage)
+    processor_side = _controller(storage, deviceBurst=10)
+
+    api_side.update({"deviceBurst": 2})
+    processor_side.refresh()
+
+    assert processor_side.device_burst == 2
+    assert storage.get_setting("admission")["deviceBurst"] == 2
+    with pytest.raises(ValueError):
+        api_side.update({"deviceBurst": 0})
+    with pytest.raises(ValueError):
+        api_side.update({"unknown": 1})
+
+
+def test_settings_are_loaded_off_the_event_path(storage, monkeypatch):
+    loaded = threading.Event()
+    threads = []
+
+    def get_setting(name):
+        threads.append(threading.current_thread().name)
+        loaded.set()
+        return {"deviceBurst": 5}
+
+    monkeypatch.setattr(storage, "get_setting", get_setting)
+    controller = _controller(storage, refresh_seconds=60)
+    try:
+        assert controller.admit("m1", "motion")
+        assert loaded.wait(5)
+        assert threads == ["admission-refresh"]
+        for _ in range(50):
+            controller.admit("m1", "motion")
+        assert threads == ["admission-refresh"]
+    finally:
+        controller.stop()
+
+
+def test_admission_is_off_by_default():
+    assert admission_module.ADMISSION_CONTROL is False
+    assert default_settings()["enabled"] is False
+
+
+def test_dropped_events_cost_no_storage_writes_in_the_lambda(storage, monkeypatch):
+    controller = _controller(storage, deviceRate=0.001, deviceBurst=1, throttled="drop")
+    monkeypatch.setattr(event_processor, "admission", controller)
+    monkeypatch.setattr(event_processor, "tracker", CommandTracker(storage))
+    monkeypatch.setattr(event_processor, "processor", event_processor.EventProcessor(
+        decide=lambda event: {"deviceId": "m1", "action": "ignore", "value": None},
+        publish=lambda command: None,
+    ))
+    writes = []
+    for name in ("put_device_state", "touch_device_state", "write_log_records", "merge_rollup"):
+        monkeypatch.setattr(storage, name, lambda *args, name=name, **kwargs: writes.append(name))
+
+    def send():
+        event = {"deviceId": "m1", "type": "motion", "data": {"motion": True}, "timestamp": 1000.0}
+        return event_processor.lambda_handler(event, None)["status"]
+
+    assert send() == "processed"
+    first = len(writes)
+    assert first > 0
+
+    assert [send() for _ in range(5)] == ["throttled"] * 5
+    assert len(writes) == first
+    assert event_processor.processor.throttled == 5
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from bench.api_load import ENDPOINTS, compare, device_ids, drive, request_for, seed
+
+
+def test_seed_writes_devices_and_logs(storage):
+    ids = seed(storage, n_devices=6, n_logs=25, days=1, batch=10)
+
+    assert ids == device_ids(6)
+    states = storage.list_device_states()
+    assert sorted(s["deviceId"] for s in states) == sorted(ids)
+    assert {s["type"] for s in states} == {"motion", "temperature", "switch"}
+    assert len(storage.list_events()) == 25
+
+
+def test_every_endpoint_maps_to_a_request():
+    rng = random.Random(1)
+    ids = device_ids(3)
+
+    for name in ENDPOINTS:
+        method, path, body = request_for(name, ids, rng)
+        assert method in ("GET", "POST")
+        assert path.startswith("/")
+    assert request_for("command", ids, rng)[2]["action"] == "switch"
+    with pytest.raises(ValueError):
+        request_for("nope", ids, rng)
+
+
+def test_drive_reports_latency_and_errors():
+    app = FastAPI()
+
+    @app.get("/devices")
+    def devices():
+        return [{"deviceId": "x"}]
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            ok = await drive(client, "devices", [], requests=20, duration=10, concurrency=4)
+            missing = await drive(client, "logs", [], requests=5, duration=10, concurrency=2)
+        return ok, missing
+
+    ok, missing = asyncio.run(run())
+
+    assert ok["requests"] == 20
+    assert ok["errors"] == 0
+    assert ok["p50Ms"] <= ok["p99Ms"] <= ok["maxMs"]
+    assert ok["avgBytes"] == len(b'[{"deviceId":"x"}]')
+    # /logs is not routed here: the cold request counts as an error too
+    assert missing["errors"] == 6
+
+
+def test_compare_prints_relative_change(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({
+        "config": {"devices": 10},
+        "endpoints": {"devices": {"throughputRps": 100.0, "p99Ms": 20.0, "rssMb": 0}},
+    }))
+    results = {
+        "config": {"devices": 20},
+        "endpoints": {
+            "devices": {"throughputRps": 150.0, "p99Ms": 10.0, "rssMb": 50.0},
+            "logs": {"throughputRps": 5.0},
+        },
+    }
+
+    compare(results, str(baseline))
+
+    out = capsys.readouterr().out
+    assert "config differs from baseline" in out
+    assert "throughputRps 100.0 -> 150.0 (+50%)" in out
+    assert "p99Ms 20.0 -> 10.0 (-50%)" in out
+    # Endpoints or metrics missing from the baseline are skipped
+    assert "rssMb" not in out
+    assert "logs" not in out
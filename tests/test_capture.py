@@ -0,0 +1,115 @@
+import os
+import time
+
+from simulator.replay import Replayer, mqtt_sink, restamp
+from simulator.shared.capture import CaptureReader, CaptureWriter
+from simulator.shared.codec import COMPACT, JSON, decode, encode
+from simulator.shared.loopback import broker
+
+EVENTS = "rakan/events"
+COMMANDS = "rakan/commands/s1"
+
+
+def _write(path, messages, start=None):
+    writer = CaptureWriter(path)
+    start = writer.start if start is None else start
+    for offset, topic, payload in messages:
+        writer.write(topic, payload, t=start + offset)
+    writer.close()
+    return writer
+
+
+def test_messages_read_back_in_order_with_topics(tmp_path):
+    path = str(tmp_path / "events.cap")
+    _write(path, [(0.0, EVENTS, b'{"n": 1}'), (0.5, COMMANDS, '{"n": 2}'), (1.5, EVENTS, b"")])
+
+    reader = CaptureReader(path)
+    try:
+        assert len(reader) == 3
+        assert reader.duration == 1.5
+        assert [(o, t, bytes(p)) for o, t, p in reader.iter_from()] == [
+            (0.0, EVENTS, b'{"n": 1}'), (0.5, COMMANDS, b'{"n": 2}'), (1.5, EVENTS, b""),
+        ]
+        assert reader.topics == {0: EVENTS, 1: COMMANDS}
+    finally:
+        reader.close()
+
+
+def test_seek_by_time(tmp_path):
+    path = str(tmp_path / "events.cap")
+    _write(path, [(i * 0.1, EVENTS, str(i)) for i in range(50)])
+
+    reader = CaptureReader(path)
+    try:
+        assert reader.index_at(0) == 0
+        assert reader.index_at(2.05) == 21
+        assert bytes(reader.get(reader.index_at(2.05))[2]) == b"21"
+        assert reader.index_at(60) == 50
+    finally:
+        reader.close()
+
+
+def test_truncated_tail_is_ignored_and_dropped_on_append(tmp_path):
+    path = str(tmp_path / "events.cap")
+    writer = _write(path, [(0.0, EVENTS, b"first"), (0.1, EVENTS, b"second")])
+    complete = os.path.getsize(path)
+    # An interrupted write: a record header and half its body
+    partial = CaptureWriter(path)
+    partial.write(EVENTS, b"interrupted-record", t=writer.start + 0.2)
+    partial.close()
+    os.truncate(path, os.path.getsize(path) - 5)
+
+    reader = CaptureReader(path)
+    assert len(reader) == 2
+    assert reader.valid_size == complete
+    reader.close()
+
+    # Reopening continues after the last complete record, reusing topic ids
+    _write(path, [(0.3, EVENTS, b"third"), (0.4, COMMANDS, b"fourth")], start=writer.start)
+    reader = CaptureReader(path)
+    try:
+        assert [bytes(p) for _, _, p in reader.iter_from()] == [b"first", b"second", b"third", b"fourth"]
+        assert reader.topics == {0: EVENTS, 1: COMMANDS}
+    finally:
+        reader.close()
+
+
+def test_replayer_dispatches_from_an_offset_in_capture_order(tmp_path):
+    path = str(tmp_path / "events.cap")
+    _write(path, [(i * 0.01, EVENTS, str(i)) for i in range(10)])
+    received = []
+
+    reader = CaptureReader(path)
+    try:
+        stats = Replayer(reader, lambda topic, payload: received.append(bytes(payload)), speed=None) \
+            .run(start_seconds=0.045, limit=3)
+    finally:
+        reader.close()
+
+    assert received == [b"5", b"6", b"7"]
+    assert stats["messages"] == 3
+
+
+def test_replayed_events_get_the_replay_time_in_their_own_encoding():
+    event = {"deviceId": "t1", "type": "temperature", "data": {"temperature": 21.5},
+             "timestamp": 1000.0}
+    before = time.time()
+
+    for encoding in (JSON, COMPACT):
+        replayed, replayed_encoding = decode(restamp(encode(event, encoding)))
+        assert replayed_encoding == encoding
+        assert replayed["timestamp"] >= before
+        assert replayed["data"] == {"temperature": 21.5}
+
+    iso = decode(restamp(encode(dict(event, timestamp="2020-01-01T00:00:00Z"))))[0]
+    assert iso["timestamp"] > "2020-01-02"
+    assert restamp(b"not json") == b"not json"
+
+
+def test_mqtt_sink_disconnects_on_close():
+    sink = mqtt_sink(transport="loopback")
+    published = broker.published
+    sink(EVENTS, b"{}")
+    sink.close()
+    sink(EVENTS, b"{}")
+    assert broker.published == published + 1
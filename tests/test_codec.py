@@ -0,0 +1,68 @@
+import pytest
+
+from simulator.shared import codec
+from simulator.shared.codec import COMPACT, JSON, MAGIC, decode, encode
+
+
+MOTION = {"deviceId": "motion01", "type": "motion", "data": {"motion": True},
+          "timestamp": 1767225600.25, "correlationId": "0123456789abcdef0123456789abcdef"}
+TEMPERATURE = {"deviceId": "temp01", "type": "temperature", "data": {"temperature": 21.5},
+               "timestamp": 1767225600.5, "heartbeat": True}
+COMMAND = {"deviceId": "switch01", "action": "turn_on", "value": True, "reason": "motion",
+           "commandId": "c" * 32, "attempt": 2, "nested": {"list": [1, -5, 2.5, None, "x" * 40]}}
+
+
+@pytest.mark.parametrize("payload", [MOTION, TEMPERATURE, COMMAND])
+@pytest.mark.parametrize("encoding", [JSON, COMPACT])
+def test_round_trip(payload, encoding):
+    raw = encode(payload, encoding)
+    assert decode(raw) == (payload, encoding)
+
+
+def test_telemetry_uses_fixed_frames_much_smaller_than_json():
+    raw = encode(MOTION, COMPACT)
+    assert raw[0] == MAGIC and raw[1] == codec.KIND_MOTION
+    assert len(raw) < len(encode(MOTION, JSON)) / 3
+
+
+@pytest.mark.parametrize("payload", [
+    dict(MOTION, extra=1),                                  # unknown key
+    dict(MOTION, correlationId="not-hex"),
+    dict(TEMPERATURE, data={"temperature": 21.5, "humidity": 40}),
+    dict(TEMPERATURE, timestamp="2026-01-01T00:00:00Z"),    # ISO timestamp
+])
+def test_events_outside_the_fixed_layout_fall_back_to_msgpack(payload):
+    raw = encode(payload, COMPACT)
+    assert raw[1] == codec.KIND_MSGPACK
+    assert decode(raw) == (payload, COMPACT)
+
+
+def test_decode_accepts_str_bytes_and_memoryview():
+    assert decode('{"a": 1}') == ({"a": 1}, JSON)
+    assert decode(b'{"a": 1}') == ({"a": 1}, JSON)
+    assert decode(memoryview(encode(COMMAND, COMPACT))) == (COMMAND, COMPACT)
+
+
+@pytest.mark.parametrize("value", [
+    0, 127, -1, -32, -33, 2**31 - 1, -2**31, 2**40, -2**40, 2**64 - 1,
+    "", "é" * 20, "x" * 300, "y" * 70000, b"\x00\x01", list(range(20)),
+    {str(i): i for i in range(20)}, 1.5, None, True, False,
+])
+def test_builtin_msgpack_round_trips(value):
+    builtin = []
+    codec._pack(value, builtin)
+    raw = b"".join(builtin)
+    assert codec._unpack(raw, 0) == (value, len(raw))
+    if codec.msgpack is not None:
+        # Wire compatible with the real package in both directions
+        assert codec.msgpack.unpackb(raw, raw=False) == value
+        assert codec._unpack(codec.msgpack.packb(value), 0)[0] == value
+
+
+def test_commands_answer_in_the_device_encoding():
+    codec.note_encoding("switch01", COMPACT)
+    try:
+        assert codec.encode_command(COMMAND)[0] == MAGIC
+    finally:
+        codec.note_encoding("switch01", JSON)
+    assert isinstance(codec.encode_command(COMMAND), str)
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from backend.command_publisher import CommandDropped, CommandPublisher
+from simulator.shared.codec import decode
+
+
+class _GatedClient:
+    """iot-data stand-in that holds every publish until release()."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.lock = threading.Lock()
+        self.sent = []
+        self.active = 0
+        self.max_active = 0
+        self.started = threading.Semaphore(0)
+
+    def publish(self, topic, qos, payload):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.started.release()
+        self.gate.wait(5)
+        with self.lock:
+            self.active -= 1
+            self.sent.append((topic, decode(payload)[0]))
+
+    def wait_started(self, n=1):
+        for _ in range(n):
+            assert self.started.acquire(timeout=5)
+
+    def release(self):
+        self.gate.set()
+
+
+def _command(device_id, action, value=None):
+    return {"deviceId": device_id, "action": action, "value": value}
+
+
+@pytest.fixture
+def client():
+    client = _GatedClient()
+    yield client
+    client.release()
+
+
+def test_unsent_command_for_same_action_is_replaced(client):
+    publisher = CommandPublisher(client=client, max_in_flight=4)
+    publisher.publish("s1", _command("s1", "turn_on", 0))
+    client.wait_started()
+
+    # s1 has a publish in flight, so these wait in its queue and coalesce
+    first = publisher.publish("s1", _command("s1", "set_level", 1))
+    second = publisher.publish("s1", _command("s1", "set_level", 2))
+    assert first is second
+
+    client.release()
+    assert publisher.flush(timeout=5)
+    receipt = first.result(timeout=5)
+
+    assert receipt["coalesced"] == 1
+    assert [c["value"] for _, c in client.sent] == [0, 2]
+    assert publisher.stats()["coalesced"] == 1
+    publisher.close()
+
+
+def test_one_publish_per_device_and_global_in_flight_limit(client):
+    publisher = CommandPublisher(client=client, max_in_flight=2)
+    for device_id in ("a", "b", "c"):
+        publisher.publish(device_id, _command(device_id, "turn_on"))
+        publisher.publish(device_id, _command(device_id, "turn_off"))
+    client.wait_started(2)
+
+    stats = publisher.stats()
+    assert stats["inFlight"] == 2
+    assert stats["queued"] == 4
+
+    client.release()
+    assert publisher.flush(timeout=5)
+    assert client.max_active == 2
+    # Per device, commands go out in the order they were queued
+    for device_id in ("a", "b", "c"):
+        actions = [c["action"] for t, c in client.sent if t.endswith("/" + device_id)]
+        assert actions == ["turn_on", "turn_off"]
+    publisher.close()
+
+
+def test_oldest_action_dropped_when_device_queue_is_full(client):
+    publisher = CommandPublisher(client=client, max_in_flight=1, max_queue_per_device=2)
+    publisher.publish("s1", _command("s1", "busy"))
+    client.wait_started()
+
+    oldest = publisher.publish("s1", _command("s1", "a"))
+    publisher.publish("s1", _command("s1", "b"))
+    publisher.publish("s1", _command("s1", "c"))
+
+    with pytest.raises(CommandDropped):
+        oldest.result(timeout=5)
+    client.release()
+    assert publisher.flush(timeout=5)
+    assert [c["action"] for _, c in client.sent] == ["busy", "b", "c"]
+    assert publisher.stats()["dropped"] == 1
+    publisher.close()
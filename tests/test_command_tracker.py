@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from backend.command_publisher import CommandPublisher
+from backend.command_tracker import CommandTracker
+from simulator.shared.codec import decode
+
+
+class _AckingClient:
+    """iot-data stand-in whose device acks before publish() returns."""
+
+    def __init__(self, tracker, fail=False):
+        self.tracker = tracker
+        self.fail = fail
+        self.resolved = []
+
+    def publish(self, topic, qos, payload):
+        if self.fail:
+            raise ConnectionError("broker unavailable")
+        command, _ = decode(payload)
+        self.resolved.append(self.tracker.resolve({"commandId": command["commandId"], "type": "ack"}))
+
+
+def _command(command_id, action="turn_on", attempt=1):
+    return {"deviceId": "s1", "action": action, "commandId": command_id, "attempt": attempt}
+
+
+def test_ack_arriving_before_publish_returns_is_matched(storage):
+    tracker = CommandTracker(storage)
+    client = _AckingClient(tracker)
+    publisher = CommandPublisher(client=client, tracker=tracker)
+    try:
+        publisher.publish("s1", _command("c1")).result(timeout=5)
+    finally:
+        publisher.close()
+
+    assert client.resolved[0]["commandId"] == "c1"
+    assert tracker.stats()["acked"] == 1
+    assert tracker.stats()["unmatchedAcks"] == 0
+    assert tracker.stats()["awaitingAck"] == 0
+    assert storage.list_pending_commands() == []
+
+
+def test_failed_publish_removes_pending_row(storage):
+    tracker = CommandTracker(storage)
+    publisher = CommandPublisher(client=_AckingClient(tracker, fail=True), tracker=tracker)
+    try:
+        with pytest.raises(ConnectionError):
+            publisher.publish("s1", _command("c1")).result(timeout=5)
+    finally:
+        publisher.close()
+
+    assert storage.list_pending_commands() == []
+    assert tracker.stats()["publishFailed"] == 1
+    assert tracker.stats()["awaitingAck"] == 0
+
+
+def test_unacked_command_is_retried_with_backoff_then_times_out(storage):
+    tracker = CommandTracker(storage, timeout=1, max_retries=2, backoff=2)
+    resent = []
+
+    def resend(command):
+        resent.append(command["attempt"])
+        tracker.track("s1", command, resend=resend)
+
+    tracker.track("s1", _command("c1"), resend=resend)
+    start = storage.get_pending_command("c1")["sentAt"]
+
+    tracker.sweep(now=start + 0.5)
+    assert resent == []
+    tracker.sweep(now=start + 1.1)
+    assert resent == [2]
+    # The second wait is doubled, measured from the re-send
+    retry_sent = storage.get_pending_command("c1")["sentAt"]
+    tracker.sweep(now=retry_sent + 1.5)
+    assert resent == [2]
+    tracker.sweep(now=retry_sent + 2.1)
+    assert resent == [2, 3]
+
+    tracker.sweep(now=retry_sent + 100)
+    stats = tracker.stats()
+    assert stats["retried"] == 2
+    assert stats["timedOut"] == 1
+    assert stats["timeoutsByDevice"] == {"s1": 1}
+    assert storage.get_pending_command("c1") is None
+
+
+def test_newer_command_supersedes_and_late_ack_is_unmatched(storage):
+    tracker = CommandTracker(storage)
+    tracker.track("s1", _command("c1"))
+    tracker.track("s1", _command("c2"))
+
+    assert tracker.stats()["superseded"] == 1
+    assert [p["commandId"] for p in storage.list_pending_commands()] == ["c2"]
+    assert tracker.resolve({"commandId": "c1"}) is None
+    assert tracker.resolve({"commandId": "c2"})["commandId"] == "c2"
+    assert tracker.resolve({"commandId": "c2"}) is None
+    assert tracker.stats()["unmatchedAcks"] == 2
+
+
+def test_ack_handled_by_another_process_stops_retries(storage):
+    sender = CommandTracker(storage, timeout=1)
+    receiver = CommandTracker(storage)
+    resent = []
+    sender.track("s1", _command("c1"), resend=resent.append)
+
+    assert receiver.resolve({"commandId": "c1"}) is not None
+    sender.sweep(now=time.time() + 100)
+
+    assert resent == []
+    assert sender.stats()["awaitingAck"] == 0
+
+
+def test_stopped_sweeper_resends_nothing(storage):
+    tracker = CommandTracker(storage, timeout=0.05, max_retries=5)
+    resent = []
+    tracker.start_sweeper(interval=0.01)
+    tracker.stop_sweeper()
+
+    tracker.track("s1", _command("c1"), resend=resent.append)
+    time.sleep(0.2)
+
+    assert resent == []
+    assert tracker.stats()["awaitingAck"] == 1
@@ -0,0 +1,68 @@
+from fastapi.testclient import TestClient
+
+from backend.device_registry import DeviceRegistry
+
+
+def test_list_and_counts_use_type_and_action_indexes(storage):
+    storage.put_device_state("m1", {"action": "turn_on"}, "2026-01-01T00:00:00Z", device_type="motion")
+    storage.put_device_state("t1", {"action": "none"}, "2026-01-01T00:00:00Z", device_type="temperature")
+    registry = DeviceRegistry()
+    registry.warm_load()
+
+    registry.apply("m2", {"action": "turn_on"}, "2026-01-01T00:00:01Z", device_type="motion")
+
+    assert {d["deviceId"] for d in registry.list(device_type="motion")} == {"m1", "m2"}
+    assert [d["deviceId"] for d in registry.list(device_type="motion", action="none")] == []
+    assert registry.counts() == {
+        "total": 3,
+        "byType": {"motion": 2, "temperature": 1},
+        "byAction": {"turn_on": 2, "none": 1},
+    }
+
+
+def test_reconcile_compares_epoch_and_iso_timestamps(storage):
+    registry = DeviceRegistry()
+    registry.warm_load()
+    # Newer in memory (epoch, as sent by a simulator) than the ISO row: kept
+    registry.apply("m1", {"action": "turn_on"}, 1767225600.0, device_type="motion")   # 2026-01-01T00:00:00Z
+    storage.put_device_state("m1", {"action": "turn_off"}, "2025-12-31T23:59:00Z", device_type="motion")
+    registry.reconcile()
+    assert registry.get("m1")["state"] == {"action": "turn_on"}
+
+    # Row written later elsewhere: replaces the epoch value, although
+    # "2026..." < "1767..." would have won as a string comparison
+    storage.put_device_state("m1", {"action": "turn_off"}, "2026-01-01T00:01:00Z", device_type="motion")
+    assert registry.reconcile() == 1
+    assert registry.get("m1")["state"] == {"action": "turn_off"}
+
+
+def test_refresh_keeps_newer_registry_update(storage):
+    registry = DeviceRegistry()
+    registry.warm_load()
+    registry.apply("m1", {"action": "turn_on"}, "2026-01-01T00:01:00Z", device_type="motion")
+
+    registry.refresh({"deviceId": "m1", "state": {"action": "turn_off"}, "updatedAt": "2026-01-01T00:00:00Z"})
+    assert registry.get("m1")["state"] == {"action": "turn_on"}
+
+    registry.refresh({"deviceId": "m1", "state": {"action": "turn_off"}, "updatedAt": "2026-01-01T00:02:00Z"})
+    assert registry.get("m1")["state"] == {"action": "turn_off"}
+    assert registry.counts()["byType"] == {"motion": 1}
+
+
+def test_get_device_reads_storage_not_registry(storage, monkeypatch):
+    from backend import api
+
+    registry = DeviceRegistry()
+    monkeypatch.setattr(api, "storage", storage)
+    monkeypatch.setattr(api, "registry", registry)
+    registry.apply("m1", {"action": "turn_on"}, "2026-01-01T00:00:00Z", device_type="motion")
+    # Written by another process; the registry has not reconciled yet
+    storage.put_device_state("m1", {"action": "turn_off"}, "2026-01-01T00:01:00Z", device_type="motion")
+
+    client = TestClient(api.app)
+    response = client.get("/device/m1")
+
+    assert response.status_code == 200
+    assert response.json()["state"] == {"action": "turn_off"}
+    assert registry.get("m1")["state"] == {"action": "turn_off"}
+    assert client.get("/device/unknown").status_code == 404
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from backend.storage import dynamodb_backend as ddb
+from backend.storage import make_log_record
+
+
+@pytest.fixture
+def dynamo():
+    with mock_aws():
+        client = boto3.client("dynamodb", region_name=ddb.AWS_REGION)
+        client.create_table(
+            TableName=ddb.EVENT_TABLE,
+            KeySchema=[{"AttributeName": "logId", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": a, "AttributeType": "S"}
+                for a in ("logId", "deviceId", "timestamp", "feedKey")
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": index,
+                    "KeySchema": [
+                        {"AttributeName": hash_key, "KeyType": "HASH"},
+                        {"AttributeName": "timestamp", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+                for index, hash_key in ((ddb.EVENT_LOGS_DEVICE_INDEX, "deviceId"),
+                                        (ddb.EVENT_LOGS_FEED_INDEX, "feedKey"))
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield ddb.DynamoDBStorage()
+
+
+def _record(at, device_id="m1"):
+    event = {"deviceId": device_id, "type": "motion", "data": {"motion": True}}
+    return make_log_record(event, timestamp=at.isoformat() + "Z")
+
+
+def test_feed_key_is_time_bucket_and_stable_shard(monkeypatch):
+    monkeypatch.setattr(ddb, "FEED_BUCKET_MINUTES", 15)
+    record = _record(datetime(2024, 5, 1, 10, 44, 59))
+
+    key = ddb._feed_key_for(record)
+
+    bucket, shard = key.split("#")
+    assert bucket == "2024-05-01T10:30"
+    assert 0 <= int(shard) < ddb.FEED_SHARDS
+    assert ddb._feed_key_for(dict(record)) == key
+    assert ddb._feed_bucket(datetime(2024, 5, 1, 23, 59)) == datetime(2024, 5, 1, 23, 45)
+
+
+@pytest.mark.parametrize("minutes", [60, 100, 7, 1440, 2880])
+def test_stepping_back_one_bucket_lands_on_the_previous_bucket(monkeypatch, minutes):
+    monkeypatch.setattr(ddb, "FEED_BUCKET_MINUTES", minutes)
+    step = timedelta(minutes=minutes)
+    bucket = ddb._feed_bucket(datetime(2024, 5, 2, 0, 30))
+
+    for _ in range(50):
+        # A row written in the last minute of the previous bucket
+        last_minute = bucket - timedelta(minutes=1)
+        assert ddb._feed_bucket(last_minute) == bucket - step
+        bucket -= step
+
+
+def test_recent_events_are_merged_across_shards_and_buckets(dynamo):
+    now = datetime.utcnow()
+    # 30 events spread over the last ~3 hours, i.e. several buckets
+    records = [_record(now - timedelta(minutes=6 * i), f"m{i % 4}") for i in range(30)]
+    dynamo.write_log_records(records)
+
+    shards = {ddb._encode_log(r)["feedKey"]["S"] for r in records}
+    assert len({key.split("#")[1] for key in shards}) > 1
+    assert len({key.split("#")[0] for key in shards}) > 1
+
+    newest = [r["logId"] for r in sorted(records, key=lambda r: r["timestamp"], reverse=True)]
+    for limit in (5, 25):
+        events = dynamo.get_recent_events_global(limit)
+        assert [e["logId"] for e in events] == newest[:limit]
+
+
+def test_feed_read_stops_after_max_buckets(dynamo, monkeypatch):
+    monkeypatch.setattr(ddb, "FEED_MAX_BUCKETS", 2)
+    now = datetime.utcnow()
+    recent = _record(now)
+    dynamo.write_log_records([recent, _record(now - timedelta(hours=5))])
+
+    events = dynamo.get_recent_events_global(10)
+
+    assert [e["logId"] for e in events] == [recent["logId"]]
+    assert events[0]["event"]["type"] == "motion"
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import queue
+
+import pytest
+
+from simulator.fleet import ConnectionPool, FleetRunner
+from simulator.shared.loopback import LoopbackClient, broker
+
+
+@pytest.fixture
+def events():
+    received = queue.Queue()
+    listener = LoopbackClient("test-listener")
+    listener.set_message_callback(lambda c, u, msg: received.put(json.loads(msg.payload)))
+    listener.connect()
+    listener.subscribe("rakan/events")
+    yield received
+    listener.disconnect()
+    broker.reset()
+
+
+def _runner(**kwargs):
+    pool = ConnectionPool(2, client_id_prefix="test", transport="loopback")
+    return FleetRunner({"motion": 3, "temperature": 3}, pool=pool, prefix="t", seed=1,
+                       encoding="json", **kwargs)
+
+
+def test_devices_share_the_pool_round_robin():
+    runner = _runner()
+    devices = runner.build()
+
+    assert len(devices) == 6
+    connections = [d.client._connection for d in devices]
+    assert connections.count(runner.pool.connections[0]) == 3
+    assert connections.count(runner.pool.connections[1]) == 3
+    # rate_scale is applied once, at build time
+    assert _runner(rate_scale=0.5).build()[0].interval == devices[0].interval * 0.5
+
+
+def test_fleet_publishes_and_routes_commands_back(events):
+    runner = _runner(rate_scale=0.02, jitter=0)
+    device = runner.build()[0]
+
+    commander = LoopbackClient("test-commander")
+    commander.connect()
+    try:
+        async def send_later():
+            await asyncio.sleep(0.3)
+            commander.publish(f"rakan/commands/{device.device_id}",
+                              json.dumps({"deviceId": device.device_id, "action": "ignore", "value": None}))
+
+        async def main():
+            sender = asyncio.create_task(send_later())
+            stats = await runner.run(duration=0.6, report_every=0)
+            await sender
+            return stats
+
+        stats = asyncio.run(main())
+    finally:
+        commander.disconnect()
+
+    assert stats["devices"] == 6
+    assert stats["sent"] >= 6
+    assert device.received_commands_count == 1
+    sent = []
+    while not events.empty():
+        sent.append(events.get_nowait()["deviceId"])
+    assert {d.device_id for d in runner.devices} <= set(sent)
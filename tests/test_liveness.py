@@ -0,0 +1,113 @@
+import time
+
+from backend import event_processor
+from backend.command_tracker import CommandTracker
+from backend.event_processor import EventProcessor
+from backend.liveness import LivenessTracker
+
+
+def _tracker(**kwargs):
+    tracker = LivenessTracker(**{"timeout": 10, "timeouts_by_type": {}, "tick": 1, **kwargs})
+    tracker.listeners = []
+    return tracker
+
+
+def test_silent_device_goes_offline_after_timeout():
+    tracker = _tracker()
+    now = time.time()
+    tracker.touch("m1", "motion", at=now)
+
+    assert tracker.expire(now + 5) == 0
+    assert tracker.expire(now + 12) == 1
+    assert [d["deviceId"] for d in tracker.offline()] == ["m1"]
+    assert tracker.stats()["wentOffline"] == 1
+
+
+def test_chatty_device_is_filed_once_and_stays_online():
+    tracker = _tracker()
+    now = time.time()
+    for i in range(100):
+        tracker.touch("m1", "motion", at=now - 1 + i * 0.01)
+
+    assert sum(len(slot) for slot in tracker._slots) == 1
+    assert tracker.expire(now + 8) == 0
+    assert tracker.offline() == []
+
+
+def test_device_comes_back_online_and_listeners_see_both_transitions():
+    tracker = _tracker()
+    seen = []
+    tracker.listeners.append(lambda device, online: seen.append((device["deviceId"], online)))
+    now = time.time()
+    tracker.touch("m1", "motion", at=now - 20)   # seeded: already silent too long
+    assert tracker.get("m1")["online"] is False
+
+    tracker.touch("m1", "motion")
+    assert tracker.offline() == []
+    assert seen == [("m1", True)]
+
+    tracker.expire(time.time() + 12)
+    assert seen == [("m1", True), ("m1", False)]
+
+
+def test_per_type_timeout_and_seed_from_state_records():
+    tracker = _tracker(timeouts_by_type={"switch": 60})
+    now = time.time()
+    count = tracker.seed([
+        {"deviceId": "m1", "type": "motion", "updatedAt": now - 1},
+        {"deviceId": "s1", "type": "switch", "updatedAt": "2000-01-01T00:00:00Z",
+         "lastSeenAt": now - 1},
+        {"deviceId": "x1", "type": "motion"},
+    ])
+
+    assert count == 2
+    tracker.expire(now + 30)
+    assert [d["deviceId"] for d in tracker.offline()] == ["m1"]
+
+
+def _ack(device_id):
+    return {"deviceId": device_id, "type": "ack", "deviceType": "switch",
+            "commandId": "c1", "timestamp": time.time()}
+
+
+def test_acks_and_throttled_events_stamp_last_seen(storage, monkeypatch):
+    monkeypatch.setattr(event_processor, "LAST_SEEN_WRITE_SECONDS", 0)
+    storage.put_device_state("s1", {"action": "turn_on"}, "2000-01-01T00:00:00Z", device_type="switch")
+    storage.put_device_state("m1", {"action": "none"}, "2000-01-01T00:00:00Z", device_type="motion")
+    processor = EventProcessor(decide=lambda event: {}, publish=lambda command: None)
+
+    assert processor.handle_event(_ack("s1"))["status"] == "ack"
+
+    monkeypatch.setattr(event_processor.admission, "admit", lambda *args, **kwargs: False)
+    event = {"deviceId": "m1", "type": "motion", "data": {"motion": True}, "timestamp": time.time()}
+    assert processor.handle_event(event)["status"] == "throttled"
+
+    for device_id in ("s1", "m1"):
+        assert storage.get_device_state(device_id)["lastSeenAt"] > "2000"
+
+
+def test_last_seen_writes_are_limited_per_device(storage, monkeypatch):
+    monkeypatch.setattr(event_processor, "LAST_SEEN_WRITE_SECONDS", 60)
+    writes = []
+    monkeypatch.setattr(storage, "touch_device_state", lambda device_id, at: writes.append(device_id))
+    processor = EventProcessor(decide=lambda event: {}, publish=lambda command: None)
+
+    for _ in range(3):
+        processor.handle_event(_ack("s1"))
+    processor.handle_event(_ack("s2"))
+
+    assert writes == ["s1", "s2"]
+
+
+def test_last_seen_limit_holds_across_lambda_invocations(storage, monkeypatch):
+    monkeypatch.setattr(event_processor, "LAST_SEEN_WRITE_SECONDS", 60)
+    monkeypatch.setattr(event_processor, "tracker", CommandTracker(storage))
+    monkeypatch.setattr(event_processor, "processor",
+                        EventProcessor(decide=lambda event: {}, publish=lambda command: None))
+    writes = []
+    monkeypatch.setattr(storage, "touch_device_state", lambda device_id, at: writes.append(device_id))
+
+    for _ in range(3):
+        assert event_processor.lambda_handler(_ack("s1"), None)["status"] == "ack"
+
+    assert writes == ["s1"]
@@ -0,0 +1,110 @@
+import gzip
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from moto import mock_aws
+
+import backend.storage as storage_module
+from backend import log_compaction
+from backend.storage import dynamodb_backend as ddb
+from backend.storage.base import make_log_record
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "archive"
+    monkeypatch.setattr(log_compaction, "ARCHIVE_DIR", str(directory))
+    return directory
+
+
+@pytest.fixture
+def client():
+    from backend.api import app
+    return TestClient(app)
+
+
+def _record(device_id, timestamp, expires_at):
+    record = make_log_record({"deviceId": device_id, "type": "motion"}, timestamp)
+    record["expiresAt"] = expires_at
+    return record
+
+
+def test_compaction_moves_expired_events_into_day_partitions(storage, archive_dir):
+    storage.write_log_records([
+        _record("m1", "2026-01-01T10:00:00Z", 100),
+        _record("m2", "2026-01-02T10:00:00Z", 100),
+        _record("m3", "2026-01-03T10:00:00Z", None),
+    ])
+
+    result = log_compaction.compact_expired_events(now=0)
+
+    assert result["archived"] == 2
+    assert [p["date"] for p in log_compaction.list_partitions()] == ["2026-01-01", "2026-01-02"]
+    assert [e["deviceId"] for e in storage.list_events()] == ["m3"]
+
+
+def test_run_stops_after_max_batches_and_the_next_continues(storage, archive_dir, monkeypatch):
+    monkeypatch.setattr(log_compaction, "COMPACTION_BATCH_SIZE", 2)
+    storage.write_log_records([_record(f"m{i}", "2026-01-01T10:00:00Z", 100) for i in range(5)])
+
+    first = log_compaction.compact_expired_events(now=0, max_batches=2)
+    second = log_compaction.compact_expired_events(now=0, max_batches=2)
+
+    assert (first["archived"], first["complete"]) == (4, False)
+    assert (second["archived"], second["complete"]) == (1, True)
+    assert storage.list_events() == []
+
+
+def test_dynamodb_compaction_queries_the_expiry_index(archive_dir, monkeypatch):
+    from bench.api_load import create_dynamodb_tables
+
+    now = time.time()
+    with mock_aws():
+        create_dynamodb_tables()
+        dynamo = ddb.DynamoDBStorage()
+        monkeypatch.setattr(storage_module, "_storage", dynamo)
+        expired = [_record(f"m{i}", "2026-01-01T10:00:00Z", int(now) - 3600) for i in range(20)]
+        dynamo.write_log_records(expired + [_record("keep", "2026-01-01T10:00:00Z", int(now) + 30 * 86400)])
+        # A row from before expiryKey existed
+        legacy = ddb._encode_log(_record("legacy", "2026-01-01T10:00:00Z", int(now) - 3600))
+        del legacy["expiryKey"]
+        dynamo.client.put_item(TableName=ddb.EVENT_TABLE, Item=legacy)
+
+        scans = []
+        scan = dynamo.client.scan
+        monkeypatch.setattr(dynamo.client, "scan", lambda **kwargs: scans.append(kwargs) or scan(**kwargs))
+
+        assert log_compaction.compact_expired_events(now=now)["archived"] == 20
+        assert scans == []
+        assert log_compaction.compact_expired_events(now=now, full_scan=True)["archived"] == 1
+        assert scans
+
+        remaining = dynamo.list_events()
+        assert [e["deviceId"] for e in remaining] == ["keep"]
+
+
+def test_export_streams_selected_days(storage, archive_dir, client):
+    storage.write_log_records([
+        _record("m1", "2026-01-01T10:00:00Z", 100),
+        _record("m2", "2026-01-02T10:00:00Z", 100),
+    ])
+    log_compaction.compact_expired_events(now=0)
+
+    response = client.get("/logs/export", params={"from": "2026-01-02"})
+
+    assert response.status_code == 200
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert [json.loads(line)["deviceId"] for line in lines] == ["m2"]
+
+
+@pytest.mark.parametrize("params", [
+    {"from": "2026-02-30"},
+    {"from": "2026-13-01"},
+    {"from": "yyyy-mm-dd"},
+    {"from": "2026-01-01", "to": "2026-01-1x"},
+    {"from": "2026-01-02", "to": "2026-01-01"},
+])
+def test_export_rejects_bad_ranges(archive_dir, client, params):
+    assert client.get("/logs/export", params=params).status_code == 400
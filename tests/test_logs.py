@@ -0,0 +1,95 @@
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+from simulator.shared.logs import (
+    JsonArg,
+    JsonLinesFormatter,
+    SamplingFilter,
+    _DroppingQueueHandler,
+    parse_sampling,
+)
+
+
+class _Collect(logging.Handler):
+    def __init__(self, formatter):
+        super().__init__()
+        self.setFormatter(formatter)
+        self.lines = []
+        self.threads = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.append(threading.current_thread())
+
+
+def _logger(name, handler):
+    logger = logging.getLogger(f"tests.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+def test_parse_sampling_clamps_rates():
+    assert parse_sampling("publish=0.01, command=2,bad") == {"publish": 0.01, "command": 1.0}
+
+
+def test_sampling_keeps_every_nth_record_of_a_kind():
+    sampling = SamplingFilter({"publish": 0.25, "trace": 0})
+    records = [logging.makeLogRecord({"kind": "publish"}) for _ in range(8)]
+
+    kept = [sampling.filter(r) for r in records]
+
+    assert kept == [True, False, False, False, True, False, False, False]
+    assert not sampling.filter(logging.makeLogRecord({"kind": "trace"}))
+    assert sampling.filter(logging.makeLogRecord({}))
+    assert sampling.stats()["publish"] == {"seen": 8, "kept": 2}
+
+
+def test_listener_formats_and_args_are_rendered_at_call_time():
+    q = queue.Queue(100)
+    output = _Collect(JsonLinesFormatter())
+    listener = logging.handlers.QueueListener(q, output)
+    logger = _logger("listener", _DroppingQueueHandler(q))
+    payload = {"state": "on"}
+
+    listener.start()
+    try:
+        logger.info("Publishing %s", JsonArg(payload), extra={"kind": "publish"})
+        payload["state"] = "off"
+    finally:
+        listener.stop()
+
+    line = json.loads(output.lines[0])
+    assert line["msg"] == 'Publishing {"state": "on"}'
+    assert line["kind"] == "publish"
+    assert line["level"] == "INFO"
+    assert output.threads[0] is not threading.current_thread()
+
+
+def test_exception_traceback_is_kept_for_the_listener():
+    q = queue.Queue(100)
+    handler = _DroppingQueueHandler(q)
+    logger = _logger("exc", handler)
+
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Failed")
+
+    line = json.loads(JsonLinesFormatter().format(q.get_nowait()))
+    assert line["msg"] == "Failed"
+    assert "ValueError: boom" in line["exc"]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = _DroppingQueueHandler(queue.Queue(1))
+    logger = _logger("full", handler)
+
+    for i in range(3):
+        logger.info("record %d", i)
+
+    assert handler.dropped == 2
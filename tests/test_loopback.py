@@ -0,0 +1,157 @@
+import json
+import queue
+import time
+
+import pytest
+
+from backend import event_processor
+from backend.command_tracker import CommandTracker
+from backend.event_processor import EventProcessor
+from simulator.local_pipeline import ProcessorBridge
+from simulator.shared.loopback import (
+    MAX_REDELIVERIES,
+    MQTT_ERR_NO_CONN,
+    LoopbackBroker,
+    LoopbackClient,
+    broker,
+    topic_matches,
+)
+
+
+@pytest.mark.parametrize("topic_filter, topic, expected", [
+    ("rakan/events", "rakan/events", True),
+    ("rakan/commands/+", "rakan/commands/s1", True),
+    ("rakan/commands/+", "rakan/commands/s1/extra", False),
+    ("rakan/#", "rakan/commands/s1", True),
+    ("rakan/+/s1", "rakan/commands/s2", False),
+    ("rakan/events/x", "rakan/events", False),
+])
+def test_topic_matches(topic_filter, topic, expected):
+    assert topic_matches(topic_filter, topic) is expected
+
+
+def _client(broker, name, received=None, qos=1, topic="rakan/commands/+"):
+    client = LoopbackClient(name, broker_instance=broker)
+    if received is not None:
+        client.set_message_callback(lambda c, u, msg: received.put(msg))
+    client.connect()
+    client.subscribe(topic, qos)
+    return client
+
+
+def test_each_matching_subscriber_gets_one_copy():
+    broker = LoopbackBroker()
+    first, second = queue.Queue(), queue.Queue()
+    a = _client(broker, "a", first)
+    a.subscribe("rakan/#")                      # overlapping filter: still one copy
+    b = _client(broker, "b", second, topic="rakan/events")
+
+    a.publish("rakan/commands/s1", '{"n": 1}')
+
+    msg = first.get(timeout=2)
+    assert (msg.topic, msg.payload, msg.dup) == ("rakan/commands/s1", b'{"n": 1}', False)
+    with pytest.raises(queue.Empty):
+        first.get(timeout=0.1)
+    assert second.empty()
+    a.disconnect()
+    b.disconnect()
+
+
+def test_failed_qos1_delivery_is_retried_as_dup():
+    broker = LoopbackBroker()
+    seen = queue.Queue()
+
+    def flaky(client, userdata, msg):
+        seen.put(msg.dup)
+        if not msg.dup:
+            raise RuntimeError("handler failed")
+
+    client = _client(broker, "c")
+    client.set_message_callback(flaky)
+    client.publish("rakan/commands/s1", "x")
+
+    assert [seen.get(timeout=2), seen.get(timeout=2)] == [False, True]
+    client.disconnect()
+
+
+def test_qos0_and_persistent_failures_are_dropped():
+    broker = LoopbackBroker()
+    attempts = queue.Queue()
+
+    def failing(client, userdata, msg):
+        attempts.put(msg.qos)
+        raise RuntimeError("always fails")
+
+    qos1 = _client(broker, "q1")
+    qos1.set_message_callback(failing)
+    qos1.publish("rakan/commands/s1", "x", qos=1)
+    assert [attempts.get(timeout=2) for _ in range(MAX_REDELIVERIES + 1)] == [1] * (MAX_REDELIVERIES + 1)
+    qos1.disconnect()
+
+    qos0 = _client(broker, "q0", qos=0)
+    qos0.set_message_callback(failing)
+    qos0.publish("rakan/commands/s1", "x", qos=1)
+    assert attempts.get(timeout=2) == 0
+    with pytest.raises(queue.Empty):
+        attempts.get(timeout=0.1)
+    qos0.disconnect()
+
+
+def test_messages_wait_for_a_disconnected_subscriber():
+    broker = LoopbackBroker()
+    received = queue.Queue()
+    subscriber = _client(broker, "s", received)
+    publisher = _client(broker, "p", topic="unused")
+    subscriber.disconnect()
+
+    publisher.publish("rakan/commands/s1", "while away")
+    assert received.empty()
+    subscriber.connect()
+
+    assert received.get(timeout=2).payload == b"while away"
+    subscriber.disconnect()
+    publisher.disconnect()
+    assert publisher.publish("rakan/commands/s1", "x").rc == MQTT_ERR_NO_CONN
+
+
+def test_local_pipeline_round_trip(storage, monkeypatch):
+    tracker = CommandTracker(storage)
+    monkeypatch.setattr(event_processor, "tracker", tracker)
+    bridge = ProcessorBridge(
+        lambda publish: EventProcessor(
+            decide=lambda event: {"deviceId": event["deviceId"], "action": "turn_on", "value": True},
+            publish=publish,
+        ),
+        client_id="test-processor",
+        tracker=tracker,
+    )
+    commands = queue.Queue()
+    device = LoopbackClient("m1")
+
+    def on_command(client, userdata, msg):
+        command = json.loads(msg.payload)
+        commands.put(command)
+        client.publish("rakan/events", json.dumps({
+            "deviceId": "m1", "type": "ack", "commandId": command["commandId"], "timestamp": time.time(),
+        }))
+
+    device.set_message_callback(on_command)
+    bridge.start()
+    device.connect()
+    device.subscribe("rakan/commands/m1")
+    try:
+        device.publish("rakan/events", json.dumps({
+            "deviceId": "m1", "type": "motion", "data": {"motion": True}, "timestamp": time.time(),
+        }))
+        assert commands.get(timeout=2)["action"] == "turn_on"
+
+        deadline = time.monotonic() + 2
+        while bridge.acks < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert bridge.processed == 1 and bridge.acks == 1
+        assert tracker.stats()["acked"] == 1
+        assert storage.list_pending_commands() == []
+    finally:
+        device.disconnect()
+        bridge.stop()
+        broker.reset()
@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from backend.rate_control import SET_INTERVAL, RateController, reporting_command
+from simulator.base_simulator import BaseDevice
+
+
+def _controller(**kwargs):
+    return RateController(**{"enabled": True, "max_per_minute": 30, "lag_high": 5, "lag_low": 1,
+                             "max_scale": 16, "window": 60, "eval_seconds": 10, **kwargs})
+
+
+def _feed(controller, per_device, seconds, lag, start=0.0, devices=("chatty",)):
+    """Send each device per_device events/s for `seconds`; returns all commands."""
+    commands = []
+    steps = int(seconds * per_device)
+    for i in range(steps):
+        now = start + i / per_device
+        for device_id in devices:
+            commands += controller.observe(device_id, now - lag, now=now)
+    return commands
+
+
+def test_disabled_controller_sends_nothing():
+    controller = _controller(enabled=False)
+    assert _feed(controller, 10, 30, lag=60) == []
+
+
+def test_limit_tightens_under_backlog():
+    controller = _controller()
+    # No backlog: the limit stays at 30/min, so a 60/min device is asked
+    # once for a 2 s interval
+    commands = _feed(controller, 1, 120, lag=0)
+    assert [c["value"] for c in commands] == [2.0]
+    assert controller.scale == 1
+
+    # Backlog: the limit halves every evaluation and the device is pushed further
+    controller = _controller()
+    commands = _feed(controller, 1, 120, lag=30)
+    assert controller.scale > 1
+    assert commands and all(c["action"] == SET_INTERVAL for c in commands)
+    assert commands[-1]["value"] == 60 / controller.limit_per_minute()
+
+
+def test_intervals_are_restored_once_the_backlog_clears():
+    controller = _controller()
+    _feed(controller, 1, 120, lag=30)
+    assert controller.stats()["pushedIntervals"] == 1
+
+    commands = _feed(controller, 0.5, 600, lag=0, start=120)
+
+    assert controller.scale == 1
+    assert commands[-1]["value"] is None
+    assert controller.stats()["restored"] == 1
+    assert controller.stats()["pushedIntervals"] == 0
+
+
+def test_reporting_command_validation():
+    command = reporting_command("m1", {"interval": 1}, hold_seconds=30)
+    assert command["value"] == {"interval": 1, "holdSeconds": 30}
+    assert reporting_command("m1", None)["value"] is None
+    with pytest.raises(ValueError):
+        reporting_command("m1", {"speed": 1})
+    with pytest.raises(ValueError):
+        reporting_command("m1", {"interval": 1}, hold_seconds=0)
+
+
+class _Client:
+    def __init__(self):
+        self.published = []
+
+    def set_message_callback(self, callback):
+        self.callback = callback
+
+    def publish(self, topic, payload, qos=1):
+        self.published.append(json.loads(payload))
+
+
+class _Msg:
+    def __init__(self, command):
+        self.payload = json.dumps(command)
+
+
+@pytest.fixture
+def device():
+    device = BaseDevice("m1", "m1", None, None, None, None, "rakan/events", client=_Client())
+    device.interval = 5
+    device.encoding = "json"
+    return device
+
+
+def _send(device, command):
+    device._on_message(None, None, _Msg(dict(command, commandId="c1")))
+    return device.client.published[-1]
+
+
+def test_device_applies_interval_and_acks_the_policy(device):
+    ack = _send(device, {"action": "set_interval", "value": 0.01})
+
+    assert device.interval == device.min_interval
+    assert ack["type"] == "ack"
+    assert ack["reporting"]["interval"] == device.min_interval
+
+    _send(device, {"action": "set_interval", "value": None})
+    assert device.interval == 5
+
+
+def test_held_policy_ignores_rate_control_until_released(device):
+    _send(device, {"action": "set_reporting_policy",
+                   "value": {"interval": 1, "holdSeconds": 300}})
+    ack = _send(device, {"action": "set_interval", "value": 60})
+    assert device.interval == 1
+    assert ack["reporting"]["interval"] == 1
+
+    _send(device, {"action": "set_reporting_policy", "value": None})
+    _send(device, {"action": "set_interval", "value": 60})
+    assert device.interval == 60
+
+
+def test_invalid_policy_is_rejected_in_the_ack(device):
+    ack = _send(device, {"action": "set_reporting_policy", "value": {"interval": -1}})
+
+    assert "error" in ack
+    assert device.interval == 5
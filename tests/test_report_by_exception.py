@@ -0,0 +1,80 @@
+import json
+import time
+
+from backend.event_processor import EventProcessor
+from simulator.base_simulator import BaseDevice
+
+
+class _Client:
+    def __init__(self):
+        self.published = []
+
+    def set_message_callback(self, callback):
+        self.callback = callback
+
+    def publish(self, topic, payload, qos=1):
+        self.published.append(json.loads(payload))
+
+
+class _Thermometer(BaseDevice):
+    device_type = "temperature"
+    report_by_exception = True
+    deadband = 0.5
+    heartbeat_interval = 60
+    encoding = "json"
+
+    def __init__(self, readings):
+        super().__init__("temp01", "temp01", None, None, None, None, "rakan/events", client=_Client())
+        self.readings = iter(readings)
+
+    def read(self):
+        return {"deviceId": self.device_id, "type": "temperature",
+                "data": {"temperature": next(self.readings)}, "timestamp": time.time()}
+
+
+def test_only_changes_beyond_the_deadband_are_published():
+    device = _Thermometer([20.0, 20.3, 20.4, 20.6, 21.2, 21.2])
+
+    for _ in range(6):
+        device.tick()
+
+    sent = [e["data"]["temperature"] for e in device.client.published]
+    # Compared with the last reported value, not the last reading
+    assert sent == [20.0, 20.6, 21.2]
+    assert device.suppressed_count == 3
+
+
+def test_heartbeat_after_silence():
+    device = _Thermometer([20.0, 20.1, 20.1])
+    device.tick()
+    device.tick()
+    assert len(device.client.published) == 1
+
+    device._last_publish_at -= 61
+    device.tick()
+
+    heartbeat = device.client.published[-1]
+    assert heartbeat["heartbeat"] is True
+    assert "correlationId" not in heartbeat
+    assert device.heartbeat_count == 1
+
+
+def test_every_reading_is_published_when_disabled():
+    device = _Thermometer([20.0, 20.0, 20.0])
+    device.report_by_exception = False
+
+    for _ in range(3):
+        device.tick()
+
+    assert len(device.client.published) == 3
+
+
+def test_processor_skips_lam_for_heartbeats(storage):
+    decided = []
+    processor = EventProcessor(decide=lambda event: decided.append(event) or {}, publish=lambda c: None)
+    event = {"deviceId": "temp01", "type": "temperature", "data": {"temperature": 20.0},
+             "timestamp": time.time(), "heartbeat": True}
+
+    assert processor.handle_event(event)["status"] == "heartbeat"
+    assert decided == []
+    assert [e["deviceId"] for e in storage.list_events()] == ["temp01"]
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from backend.event_processor import EventProcessor
+from simulator.shared.schemas import get_validator, validate_command, validate_event
+
+NOW = time.time()
+
+
+@pytest.mark.parametrize("event", [
+    {"deviceId": "m1", "type": "motion", "data": {"motion": True}, "timestamp": NOW},
+    {"deviceId": "t1", "type": "temperature", "data": {"temperature": 21},
+     "timestamp": "2026-01-01T00:00:00Z", "heartbeat": True, "correlationId": "abc"},
+    {"deviceId": "s1", "type": "ack", "commandId": "c1", "timestamp": NOW, "state": {"on": True}},
+    {"deviceId": "d1", "type": "door"},
+])
+def test_valid_events(event):
+    assert validate_event(event) is None
+
+
+@pytest.mark.parametrize("event, error", [
+    ({"deviceId": "m1", "type": "motion", "data": {"motion": "yes"}, "timestamp": NOW}, "data.motion"),
+    ({"deviceId": "t1", "type": "temperature", "data": {}, "timestamp": NOW}, "'temperature' is a required"),
+    ({"deviceId": "s1", "type": "ack", "timestamp": NOW}, "'commandId' is a required"),
+    ({"deviceId": "", "type": "door"}, "deviceId"),
+    ({"deviceId": "m1", "type": "motion", "data": {"motion": True}, "timestamp": True}, "timestamp"),
+])
+def test_invalid_events_name_the_field(event, error):
+    assert error in validate_event(event)
+
+
+def test_validators_are_built_once_per_type():
+    assert get_validator("motion") is get_validator("motion")
+    assert get_validator("door") is get_validator("humidity") is get_validator(None)
+
+
+def test_commands():
+    assert validate_command({"deviceId": "s1", "action": "turn_on", "value": None, "attempt": 2}) is None
+    assert "attempt" in validate_command({"deviceId": "s1", "action": "turn_on", "value": 1, "attempt": 0})
+
+
+def test_processor_rejects_invalid_events_before_logging(storage):
+    decided = []
+    processor = EventProcessor(decide=decided.append, publish=lambda c: None)
+
+    result = processor.handle_event({"deviceId": "m1", "type": "motion", "data": {}, "timestamp": NOW})
+
+    assert result["error"].startswith("Invalid event")
+    assert processor.rejected == 1
+    assert decided == []
+    assert storage.list_events() == []
@@ -0,0 +1,143 @@
+import sqlite3
+import time
+
+import pytest
+
+from backend.storage.base import make_log_record
+from backend.storage.sqlite_backend import SQLiteStorage
+
+
+def _committed_logs(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM event_logs").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_batch_committed_after_batch_ms_without_further_writes(tmp_path):
+    path = str(tmp_path / "rakan.db")
+    storage = SQLiteStorage(path, batch_size=1000, batch_ms=50)
+    try:
+        storage.write_log_records([make_log_record({"deviceId": "m1", "type": "motion"})])
+        assert _wait_for(lambda: _committed_logs(path) == 1)
+    finally:
+        storage.close()
+
+
+def test_full_batch_commits_immediately(tmp_path):
+    path = str(tmp_path / "rakan.db")
+    storage = SQLiteStorage(path, batch_size=2, batch_ms=60000)
+    try:
+        storage.write_log_records([make_log_record({"deviceId": "m1"}) for _ in range(2)])
+        assert _committed_logs(path) == 2
+    finally:
+        storage.close()
+
+
+def test_close_commits_pending_rows(tmp_path):
+    path = str(tmp_path / "rakan.db")
+    storage = SQLiteStorage(path, batch_size=1000, batch_ms=60000)
+    storage.write_log_records([make_log_record({"deviceId": "m1"})])
+    assert _committed_logs(path) == 0
+    storage.close()
+    assert _committed_logs(path) == 1
+
+
+class _LockedOnce:
+    """Connection stand-in whose first batch insert fails like a busy database."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.failed = False
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        if not self.failed:
+            self.failed = True
+            raise sqlite3.OperationalError("database is locked")
+        return self.conn.executemany(*args)
+
+
+def test_failed_flush_keeps_rows_for_the_next_one(tmp_path):
+    path = str(tmp_path / "rakan.db")
+    storage = SQLiteStorage(path, batch_size=1000, batch_ms=60000)
+    try:
+        storage.write_log_records([make_log_record({"deviceId": "m1"}) for _ in range(3)])
+        storage._conn = _LockedOnce(storage._conn)
+        with pytest.raises(sqlite3.OperationalError):
+            storage.flush()
+        assert _committed_logs(path) == 0
+
+        storage.write_log_records([make_log_record({"deviceId": "m2"})])
+        assert len(storage.list_events()) == 4
+    finally:
+        storage._conn = storage._conn.conn
+        storage.close()
+    assert _committed_logs(path) == 4
+
+
+def test_rewritten_log_record_is_stored_once(storage):
+    record = make_log_record({"deviceId": "m1"})
+    storage.write_log_records([record])
+    storage.flush()
+    storage.write_log_records([record])
+    assert len(storage.list_events()) == 1
+
+
+def test_reads_see_buffered_rows(storage):
+    storage.write_log_records([make_log_record({"deviceId": "m1", "type": "motion"})])
+    events = storage.get_recent_events_for_device("m1")
+    assert [e["event"]["type"] for e in events] == ["motion"]
+
+
+def test_device_state_and_touch(storage):
+    storage.put_device_state("m1", {"motion": True}, device_type="motion")
+    storage.touch_device_state("m1", "2026-01-01T00:00:00Z")
+    storage.touch_device_state("unknown", "2026-01-01T00:00:00Z")
+    state = storage.get_device_state("m1")
+    assert state["state"] == {"motion": True}
+    assert state["lastSeenAt"] == "2026-01-01T00:00:00Z"
+    assert storage.get_device_state("unknown") is None
+
+
+def test_state_write_keeps_last_seen_and_merges_extra(storage):
+    storage.put_device_state("m1", {"motion": True}, device_type="motion", extra={"room": "hall"})
+    storage.touch_device_state("m1", "2026-01-01T00:00:00Z")
+    storage.put_device_state("m1", {"motion": False}, "2026-01-01T00:00:05Z")
+    storage.put_device_state("m1", {"motion": True}, extra={"firmware": "1.2"})
+
+    state = storage.get_device_state("m1")
+    assert state["lastSeenAt"] == "2026-01-01T00:00:00Z"
+    assert state["room"] == "hall"
+    assert state["firmware"] == "1.2"
+    assert state["type"] == "motion"
+
+
+def test_pending_command_taken_once(storage):
+    storage.put_pending_command({
+        "commandId": "c1", "deviceId": "m1", "action": "turn_on",
+        "command": {"action": "turn_on"}, "sentAt": 1.0, "deadline": 2.0, "attempts": 1,
+    })
+    assert storage.take_pending_command("c1")["deviceId"] == "m1"
+    assert storage.take_pending_command("c1") is None
+
+
+def test_drain_flushes_storage(storage, monkeypatch):
+    from backend import event_processor
+
+    calls = []
+    monkeypatch.setattr(storage, "flush", lambda: calls.append("flush"))
+    event_processor.drain(publisher=False)
+    assert calls == ["flush"]
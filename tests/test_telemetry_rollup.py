@@ -0,0 +1,72 @@
+import time
+
+from backend import event_processor
+from backend.telemetry_rollup import RollupAccumulator, numeric_readings, query_rollups
+
+
+def _event(value, at, device_id="temp01"):
+    return {"deviceId": device_id, "type": "temperature", "data": {"temperature": value}, "timestamp": at}
+
+
+def test_numeric_readings_nested_top_level_and_booleans():
+    assert numeric_readings({"type": "motion", "data": {"motion": True, "label": "x"}}) == {"motion": 1.0}
+    assert numeric_readings({"type": "humidity", "value": 40}) == {"humidity": 40.0}
+    assert numeric_readings({"type": "door", "data": "open"}) == {}
+
+
+def test_partial_flushes_merge_into_one_bucket(storage):
+    acc = RollupAccumulator(flush_seconds=3600)
+    at = 1_700_000_010.0
+
+    acc.add_event(_event(20.0, at))
+    acc.add_event(_event(24.0, at + 1))
+    acc.flush()
+    acc.add_event(_event(18.0, at + 2))
+    acc.add_event(_event(30.0, at + 3))
+    acc.flush()
+
+    buckets = query_rollups("temp01", "minute", at - 60, at + 60)
+    assert len(buckets) == 1
+    metric = buckets[0]["metrics"]["temperature"]
+    assert metric == {"min": 18.0, "max": 30.0, "avg": 23.0, "count": 4}
+
+    hours = query_rollups("temp01", "hour", at - 3600, at + 3600)
+    assert hours[0]["metrics"]["temperature"]["count"] == 4
+
+
+def test_add_event_never_writes_on_the_event_path(storage):
+    acc = RollupAccumulator(flush_seconds=3600)
+    acc.add_event(_event(21.0, time.time()))
+    try:
+        assert query_rollups("temp01", "minute", time.time() - 120, time.time()) == []
+        acc.flush()
+        assert len(query_rollups("temp01", "minute", time.time() - 120, time.time())) == 1
+    finally:
+        acc.stop()
+
+
+def test_timer_flushes_without_further_events(storage):
+    acc = RollupAccumulator(flush_seconds=0.05)
+    acc.add_event(_event(21.0, time.time()))
+    try:
+        deadline = time.monotonic() + 2
+        while not query_rollups("temp01", "minute", time.time() - 120, time.time()):
+            assert time.monotonic() < deadline, "rollup was never flushed"
+            time.sleep(0.02)
+    finally:
+        acc.stop()
+
+
+def test_zero_interval_writes_through(storage):
+    acc = RollupAccumulator(flush_seconds=0)
+    acc.add_event(_event(21.0, time.time()))
+    assert len(query_rollups("temp01", "minute", time.time() - 120, time.time())) == 1
+
+
+def test_lambda_handler_flushes_rollups(storage, monkeypatch):
+    flushed = []
+    monkeypatch.setattr(event_processor.EventProcessor, "handle_event", lambda self, event: {"status": "ok"})
+    monkeypatch.setattr(event_processor, "flush_telemetry", lambda: flushed.append(True))
+
+    assert event_processor.lambda_handler({"deviceId": "temp01"}, None) == {"status": "ok"}
+    assert flushed == [True]
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from backend import event_processor
+from backend.event_processor import EventProcessor
+from backend.topology import TopologyIndex, compile_routes, make_topology_record
+from simulator.shared.schemas import validate_command
+
+
+def _records(*records):
+    return {r["deviceId"]: r for r in records}
+
+
+def test_bindings_expand_to_actuators_once():
+    records = _records(
+        make_topology_record("motion01", room="hall", bindings=["room:hall", "group:lights", "fan01"]),
+        make_topology_record("switch01", room="hall", groups=["lights"], role="actuator"),
+        make_topology_record("switch02", groups=["lights"], role="actuator"),
+        make_topology_record("temp01", room="hall", role="sensor"),
+        make_topology_record("motion02", room="hall", role="actuator", bindings=["room:hall"]),
+    )
+
+    routes, rooms, groups = compile_routes(records)
+
+    assert routes["motion01"] == ("motion02", "switch01", "switch02", "fan01")
+    # Never routed to itself
+    assert routes["motion02"] == ("switch01",)
+    assert "temp01" not in routes
+    assert rooms["hall"] == {"motion01", "switch01", "temp01", "motion02"}
+    assert groups == {"lights": {"switch01", "switch02"}}
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"room": ""}, {"role": "hub"}, {"groups": "lights"}, {"bindings": ["room:"]}, {"bindings": [""]},
+])
+def test_invalid_records_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        make_topology_record("d1", **kwargs)
+
+
+def test_changes_are_stored_and_seen_by_other_processes(storage):
+    api_side = TopologyIndex(storage, refresh_seconds=3600)
+    processor_side = TopologyIndex(storage, refresh_seconds=0)
+
+    api_side.put("switch01", room="hall", role="actuator")
+    api_side.put("motion01", room="hall", bindings=["room:hall"])
+    assert api_side.targets("motion01") == ("switch01",)
+    assert processor_side.targets("motion01") == ("switch01",)
+
+    assert api_side.remove("switch01")
+    assert api_side.targets("motion01") == ()
+    assert processor_side.targets("motion01") == ()
+    assert api_side.get("motion01")["targets"] == []
+
+
+def test_processor_fans_decisions_out_to_bound_actuators(storage, monkeypatch):
+    index = TopologyIndex(storage)
+    index.put("switch01", room="hall", role="actuator")
+    index.put("switch02", room="hall", role="actuator")
+    index.put("motion01", room="hall", bindings=["room:hall"])
+    monkeypatch.setattr(event_processor, "topology", index)
+    published = []
+    processor = EventProcessor(
+        decide=lambda event: {"deviceId": event["deviceId"], "action": "turn_on", "value": True},
+        publish=published.append,
+    )
+
+    result = processor.handle_event({"deviceId": "motion01", "type": "motion",
+                                     "data": {"motion": True}, "timestamp": time.time()})
+
+    assert result["routedTo"] == ["switch01", "switch02"]
+    assert [(c["deviceId"], c.get("sourceDeviceId")) for c in published] == [
+        ("switch01", "motion01"), ("switch02", "motion01"), ("motion01", None),
+    ]
+    # The sensor is told where its decision went, with its correlationId
+    notice = published[-1]
+    assert notice["action"] == "routed"
+    assert notice["value"] == ["switch01", "switch02"]
+    assert {c["correlationId"] for c in published} == {result["event"]["correlationId"]}
+    assert validate_command(notice) is None
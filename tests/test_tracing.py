@@ -0,0 +1,60 @@
+import time
+
+from backend.event_processor import EventProcessor
+from backend.tracing import LatencyHistogram, Trace, Tracer
+
+
+def test_histogram_percentiles_resolve_to_bucket_bounds():
+    hist = LatencyHistogram()
+    for ms in [0.3] * 90 + [7] * 9 + [250]:
+        hist.add(ms)
+
+    assert hist.percentile(50) == 0.5
+    assert hist.percentile(99) == 10
+    assert hist.percentile(100) == 250     # capped at the real maximum
+    assert hist.to_dict()["buckets"] == {"0.5": 90, "10": 9, "500": 1}
+    assert LatencyHistogram().percentile(50) is None
+
+
+def test_tracer_keeps_per_type_and_overall_histograms():
+    tracer = Tracer()
+    tracer.record("lam", "motion", 2)
+    tracer.record("lam", "temperature", 4)
+    tracer.record("lam", None, 1)
+
+    snapshot = tracer.snapshot()["lam"]
+    assert {k: v["count"] for k, v in snapshot.items()} == {
+        "motion": 1, "temperature": 1, "unknown": 1, "*": 3,
+    }
+
+
+def test_trace_records_spans_and_transit_for_epoch_timestamps():
+    tracer = Tracer()
+    trace = Trace(tracer, {"type": "motion", "timestamp": time.time() - 0.05, "correlationId": "abc"})
+    with trace.span("lam"):
+        pass
+    spans = trace.finish()
+
+    assert trace.correlation_id == "abc"
+    assert set(spans) == {"transit", "lam", "processor_total"}
+    assert spans["transit"] >= 50
+    assert set(tracer.snapshot()) == {"transit", "lam", "processor_total"}
+
+    iso = Trace(tracer, {"type": "motion", "timestamp": "2026-01-01T00:00:00Z"})
+    assert "transit" not in iso.spans
+    assert len(iso.correlation_id) == 32
+
+
+def test_commands_carry_the_event_correlation_id(storage):
+    published = []
+    processor = EventProcessor(
+        decide=lambda event: {"deviceId": event["deviceId"], "action": "turn_on", "value": True},
+        publish=published.append,
+    )
+    event = {"deviceId": "m1", "type": "motion", "data": {"motion": True},
+             "timestamp": time.time(), "correlationId": "feedface"}
+
+    result = processor.handle_event(event)
+
+    assert published[0]["correlationId"] == "feedface"
+    assert {"log", "lam", "publish", "state", "processor_total"} <= set(result["spansMs"])